@@ -1,6 +1,7 @@
 from evfl.actor import Actor
-from evfl.common import ActorIdentifier, Argument
+from evfl.common import ActorIdentifier, Argument, BoolArray, InternTable, StringArray
 from evfl.container import Container
+from evfl.diffing import diff, patch
 from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
 from evfl.evfl import EventFlow
 from evfl.flowchart import Flowchart
@@ -0,0 +1,5 @@
+import sys
+
+from evfl.cli import main
+
+sys.exit(main())
@@ -5,6 +5,16 @@ from evfl.util import *
 
 
 class Actor(BinaryObject):
+    __slots__ = [
+        "identifier",
+        "argument_name",
+        "argument_entry_point",
+        "actions",
+        "queries",
+        "params",
+        "concurrent_clips",
+    ]
+
     def __init__(self) -> None:
         super().__init__()
         self.identifier = ActorIdentifier()
@@ -22,15 +32,6 @@ class Actor(BinaryObject):
         # clip Leaves then this will be > 1
         self.concurrent_clips: int = 0xFFFF
 
-        # Offsets are used to handle the case where write_extra_data is called before _do_write
-        # (which happens for timelines).
-        self._actions_offset_writer: typing.Optional[PlaceholderWriter] = None
-        self._actions_offset: typing.Optional[int] = None
-        self._queries_offset_writer: typing.Optional[PlaceholderWriter] = None
-        self._queries_offset: typing.Optional[int] = None
-        self._params_offset_writer: typing.Optional[PlaceholderWriter] = None
-        self._params_offset: typing.Optional[int] = None
-
     def __repr__(self) -> str:
         return (
             f"Actor(identifier={self.identifier}, "
@@ -42,6 +43,47 @@ class Actor(BinaryObject):
             f"concurrent_clips={self.concurrent_clips})"
         )
 
+    def clone(self) -> "Actor":
+        """Returns a copy of this actor. The argument entry point reference is shared
+        and actions and queries are copied in order."""
+        actor = object.__new__(Actor)
+        actor.identifier = ActorIdentifier(self.identifier.name, self.identifier.sub_name)
+        actor.argument_name = self.argument_name
+        actor.argument_entry_point = clone_index(self.argument_entry_point, {})
+        actor.actions = [StringHolder(s.v) for s in self.actions]
+        actor.queries = [StringHolder(s.v) for s in self.queries]
+        actor.params = self.params.clone() if self.params else None
+        actor.concurrent_clips = self.concurrent_clips
+        return actor
+
+    def _to_record(self) -> tuple:
+        """Returns a flat representation without writer state (used for pickling)."""
+        return (
+            self.identifier,
+            self.argument_name,
+            self.argument_entry_point._idx,
+            [s.v for s in self.actions],
+            [s.v for s in self.queries],
+            self.params,
+            self.concurrent_clips,
+        )
+
+    @staticmethod
+    def _from_record(record: tuple) -> "Actor":
+        actor = Actor()
+        (
+            actor.identifier,
+            actor.argument_name,
+            actor.argument_entry_point._idx,
+            actions,
+            queries,
+            actor.params,
+            actor.concurrent_clips,
+        ) = record
+        actor.actions = [StringHolder(v) for v in actions]
+        actor.queries = [StringHolder(v) for v in queries]
+        return actor
+
     def find_action(self, name: str):
         return self._find_action_or_query(self.actions, name)
 
@@ -56,6 +98,8 @@ class Actor(BinaryObject):
 
     def _do_read(self, stream: ReadStream) -> None:
         self.identifier.read(stream)
+        if stream.intern_table is not None:
+            self.identifier = stream.intern_table.identifier(self.identifier)
         self.argument_name = stream.read_string_ref()
         actions_offset = stream.read_u64()
         queries_offset = stream.read_u64()
@@ -76,51 +120,52 @@ class Actor(BinaryObject):
     def _do_write(self, stream: WriteStream) -> None:
         self.identifier.write(stream)
         stream.write_string_ref(self.argument_name)
-        self._actions_offset_writer = stream.write_placeholder_ptr_if(
-            bool(self.actions), register=True
-        )
-        self._queries_offset_writer = stream.write_placeholder_ptr_if(
-            bool(self.queries), register=True
-        )
+        actions_offset_writer = stream.write_placeholder_ptr_if(bool(self.actions), register=True)
+        queries_offset_writer = stream.write_placeholder_ptr_if(bool(self.queries), register=True)
         # Yes, Nintendo inconsistency.
-        self._params_offset_writer = stream.write_placeholder_ptr_if(bool(self.params))
+        params_offset_writer = stream.write_placeholder_ptr_if(bool(self.params))
         stream.write(u16(len(self.actions) if self.actions else 0))
         stream.write(u16(len(self.queries) if self.queries else 0))
         stream.write(u16(self.argument_entry_point._idx))
         stream.write(u16(self.concurrent_clips))
 
-        if self._actions_offset:
-            self._actions_offset_writer.write(stream, u64(self._actions_offset))
-        if self._queries_offset:
-            self._queries_offset_writer.write(stream, u64(self._queries_offset))
-        if self._params_offset:
-            self._params_offset_writer.write(stream, u64(self._params_offset))
+        # Offsets are used to handle the case where write_extra_data is called before _do_write
+        # (which happens for timelines).
+        writers = [
+            ("actions", actions_offset_writer),
+            ("queries", queries_offset_writer),
+            ("params", params_offset_writer),
+        ]
+        for key, writer in writers:
+            offset = stream.get_scratch(self, key)
+            if offset:
+                writer.write(stream, u64(offset))
+            else:
+                stream.set_scratch(self, key, writer)
+
+    def _write_extra_data_offset(self, stream: WriteStream, key: str) -> None:
+        writer: typing.Optional[PlaceholderWriter] = stream.get_scratch(self, key)
+        if writer:
+            writer.write_current_offset(stream)
+        else:
+            stream.set_scratch(self, key, stream.tell())
 
     def write_extra_data(self, stream: WriteStream) -> None:
         """Writes the param container and string pointer arrays.
         Unlike other write_extra_data functions, this can be called before write()."""
         if self.params:
             stream.align(8)
-            if self._params_offset_writer:
-                self._params_offset_writer.write_current_offset(stream)
-            else:
-                self._params_offset = stream.tell()
+            self._write_extra_data_offset(stream, "params")
             self.params.write(stream)
 
         if self.actions:
             stream.align(8)
-            if self._actions_offset_writer:
-                self._actions_offset_writer.write_current_offset(stream)
-            else:
-                self._actions_offset = stream.tell()
+            self._write_extra_data_offset(stream, "actions")
             for s in self.actions:
                 stream.write_string_ref(s.v)
 
         if self.queries:
             stream.align(8)
-            if self._queries_offset_writer:
-                self._queries_offset_writer.write_current_offset(stream)
-            else:
-                self._queries_offset = stream.tell()
+            self._write_extra_data_offset(stream, "queries")
             for s in self.queries:
                 stream.write_string_ref(s.v)
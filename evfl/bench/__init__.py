@@ -0,0 +1,398 @@
+"""Benchmark suite (python -m evfl.bench).
+
+Times reading, writing, round-tripping and measuring the serialized size of every file in the
+test corpus and a few synthetic flows, as well as individual writer stages (DIC building, string
+pool sorting, relocation table building), graph generation, the text format, pickling and
+cloning (compared with copy.deepcopy).
+Results are written as JSON so that runs can be compared with --compare.
+
+The text format has throughput targets (THROUGHPUT_TARGETS). Results that miss them are
+reported, and --check-targets makes the run fail in that case.
+
+With --memory, the memory that read flows keep alive is measured with tracemalloc instead.
+"""
+import argparse
+import copy
+import gc
+import io
+import json
+import os
+import pickle
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import typing
+
+import evfl
+from evfl import synth, text
+from evfl.cli import expand_paths
+from evfl.common import InternTable
+from evfl.container import Container
+from evfl.dic import Tree
+from evfl.evfl import EventFlow
+from evfl.repr_util import generate_flowchart_graph
+from evfl.util import WriteStream
+
+RESULTS_VERSION = 2
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'tests', 'original')
+
+# Minimum throughput in MB of text per second, on one core of a typical development machine.
+# Only inputs whose text form is at least TARGET_MIN_SIZE bytes are checked: smaller inputs
+# are dominated by fixed per-call costs.
+THROUGHPUT_TARGETS = {
+    'text_dump': 4.0,
+    'text_load': 3.0,
+}
+TARGET_MIN_SIZE = 64 * 1024
+
+class Input(typing.NamedTuple):
+    name: str
+    data: bytes
+
+class Result(typing.NamedTuple):
+    input: str
+    size: int
+    benchmark: str
+    number: int
+    repeat: int
+    # Seconds per call.
+    best: float
+    median: float
+    # Size of the encoded data that the benchmark produces or decodes (0 if not applicable).
+    encoded_size: int = 0
+
+class MemoryResult(typing.NamedTuple):
+    input: str
+    size: int
+    # Bytes that stay allocated while the flow that was read from the input is alive.
+    retained: int
+    events: int
+    actors: int
+    clips: int
+
+class _CapturingWriteStream(WriteStream):
+    """Records the writer state right before the string pool and relocation table are written."""
+    def finalise(self) -> None:
+        self.align(8)
+        self.captured = (self._stream.getvalue(), self.tell(), dict(self._strings), set(self._pointers))  # type: ignore
+        super().finalise()
+
+def _fresh_stream(captured) -> WriteStream:
+    data, offset, strings, pointers = captured
+    underlying = io.BytesIO(data)
+    underlying.seek(offset)
+    stream = WriteStream(underlying)
+    stream._strings.update(strings)
+    stream._pointers = set(pointers)
+    return stream
+
+def _dic_key_lists(flow: EventFlow) -> typing.List[typing.List[str]]:
+    containers: typing.List[typing.Optional[Container]] = []
+    key_lists: typing.List[typing.List[str]] = []
+    if flow.flowchart:
+        key_lists.append([e.name for e in flow.flowchart.entry_points])
+        containers.extend(actor.params for actor in flow.flowchart.actors)
+        containers.extend(getattr(event.data, 'params', None) for event in flow.flowchart.events)
+    if flow.timeline:
+        timeline = flow.timeline
+        containers.append(timeline.params)
+        containers.extend(actor.params for actor in timeline.actors)
+        containers.extend(x.params for x in timeline.clips)
+        containers.extend(x.params for x in timeline.oneshots)
+        containers.extend(x.params for x in timeline.cuts)
+    key_lists.extend(list(c.data.keys()) for c in containers if c is not None)
+    return key_lists
+
+def _build_dics(key_lists: typing.List[typing.List[str]]) -> None:
+    for keys in key_lists:
+        tree = Tree()
+        for key in keys:
+            tree.insert(key)
+        tree.get_index_table()
+
+def _benchmarks(data: bytes) -> typing.Dict[str, typing.Tuple[typing.Callable[[], typing.Any], int]]:
+    """Returns (function, encoded size) for each benchmark."""
+    flow = EventFlow()
+    flow.read(data)
+    capturing_stream = _CapturingWriteStream(io.BytesIO())
+    flow.write_to_stream(capturing_stream)
+    captured = capturing_stream.captured
+    key_lists = _dic_key_lists(flow)
+    encoded = text.dumps(flow)
+    pickled = pickle.dumps(flow, pickle.HIGHEST_PROTOCOL)
+    blocks = [*flow.flowcharts.values(), *flow.timelines.values()]
+
+    def read() -> None:
+        EventFlow().read(data)
+
+    def write() -> None:
+        flow.write(io.BytesIO())
+
+    def roundtrip() -> None:
+        f = EventFlow()
+        f.read(data)
+        stream = io.BytesIO()
+        f.write(stream)
+        if stream.getbuffer() != data:
+            raise ValueError('round trip mismatch')
+
+    size = len(data)
+    benchmarks = {
+        'read': (read, size),
+        'write': (write, size),
+        'roundtrip': (roundtrip, size),
+        'serialized_size': (flow.serialized_size, 0),
+        'dic': (lambda: _build_dics(key_lists), 0),
+        'string_pool': (lambda: _fresh_stream(captured)._write_string_pool(), 0),
+        'relocation_table': (lambda: _fresh_stream(captured)._write_relocation_table(captured[1]), 0),
+        'text_dump': (lambda: text.dumps(flow), len(encoded.encode())),
+        'text_load': (lambda: text.loads(encoded), len(encoded.encode())),
+        'pickle_dumps': (lambda: pickle.dumps(flow, pickle.HIGHEST_PROTOCOL), len(pickled)),
+        'pickle_loads': (lambda: pickle.loads(pickled), len(pickled)),
+        'clone': (lambda: [block.clone() for block in blocks], 0),
+        'deepcopy': (lambda: copy.deepcopy(blocks), 0),
+    }
+    if flow.flowchart:
+        benchmarks['graph'] = (lambda: generate_flowchart_graph(flow), 0)
+    return benchmarks
+
+def _time(fn: typing.Callable[[], typing.Any], repeat: int, min_time: float) -> typing.Tuple[int, typing.List[float]]:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        timings.append((time.perf_counter() - start) / number)
+    return number, timings
+
+def throughput(result: Result) -> float:
+    """Returns the throughput of a benchmark in MB of encoded data per second."""
+    return result.encoded_size / result.median / 1e6
+
+def missed_targets(results: typing.Iterable[Result]) -> typing.List[Result]:
+    """Returns the results that are below their throughput target."""
+    return [r for r in results
+            if r.benchmark in THROUGHPUT_TARGETS and r.encoded_size >= TARGET_MIN_SIZE
+            and throughput(r) < THROUGHPUT_TARGETS[r.benchmark]]
+
+def _serialize(flow: EventFlow) -> bytes:
+    stream = io.BytesIO()
+    flow.write(stream)
+    return stream.getvalue()
+
+def _read_retained(data: bytes) -> typing.Tuple[EventFlow, int]:
+    gc.collect()
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        flow = EventFlow()
+        flow.read(data)
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return flow, retained
+
+def measure_memory(inputs: typing.Iterable[Input]) -> typing.List[MemoryResult]:
+    results = []
+    for inp in inputs:
+        flow, retained = _read_retained(inp.data)
+        events = len(flow.flowchart.events) if flow.flowchart else 0
+        actors = len(flow.flowchart.actors) if flow.flowchart else len(flow.timeline.actors)  # type: ignore
+        clips = len(flow.timeline.clips) if flow.timeline else 0
+        results.append(MemoryResult(inp.name, len(inp.data), retained, events, actors, clips))
+    return results
+
+def total_retained(inputs: typing.Iterable[Input], intern: bool = False) -> int:
+    """Returns the memory that all inputs keep alive when they are loaded at the same time,
+    optionally sharing strings and actor identifiers through a single InternTable."""
+    intern_table = InternTable() if intern else None
+    flows = []
+    gc.collect()
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for inp in inputs:
+            flow = EventFlow()
+            flow.read(inp.data, intern_table)
+            flows.append(flow)
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+def memory_per_object(n: int = 2000) -> typing.Dict[str, float]:
+    """Returns the marginal number of bytes that each event, actor and clip keeps alive.
+
+    Synthetic flows that only differ in the number of objects of one kind are read and the
+    difference in retained memory is divided by the difference in object count."""
+    def flowchart_retained(num_events: int, num_actors: int) -> int:
+        flow = EventFlow()
+        flow.flowchart = synth.generate_flowchart(num_events, num_entry_points=1, num_actors=num_actors)
+        return _read_retained(_serialize(flow))[1]
+
+    def timeline_retained(num_clips: int) -> int:
+        flow = EventFlow()
+        flow.timeline = synth.generate_timeline(num_clips)
+        return _read_retained(_serialize(flow))[1]
+
+    num_actors = max(1, n // 10)
+    return {
+        'event': (flowchart_retained(2 * n, 16) - flowchart_retained(n, 16)) / n,
+        'actor': (flowchart_retained(n, 2 * num_actors) - flowchart_retained(n, num_actors)) / num_actors,
+        'clip': (timeline_retained(2 * n) - timeline_retained(n)) / n,
+    }
+
+def synthetic_inputs(quick: bool = False, large: bool = False) -> typing.List[Input]:
+    sizes = [1000] if quick else [1000, 10000]
+    if large:
+        sizes.append(synth.MAX_EVENTS)
+    inputs = []
+    for size in sizes:
+        flow = EventFlow()
+        flow.flowchart = synth.generate_flowchart(size, num_entry_points=max(1, size // 100))
+        flow.name = flow.flowchart.name
+        inputs.append(Input(f'synthetic/flowchart-{size}', _serialize(flow)))
+
+        flow = EventFlow()
+        flow.timeline = synth.generate_timeline(min(size, 0x7FFF), num_oneshots=size // 10, num_cuts=size // 100)
+        flow.name = flow.timeline.name
+        inputs.append(Input(f'synthetic/timeline-{size}', _serialize(flow)))
+    return inputs
+
+def corpus_inputs(paths: typing.Optional[typing.List[str]] = None) -> typing.List[Input]:
+    inputs = []
+    for path in expand_paths(paths or [CORPUS_DIR]):
+        with open(path, 'rb') as f:
+            inputs.append(Input(os.path.basename(path), f.read()))
+    return inputs
+
+def run(inputs: typing.Iterable[Input], benchmarks: typing.Optional[typing.Collection[str]] = None,
+        repeat: int = 5, min_time: float = 0.05,
+        progress: typing.Optional[typing.Callable[[Result], None]] = None) -> typing.List[Result]:
+    results = []
+    for inp in inputs:
+        for name, (fn, encoded_size) in _benchmarks(inp.data).items():
+            if benchmarks and name not in benchmarks:
+                continue
+            number, timings = _time(fn, repeat, min_time)
+            result = Result(inp.name, len(inp.data), name, number, repeat, min(timings), statistics.median(timings),
+                            encoded_size)
+            results.append(result)
+            if progress:
+                progress(result)
+    return results
+
+def to_json(results: typing.List[Result], memory: typing.Optional[typing.List[MemoryResult]] = None,
+            per_object: typing.Optional[typing.Dict[str, float]] = None,
+            total: typing.Optional[typing.Dict[str, int]] = None) -> dict:
+    output = {
+        'version': RESULTS_VERSION,
+        'evfl': evfl.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'results': [r._asdict() for r in results],
+        'throughput_targets': THROUGHPUT_TARGETS,
+        'missed_targets': [{'input': r.input, 'benchmark': r.benchmark, 'throughput': throughput(r)}
+                           for r in missed_targets(results)],
+    }
+    if memory is not None:
+        output['memory'] = [r._asdict() for r in memory]
+    if per_object is not None:
+        output['bytes_per_object'] = per_object
+    if total is not None:
+        output['total_retained'] = total
+    return output
+
+def _format_time(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:9.1f} us'
+    if seconds < 1:
+        return f'{seconds * 1e3:9.2f} ms'
+    return f'{seconds:9.3f} s '
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m evfl.bench', description='Benchmark the evfl library.')
+    parser.add_argument('paths', nargs='*', help='Files, directories or glob patterns (default: test corpus)')
+    parser.add_argument('-b', '--benchmark', action='append', help='Only run this benchmark (can be repeated)')
+    parser.add_argument('-k', '--filter', help='Only run inputs whose name contains this string')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of timed runs per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum duration of a timed run in seconds')
+    parser.add_argument('--no-synthetic', action='store_true', help='Do not run synthetic inputs')
+    parser.add_argument('--quick', action='store_true', help='Smaller synthetic inputs and fewer runs')
+    parser.add_argument('--large', action='store_true', help='Add synthetic inputs at the 16-bit index limit')
+    parser.add_argument('--memory', action='store_true', help='Measure retained memory instead of timings')
+    parser.add_argument('--check-targets', action='store_true', help='Fail if a throughput target is missed')
+    parser.add_argument('-o', '--output', help='Write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare against')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.repeat = min(args.repeat, 2)
+        args.min_time = min(args.min_time, 0.005)
+
+    inputs = corpus_inputs(args.paths)
+    if not args.no_synthetic:
+        inputs.extend(synthetic_inputs(quick=args.quick, large=args.large))
+    if args.filter:
+        inputs = [i for i in inputs if args.filter in i.name]
+
+    baseline: typing.Dict[typing.Tuple[str, str], float] = dict()
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(r['input'], r['benchmark']): r['median'] for r in json.load(f)['results']}
+
+    def progress(result: Result) -> None:
+        line = f'{result.input:40} {result.benchmark:18} {_format_time(result.median)}'
+        old = baseline.get((result.input, result.benchmark))
+        if result.benchmark.startswith('pickle'):
+            line += f'  {result.encoded_size:9} bytes'
+        if result.benchmark in THROUGHPUT_TARGETS:
+            line += f'  {throughput(result):6.2f} MB/s'
+            if missed_targets([result]):
+                line += f' (target: {THROUGHPUT_TARGETS[result.benchmark]} MB/s)'
+        if old:
+            line += f'  {result.median / old:6.2f}x'
+        print(line, file=sys.stderr)
+
+    if args.memory:
+        memory = measure_memory(inputs)
+        for r in memory:
+            print(f'{r.input:40} {r.retained:10} bytes retained ({r.retained / r.size:5.1f}x file size)', file=sys.stderr)
+        total = {'plain': total_retained(inputs), 'interned': total_retained(inputs, intern=True)}
+        for name, size in total.items():
+            print(f'total ({name}) {size:10} bytes retained', file=sys.stderr)
+        per_object = memory_per_object(200 if args.quick else 2000)
+        for name, size in per_object.items():
+            print(f'{name:10} {size:8.0f} bytes', file=sys.stderr)
+        output = json.dumps(to_json([], memory, per_object, total), indent=1)
+    else:
+        results = run(inputs, args.benchmark, args.repeat, args.min_time, progress)
+        output = json.dumps(to_json(results), indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.check_targets and not args.memory and missed_targets(results):
+        print(f'{len(missed_targets(results))} throughput targets missed', file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,5 @@
+import sys
+
+from evfl.bench import main
+
+sys.exit(main())
@@ -0,0 +1,144 @@
+"""Content-addressed on-disk cache of parsed event flows.
+
+Entries are keyed by the SHA-256 of the input file and store a pickled EventFlow
+behind a small header with a format version stamp. Entries are written atomically
+and the least recently used ones are evicted when the cache grows above its size limit.
+The total size is tracked across puts, so the directory is only scanned when the limit
+is exceeded, and eviction then frees some headroom below the limit.
+"""
+import hashlib
+import os
+import pickle
+import struct
+import tempfile
+import typing
+
+from evfl.evfl import EventFlow
+
+_MAGIC = b'EVFLPC'
+_HEADER = struct.Struct('<6sHH')
+_SUFFIX = '.evflcache'
+
+class ParseCache:
+    # Must be bumped whenever the pickled representation of the object model changes.
+    FORMAT_VERSION = 4
+
+    def __init__(self, directory: str, max_size: int = 256 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Size of the entries in the directory, or None until the first put.
+        # Other processes may share the directory, so this is only an estimate between scans.
+        self._total_size: typing.Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + _SUFFIX)
+
+    def load(self, data: bytes) -> EventFlow:
+        """Returns the parsed event flow for the given file contents, parsing and storing it on a miss."""
+        digest = self.digest(data)
+        flow = self.get(digest)
+        if flow is not None:
+            self.hits += 1
+            return flow
+        self.misses += 1
+        flow = EventFlow()
+        flow.read(data)
+        self.put(digest, flow)
+        return flow
+
+    def get(self, digest: str) -> typing.Optional[EventFlow]:
+        path = self._path(digest)
+        try:
+            with open(path, 'rb') as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            magic, version, protocol = _HEADER.unpack_from(blob)
+            if magic != _MAGIC or version != self.FORMAT_VERSION or protocol > pickle.HIGHEST_PROTOCOL:
+                raise ValueError('Stale cache entry')
+            flow = pickle.loads(memoryview(blob)[_HEADER.size:])
+        except Exception:
+            # Stale or corrupted entries are treated as misses.
+            self._remove(path)
+            return None
+
+        # The modification time is used as the last access time for LRU eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return flow
+
+    def put(self, digest: str, flow: EventFlow) -> bool:
+        """Stores a parsed event flow. Returns False if it could not be serialized."""
+        try:
+            payload = pickle.dumps(flow, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return False
+        blob = _HEADER.pack(_MAGIC, self.FORMAT_VERSION, pickle.HIGHEST_PROTOCOL) + payload
+
+        path = self._path(digest)
+        try:
+            replaced_size = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        if self._total_size is None:
+            self._total_size = self.size()
+        else:
+            self._total_size += len(blob) - replaced_size
+        if self._total_size > self.max_size:
+            self._evict(self.max_size - self.max_size // 8)
+        return True
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def clear(self) -> None:
+        for entry in self._entries():
+            self._remove(entry.path)
+        self._total_size = 0
+
+    def _entries(self) -> typing.List[os.DirEntry]:
+        with os.scandir(self.directory) as it:
+            return [entry for entry in it if entry.name.endswith(_SUFFIX) and entry.is_file()]
+
+    def _evict(self, target_size: typing.Optional[int] = None) -> None:
+        """Removes the least recently used entries until the cache is no larger than target_size
+        (max_size by default), if it is currently larger than max_size."""
+        if target_size is None:
+            target_size = self.max_size
+        entries = [(entry.stat(), entry.path) for entry in self._entries()]
+        total = sum(st.st_size for st, path in entries)
+        if total > self.max_size:
+            entries.sort(key=lambda e: e[0].st_mtime)
+            for st, path in entries:
+                if total <= target_size:
+                    break
+                self._remove(path)
+                total -= st.st_size
+        self._total_size = total
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
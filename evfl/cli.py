@@ -0,0 +1,215 @@
+"""Command-line tool for bulk operations on event flow files (python -m evfl)."""
+import argparse
+from collections import Counter
+import concurrent.futures
+import glob
+import io
+import json
+import os
+import sys
+import time
+import typing
+
+from evfl.event import ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+from evfl.evfl import EventFlow
+from evfl.flowchart import Flowchart
+from evfl.timeline import Timeline
+
+_EXTENSIONS = ('.bfevfl', '.bfevtm')
+
+class _Result(typing.NamedTuple):
+    path: str
+    size: int
+    output: str
+    stats: typing.Dict[str, int]
+    error: str
+
+def _read(path: str) -> typing.Tuple[bytes, EventFlow]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    flow = EventFlow()
+    flow.read(data)
+    return data, flow
+
+def _flowchart_stats(flowchart: Flowchart) -> typing.Dict[str, int]:
+    stats: typing.Dict[str, int] = Counter()
+    stats['flowcharts'] += 1
+    stats['actors'] += len(flowchart.actors)
+    stats['events'] += len(flowchart.events)
+    stats['entry_points'] += len(flowchart.entry_points)
+    for event in flowchart.events:
+        stats['events.' + type(event.data).__name__] += 1
+    return stats
+
+def _timeline_stats(timeline: Timeline) -> typing.Dict[str, int]:
+    stats: typing.Dict[str, int] = Counter()
+    stats['timelines'] += 1
+    stats['actors'] += len(timeline.actors)
+    stats['clips'] += len(timeline.clips)
+    stats['oneshots'] += len(timeline.oneshots)
+    stats['cuts'] += len(timeline.cuts)
+    stats['subtimelines'] += len(timeline.subtimelines)
+    return stats
+
+def _flow_stats(flow: EventFlow) -> typing.Dict[str, int]:
+    stats: typing.Dict[str, int] = Counter()
+    for flowchart in flow.flowcharts.values():
+        stats.update(_flowchart_stats(flowchart))
+    for timeline in flow.timelines.values():
+        stats.update(_timeline_stats(timeline))
+    return stats
+
+def _cmd_info(path: str, data: bytes, flow: EventFlow) -> str:
+    parts = [f'{path}: {flow.name!r}']
+    parts.extend(f'{k}={v}' for k, v in sorted(_flow_stats(flow).items()))
+    return ' '.join(parts)
+
+def _dump_flowchart(flowchart: Flowchart) -> typing.List[str]:
+    lines = [f'flowchart {flowchart.name}']
+    for actor in flowchart.actors:
+        lines.append(f'  actor {actor.identifier} actions={[a.v for a in actor.actions]} '
+                     f'queries={[q.v for q in actor.queries]}')
+    for event in flowchart.events:
+        data = event.data
+        if isinstance(data, ActionEvent):
+            desc = (f'action {data.actor.v.identifier}.{data.actor_action.v} '
+                    f'params={data.params.data if data.params else None} nxt={data.nxt.v.name if data.nxt.v else None}')
+        elif isinstance(data, SwitchEvent):
+            cases = {value: case.v.name for value, case in data.cases.items()}
+            desc = (f'switch {data.actor.v.identifier}.{data.actor_query.v} '
+                    f'params={data.params.data if data.params else None} cases={cases}')
+        elif isinstance(data, ForkEvent):
+            desc = f'fork forks={[f.v.name for f in data.forks]} join={data.join.v.name}'
+        elif isinstance(data, JoinEvent):
+            desc = f'join nxt={data.nxt.v.name if data.nxt.v else None}'
+        elif isinstance(data, SubFlowEvent):
+            desc = (f'sub_flow {data.res_flowchart_name}<{data.entry_point_name}> '
+                    f'params={data.params.data if data.params else None} nxt={data.nxt.v.name if data.nxt.v else None}')
+        lines.append(f'  event {event.name}: {desc}')
+    for entry_point in flowchart.entry_points:
+        main_event = entry_point.main_event.v
+        lines.append(f'  entry_point {entry_point.name} -> {main_event.name if main_event else None}')
+    return lines
+
+def _dump_timeline(timeline: Timeline) -> typing.List[str]:
+    lines = [f'timeline {timeline.name} duration={timeline.duration}']
+    for actor in timeline.actors:
+        lines.append(f'  actor {actor.identifier} actions={[a.v for a in actor.actions]}')
+    for clip in timeline.clips:
+        lines.append(f'  clip {clip.start_time}+{clip.duration} {clip.actor.v.identifier}.{clip.actor_action.v} '
+                     f'slot={clip.actor_concurrent_clip} params={clip.params.data if clip.params else None}')
+    for oneshot in timeline.oneshots:
+        lines.append(f'  oneshot {oneshot.time} {oneshot.actor.v.identifier}.{oneshot.actor_action.v} '
+                     f'params={oneshot.params.data if oneshot.params else None}')
+    for cut in timeline.cuts:
+        lines.append(f'  cut {cut.start_time} {cut.name}')
+    return lines
+
+def _cmd_dump(path: str, data: bytes, flow: EventFlow) -> str:
+    lines = [f'# {path}']
+    for flowchart in flow.flowcharts.values():
+        lines.extend(_dump_flowchart(flowchart))
+    for timeline in flow.timelines.values():
+        lines.extend(_dump_timeline(timeline))
+    return '\n'.join(lines)
+
+def _cmd_roundtrip(path: str, data: bytes, flow: EventFlow) -> str:
+    stream = io.BytesIO()
+    flow.write(stream)
+    if stream.getbuffer() != data:
+        raise ValueError(f'round trip mismatch ({len(data)} bytes in, {len(stream.getbuffer())} bytes out)')
+    return ''
+
+def _cmd_stats(path: str, data: bytes, flow: EventFlow) -> str:
+    return ''
+
+def _cmd_graph(path: str, data: bytes, flow: EventFlow) -> str:
+    from evfl.repr_util import generate_flowchart_graph
+    return json.dumps({'path': path, 'graph': generate_flowchart_graph(flow)}, default=str)
+
+_COMMANDS: typing.Dict[str, typing.Callable[[str, bytes, EventFlow], str]] = {
+    'info': _cmd_info,
+    'dump': _cmd_dump,
+    'roundtrip': _cmd_roundtrip,
+    'stats': _cmd_stats,
+    'graph': _cmd_graph,
+}
+
+def _process(args: typing.Tuple[str, str]) -> _Result:
+    command, path = args
+    try:
+        size = os.path.getsize(path)
+        data, flow = _read(path)
+        output = _COMMANDS[command](path, data, flow)
+        return _Result(path, size, output, dict(_flow_stats(flow)) if command == 'stats' else {}, '')
+    except Exception as e:
+        return _Result(path, 0, '', {}, f'{type(e).__name__}: {e}')
+
+def expand_paths(patterns: typing.Iterable[str]) -> typing.List[str]:
+    """Expands files, directories (recursively) and glob patterns into a list of unique files."""
+    paths: typing.Dict[str, None] = dict()
+    for pattern in patterns:
+        matches = [pattern] if os.path.exists(pattern) else sorted(glob.glob(pattern, recursive=True))
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if name.endswith(_EXTENSIONS):
+                            paths[os.path.join(root, name)] = None
+            else:
+                paths[match] = None
+    return list(paths.keys())
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m evfl', description='Bulk operations on event flow files.')
+    parser.add_argument('command', choices=sorted(_COMMANDS.keys()))
+    parser.add_argument('paths', nargs='+', help='Files, directories or glob patterns')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes (default: number of CPUs)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not print progress')
+    args = parser.parse_args(argv)
+
+    paths = expand_paths(args.paths)
+    if not paths:
+        print('no input files', file=sys.stderr)
+        return 1
+
+    show_progress = not args.quiet and sys.stderr.isatty()
+    tasks = [(args.command, path) for path in paths]
+    start = time.perf_counter()
+    if args.jobs <= 1 or len(paths) == 1:
+        results: typing.Iterator[_Result] = map(_process, tasks)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs)
+        results = executor.map(_process, tasks, chunksize=max(1, len(tasks) // (args.jobs * 8)))
+
+    errors: typing.List[_Result] = []
+    stats: typing.Dict[str, int] = Counter()
+    total_size = 0
+    try:
+        for i, result in enumerate(results):
+            if result.error:
+                errors.append(result)
+                print(f'error: {result.path}: {result.error}', file=sys.stderr)
+            else:
+                total_size += result.size
+                stats.update(result.stats)
+                if result.output:
+                    print(result.output)
+            if show_progress:
+                print(f'\r[{i + 1}/{len(paths)}]', end='', file=sys.stderr, flush=True)
+    finally:
+        if executor:
+            executor.shutdown()
+    elapsed = time.perf_counter() - start
+
+    if show_progress:
+        print(file=sys.stderr)
+    if args.command == 'stats':
+        for key, value in sorted(stats.items()):
+            print(f'{key}: {value}')
+    print(f'{len(paths)} files ({len(errors)} errors) in {elapsed:.3f}s: '
+          f'{len(paths) / elapsed:.1f} files/s, {total_size / elapsed / 1e6:.2f} MB/s', file=sys.stderr)
+    return 1 if errors else 0
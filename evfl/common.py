@@ -2,12 +2,32 @@ from evfl.util import *
 
 
 class ActorIdentifier(BinaryObject):
-    __slots__ = ["name", "sub_name"]
+    __slots__ = ["_name", "_sub_name", "_hash"]
 
     def __init__(self, name: str = "", sub_name: str = "") -> None:
         super().__init__()
-        self.name: str = name
-        self.sub_name: str = sub_name
+        self._name = name
+        self._sub_name = sub_name
+        self._hash: typing.Optional[int] = None
+
+    # The hash is cached, so both parts are properties that reset it when they are changed.
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, name: str) -> None:
+        self._name = name
+        self._hash = None
+
+    @property
+    def sub_name(self) -> str:
+        return self._sub_name
+
+    @sub_name.setter
+    def sub_name(self, sub_name: str) -> None:
+        self._sub_name = sub_name
+        self._hash = None
 
     def __str__(self) -> str:
         return f"{self.name}[{self.sub_name}]" if self.sub_name else self.name
@@ -18,17 +38,23 @@ class ActorIdentifier(BinaryObject):
         return f'ActorIdentifier(name="{self.name}", sub_name="{self.sub_name}")'
 
     def __hash__(self) -> int:
-        return hash((self.name, self.sub_name))
+        if self._hash is None:
+            self._hash = hash((self._name, self._sub_name))
+        return self._hash
 
     def __eq__(self, other) -> bool:
-        return (self.name, self.sub_name) == (other.name, other.sub_name)
+        return self is other or (self.name, self.sub_name) == (other.name, other.sub_name)
 
     def __ne__(self, other) -> bool:
         return not (self == other)
 
+    def __reduce__(self):
+        return (ActorIdentifier, (self.name, self.sub_name))
+
     def _do_read(self, stream: ReadStream) -> None:
-        self.name = stream.read_string_ref()
-        self.sub_name = stream.read_string_ref()
+        self._name = stream.read_string_ref()
+        self._sub_name = stream.read_string_ref()
+        self._hash = None
 
     def _do_write(self, stream: WriteStream) -> None:
         stream.write_string_ref(self.name)
@@ -39,6 +65,14 @@ class Argument(str):
     pass
 
 
+class BoolArray(list):
+    """A list that is stored as a bool array, even when it is empty."""
+
+
+class StringArray(list):
+    """A list that is stored as a string array, even when it is empty."""
+
+
 class StringHolder:
     __slots__ = ["v"]
 
@@ -59,3 +93,27 @@ class StringHolder:
 
     def __ne__(self, other) -> bool:
         return not (self == other)
+
+
+class InternTable:
+    """Shares equal strings and actor identifiers between all flows that are read with it.
+
+    Pass the same table to every EventFlow.read() call to deduplicate the names, parameter keys
+    and string values of a whole corpus. Interned ActorIdentifier objects are shared between
+    actors and files, so replace them instead of modifying them in place.
+    StringHolder objects are never shared because events refer to the holders of their actor."""
+
+    __slots__ = ["_strings", "_identifiers"]
+
+    def __init__(self) -> None:
+        self._strings: typing.Dict[str, str] = dict()
+        self._identifiers: typing.Dict[ActorIdentifier, ActorIdentifier] = dict()
+
+    def __len__(self) -> int:
+        return len(self._strings) + len(self._identifiers)
+
+    def string(self, string: str) -> str:
+        return self._strings.setdefault(string, string)
+
+    def identifier(self, identifier: ActorIdentifier) -> ActorIdentifier:
+        return self._identifiers.setdefault(identifier, identifier)
@@ -0,0 +1,202 @@
+"""Flowchart compiler for fast repeated simulation.
+
+A flowchart is lowered into a flat step table where every jump target is an
+integer, switch cases are plain dicts and parameters are resolved ahead of time.
+The table does not depend on any callback, so it can be cached by content hash
+and later bound to a set of actor callbacks to produce closures that are run
+without walking Index objects or dispatching on event types.
+"""
+import hashlib
+import io
+import typing
+
+from evfl.container import Container
+from evfl.enums import EventType
+from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+from evfl.flowchart import Flowchart
+from evfl.util import *
+
+# Callbacks are keyed by (str(actor identifier), action or query name).
+CallbackKey = typing.Tuple[str, str]
+ActionCallback = typing.Callable[[typing.Optional[Container]], None]
+QueryCallback = typing.Callable[[typing.Optional[Container]], int]
+SubFlowCallback = typing.Callable[[str, str, typing.Optional[Container]], None]
+
+_END = -1
+
+def _noop_action(params: typing.Optional[Container]) -> None:
+    pass
+
+def _default_query(params: typing.Optional[Container]) -> int:
+    return 0
+
+def _noop_sub_flow(res_flowchart_name: str, entry_point_name: str, params: typing.Optional[Container]) -> None:
+    pass
+
+def flowchart_digest(flowchart: Flowchart) -> str:
+    """Returns the SHA-256 of the serialized flowchart. Equal flowcharts have equal digests."""
+    buf = io.BytesIO()
+    stream = WriteStream(buf)
+    flowchart.write(stream)
+    stream.finalise()
+    return hashlib.sha256(buf.getbuffer()).hexdigest()
+
+class CompiledFlowchart:
+    """Callback-independent step table for a flowchart.
+
+    Each step is a tuple whose first element is an EventType:
+        (kAction, key, params, nxt)
+        (kSwitch, key, params, cases)
+        (kFork, forks, join)
+        (kJoin, nxt)
+        (kSubFlow, res_flowchart_name, entry_point_name, params, nxt)
+    where every event reference is an index into the table (-1 for none)."""
+    __slots__ = ['digest', 'steps', 'entry_points']
+    def __init__(self, digest: str = '') -> None:
+        self.digest = digest
+        self.steps: typing.List[tuple] = []
+        self.entry_points: typing.Dict[str, int] = dict()
+
+    def bind(self, actions: typing.Mapping[CallbackKey, ActionCallback] = {},
+             queries: typing.Mapping[CallbackKey, QueryCallback] = {},
+             sub_flow: SubFlowCallback = _noop_sub_flow,
+             default_action: ActionCallback = _noop_action,
+             default_query: QueryCallback = _default_query) -> 'BoundFlowchart':
+        return BoundFlowchart(self, actions, queries, sub_flow, default_action, default_query)
+
+class BoundFlowchart:
+    """A compiled flowchart whose steps have been turned into closures."""
+    __slots__ = ['_program', '_steps', '_run_until']
+    def __init__(self, program: CompiledFlowchart,
+                 actions: typing.Mapping[CallbackKey, ActionCallback],
+                 queries: typing.Mapping[CallbackKey, QueryCallback],
+                 sub_flow: SubFlowCallback, default_action: ActionCallback,
+                 default_query: QueryCallback) -> None:
+        self._program = program
+        steps: typing.List[typing.Callable[[], int]] = []
+        self._steps = steps
+
+        def run_until(pc: int, stop: int) -> None:
+            while pc != _END and pc != stop:
+                pc = steps[pc]()
+
+        def make_action(fn, params, nxt):
+            def step() -> int:
+                fn(params)
+                return nxt
+            return step
+
+        def make_switch(fn, params, cases):
+            get = cases.get
+            def step() -> int:
+                return get(fn(params), _END)
+            return step
+
+        def make_fork(forks, join):
+            def step() -> int:
+                for fork in forks:
+                    run_until(fork, join)
+                return join
+            return step
+
+        def make_join(nxt):
+            return lambda: nxt
+
+        def make_sub_flow(res_flowchart_name, entry_point_name, params, nxt):
+            def step() -> int:
+                sub_flow(res_flowchart_name, entry_point_name, params)
+                return nxt
+            return step
+
+        for s in program.steps:
+            etype = s[0]
+            if etype == EventType.kAction:
+                steps.append(make_action(actions.get(s[1], default_action), s[2], s[3]))
+            elif etype == EventType.kSwitch:
+                steps.append(make_switch(queries.get(s[1], default_query), s[2], s[3]))
+            elif etype == EventType.kFork:
+                steps.append(make_fork(s[1], s[2]))
+            elif etype == EventType.kJoin:
+                steps.append(make_join(s[1]))
+            elif etype == EventType.kSubFlow:
+                steps.append(make_sub_flow(s[1], s[2], s[3], s[4]))
+
+        self._run_until = run_until
+
+    def run(self, entry_point_name: str) -> None:
+        self._run_until(self._program.entry_points[entry_point_name], _END)
+
+def compile_flowchart(flowchart: Flowchart,
+                      cache: typing.Optional[typing.MutableMapping[str, CompiledFlowchart]] = None) -> CompiledFlowchart:
+    """Compiles a flowchart into a step table.
+
+    If a cache mapping is given, it is looked up and filled using the flowchart digest."""
+    digest = flowchart_digest(flowchart) if cache is not None else ''
+    if cache is not None and digest in cache:
+        return cache[digest]
+
+    event_to_idx = make_values_to_index_map(flowchart.events)
+    def idx(event: typing.Optional[Event]) -> int:
+        return event_to_idx[event] if event else _END
+
+    program = CompiledFlowchart(digest)
+    for event in flowchart.events:
+        data = event.data
+        if isinstance(data, ActionEvent):
+            key = (str(data.actor.v.identifier), data.actor_action.v.v)
+            program.steps.append((EventType.kAction, key, data.params, idx(data.nxt.v)))
+        elif isinstance(data, SwitchEvent):
+            key = (str(data.actor.v.identifier), data.actor_query.v.v)
+            cases = {value: idx(case.v) for value, case in data.cases.items()}
+            program.steps.append((EventType.kSwitch, key, data.params, cases))
+        elif isinstance(data, ForkEvent):
+            forks = tuple(idx(fork.v) for fork in data.forks)
+            program.steps.append((EventType.kFork, forks, idx(data.join.v)))
+        elif isinstance(data, JoinEvent):
+            program.steps.append((EventType.kJoin, idx(data.nxt.v)))
+        elif isinstance(data, SubFlowEvent):
+            program.steps.append((EventType.kSubFlow, data.res_flowchart_name, data.entry_point_name,
+                                  data.params, idx(data.nxt.v)))
+
+    for entry_point in flowchart.entry_points:
+        program.entry_points[entry_point.name] = idx(entry_point.main_event.v)
+
+    if cache is not None:
+        cache[digest] = program
+    return program
+
+def interpret(flowchart: Flowchart, entry_point_name: str,
+              actions: typing.Mapping[CallbackKey, ActionCallback] = {},
+              queries: typing.Mapping[CallbackKey, QueryCallback] = {},
+              sub_flow: SubFlowCallback = _noop_sub_flow,
+              default_action: ActionCallback = _noop_action,
+              default_query: QueryCallback = _default_query) -> None:
+    """Reference implementation that walks the event graph directly.
+
+    Semantics are identical to CompiledFlowchart.bind(...).run(...)."""
+    def run_until(event: typing.Optional[Event], stop: typing.Optional[Event]) -> None:
+        while event is not None and event is not stop:
+            data = event.data
+            if isinstance(data, ActionEvent):
+                key = (str(data.actor.v.identifier), data.actor_action.v.v)
+                actions.get(key, default_action)(data.params)
+                event = data.nxt.v
+            elif isinstance(data, SwitchEvent):
+                key = (str(data.actor.v.identifier), data.actor_query.v.v)
+                case = data.cases.get(queries.get(key, default_query)(data.params))
+                event = case.v if case else None
+            elif isinstance(data, ForkEvent):
+                for fork in data.forks:
+                    run_until(fork.v, data.join.v)
+                event = data.join.v
+            elif isinstance(data, JoinEvent):
+                event = data.nxt.v
+            elif isinstance(data, SubFlowEvent):
+                sub_flow(data.res_flowchart_name, data.entry_point_name, data.params)
+                event = data.nxt.v
+
+    for entry_point in flowchart.entry_points:
+        if entry_point.name == entry_point_name:
+            run_until(entry_point.main_event.v, None)
+            return
+    raise KeyError(entry_point_name)
@@ -1,6 +1,10 @@
+import array
+import hashlib
+import struct
+import sys
 import typing
 
-from evfl.common import ActorIdentifier, Argument
+from evfl.common import ActorIdentifier, Argument, BoolArray, StringArray
 from evfl.dic import DicReader, DicWriter
 from evfl.enums import ContainerDataType
 from evfl.util import *
@@ -16,19 +20,286 @@ ContainerDataPyTypes = typing.Union[
     typing.List[bool],
     typing.List[float],
     typing.List[str],
+    # Int and float arrays are read as array.array("i") and array.array("f"),
+    # bool and string arrays as BoolArray and StringArray.
+    array.array,
+    BoolArray,
+    StringArray,
 ]
 
+_F32_MAX = 3.4028234663852886e38
+
+
+def _check_scalar(value: typing.Any) -> typing.Optional[str]:
+    value_type = type(value)
+    if value_type is bool:
+        return None
+    if value_type is int:
+        return None if -0x80000000 <= value <= 0x7FFFFFFF else f"{value} does not fit in s32"
+    if value_type is float:
+        return f"{value} does not fit in f32" if _F32_MAX < abs(value) < float("inf") else None
+    if isinstance(value, str):
+        return None if len(value.encode()) <= 0xFFFF else "string is too long"
+    return f"unsupported type {value_type.__name__}"
+
+
+_TYPED_LISTS = {
+    BoolArray: ContainerDataType.kBoolArray,
+    StringArray: ContainerDataType.kStringArray,
+}
+_INT_TYPECODES = "bBhHiIlLqQ"
+_FLOAT_TYPECODES = "fd"
+_IS_BIG_ENDIAN = sys.byteorder == "big"
+
+
+def _list_data_type(value: list) -> ContainerDataType:
+    """Returns the array type of a list based on all of its items, or on its type for BoolArray
+    and StringArray, which keep their type when empty.
+    Raises ValueError if a plain list is empty or if the items cannot be stored in a single array."""
+    typed = _TYPED_LISTS.get(type(value))
+    if not value:
+        if typed is None:
+            raise ValueError("empty list")
+        return typed
+    data_type = _items_data_type(value)
+    if typed is not None and data_type != typed:
+        raise ValueError(f"{type(value).__name__} items must be {_ARRAY_ITEM_TYPE_NAMES[typed]} values")
+    return data_type
+
+
+def _items_data_type(value: list) -> ContainerDataType:
+    types = set(map(type, value))
+    if types == {bool}:
+        return ContainerDataType.kBoolArray
+    if types == {int}:
+        return ContainerDataType.kIntArray
+    if types <= {int, float}:
+        return ContainerDataType.kFloatArray
+    if all(issubclass(t, str) for t in types):
+        return ContainerDataType.kStringArray
+
+    # Find the first item that does not match the type of the first item for a useful message.
+    first_type = type(value[0])
+    if first_type is bool:
+        expected: typing.Tuple[type, ...] = (bool,)
+    elif first_type is int or first_type is float:
+        expected = (int, float)
+    elif issubclass(first_type, str):
+        expected = (str,)
+    else:
+        raise ValueError(f"unsupported list item type {first_type.__name__}")
+    for i, item in enumerate(value):
+        if type(item) not in expected and not (expected[0] is str and isinstance(item, str)):
+            raise ValueError(f"item {i} has type {type(item).__name__} (expected {first_type.__name__})")
+    raise ValueError("unsupported list")
+
+
+def _array_data_type(value: array.array) -> ContainerDataType:
+    if value.typecode in _INT_TYPECODES:
+        return ContainerDataType.kIntArray
+    if value.typecode in _FLOAT_TYPECODES:
+        return ContainerDataType.kFloatArray
+    raise ValueError(f"unsupported array typecode {value.typecode!r}")
+
+
+_ARRAY_ITEM_TYPE_NAMES = {
+    ContainerDataType.kIntArray: "int",
+    ContainerDataType.kFloatArray: "float",
+    ContainerDataType.kBoolArray: "bool",
+    ContainerDataType.kStringArray: "str",
+}
+
+
+def _canonical_item_type(value: typing.Union[list, array.array]) -> str:
+    try:
+        if type(value) is array.array:
+            return _ARRAY_ITEM_TYPE_NAMES[_array_data_type(value)] if value else ""
+        return _ARRAY_ITEM_TYPE_NAMES[_list_data_type(value)]
+    except ValueError:
+        return type(value[0]).__name__ if value else ""
+
+
+def _check_value(value: typing.Any) -> typing.Optional[str]:
+    value_type = type(value)
+    if value_type is ActorIdentifier:
+        return None
+    if not isinstance(value, list) and value_type is not array.array:
+        return _check_scalar(value)
+    if len(value) > 0xFFFF:
+        return f"too many list items ({len(value)})"
+    try:
+        if value_type is array.array:
+            data_type = _array_data_type(value)
+        else:
+            data_type = _list_data_type(value)
+    except ValueError as e:
+        return str(e)
+    if data_type == ContainerDataType.kIntArray and (value_type is not array.array or value.typecode != "i"):
+        for i, item in enumerate(value):
+            problem = _check_scalar(item)
+            if problem:
+                return f"item {i}: {problem}"
+    elif data_type == ContainerDataType.kFloatArray and (value_type is not array.array or value.typecode != "f"):
+        for i, item in enumerate(value):
+            problem = _check_scalar(float(item))
+            if problem:
+                return f"item {i}: {problem}"
+    elif data_type == ContainerDataType.kStringArray:
+        for i, item in enumerate(value):
+            problem = _check_scalar(item)
+            if problem:
+                return f"item {i}: {problem}"
+    return None
+
+
+_F32 = struct.Struct("<f")
+
+
+def _f32_bytes(value: float) -> bytes:
+    try:
+        return _F32.pack(value)
+    except OverflowError:
+        # Does not fit in f32 (see _check_scalar); the f64 encoding keeps the value distinct.
+        return struct.pack("<d", value)
+
+
+def _pascal_string_size(value: str) -> int:
+    # u16 length, UTF-8 data and a null terminator (see pascal_string).
+    return len(value.encode()) + 3
+
+
+def _read_array(stream: ReadStream, typecode: str, num_items: int) -> array.array:
+    values = array.array(typecode)
+    values.frombytes(stream.read(4 * num_items))
+    if _IS_BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def _array_bytes(typecode: str, value: typing.Union[list, array.array]) -> bytes:
+    """Packs an int or float sequence as little endian s32 or f32 values."""
+    if type(value) is not array.array or value.typecode != typecode or _IS_BIG_ENDIAN:
+        value = array.array(typecode, value)
+        if _IS_BIG_ENDIAN:
+            value.byteswap()
+    return value.tobytes()
+
+
+def _item_layout(value: ContainerDataPyTypes) -> typing.Tuple[ContainerDataType, int, typing.Optional[typing.Sequence[str]], int]:
+    """Returns the data type, item count, strings and string alignment of a container item.
+    Items without strings store their values as 4-byte words (see _item_values).
+    Used both for writing and for measuring, so the two cannot disagree on the layout."""
+    # Must come first because bool is derived from int.
+    if isinstance(value, bool):
+        return ContainerDataType.kBool, 1, None, 0
+    if isinstance(value, int):
+        return ContainerDataType.kInt, 1, None, 0
+    if isinstance(value, float):
+        return ContainerDataType.kFloat, 1, None, 0
+    if isinstance(value, str):
+        data_type = ContainerDataType.kArgument if isinstance(value, Argument) else ContainerDataType.kString
+        return data_type, 1, (value,), 8
+    if isinstance(value, ActorIdentifier):
+        # An actor identifier is treated as two strings. But unlike regular string arrays,
+        # the strings are aligned to 2-byte boundaries. Yes, Nintendo inconsistency strikes again.
+        return ContainerDataType.kActorIdentifier, 2, (value.name, value.sub_name), 2
+    if isinstance(value, array.array):
+        return _array_data_type(value), len(value), None, 0
+    if isinstance(value, list):
+        # Arrays are typed after all of their items, not just the first one.
+        data_type = _list_data_type(value)
+        if data_type == ContainerDataType.kStringArray:
+            return data_type, len(value), value, 8  # type: ignore
+        return data_type, len(value), None, 0
+    raise ValueError(f"Invalid data type")
+
+
+def _item_values(value: ContainerDataPyTypes, data_type: ContainerDataType) -> bytes:
+    if data_type == ContainerDataType.kBool:
+        return u32(0x80000001 if value else 0)
+    if data_type == ContainerDataType.kInt:
+        return s32(value)  # type: ignore
+    if data_type == ContainerDataType.kFloat:
+        return f32(value)  # type: ignore
+    if data_type == ContainerDataType.kIntArray:
+        return _array_bytes("i", value)  # type: ignore
+    if data_type == ContainerDataType.kBoolArray:
+        return _array_bytes("i", [1 if v else 0 for v in value])  # type: ignore
+    return _array_bytes("f", value)  # type: ignore
+
 
 class Container(BinaryObject):
     __slots__ = ["data"]
 
-    def __init__(self) -> None:
+    def __init__(self, data: typing.Optional[typing.Dict[str, ContainerDataPyTypes]] = None) -> None:
         super().__init__()
-        self.data: typing.Dict[str, ContainerDataPyTypes] = dict()
+        self.data: typing.Dict[str, ContainerDataPyTypes] = data if data is not None else dict()
 
     def __repr__(self) -> str:
         return f"Container({self.data})"
 
+    def content_key(self) -> tuple:
+        """Returns a hashable representation of the items that distinguishes value types and item order.
+
+        Floats are represented by their f32 encoding, so the keys of two containers are equal
+        if and only if they are written identically (0.0 and -0.0 differ, NaN equals itself).
+        Containers are mutable, so they compare and hash by identity; use this to compare contents."""
+        items = []
+        for key, value in self.data.items():
+            value_type = type(value)
+            if isinstance(value, list) or value_type is array.array:
+                # Lists and arrays that are written identically compare equal.
+                item_type = _canonical_item_type(value)
+                if item_type == "float":
+                    items.append((key, "list", item_type, _array_bytes("f", value)))
+                else:
+                    items.append((key, "list", item_type, tuple(value)))
+            elif value_type is float:
+                items.append((key, "float", _f32_bytes(value)))
+            elif value_type is ActorIdentifier:
+                items.append((key, "ActorIdentifier", value.name, value.sub_name))
+            else:
+                items.append((key, value_type.__name__, value))
+        return tuple(items)
+
+    def digest(self) -> bytes:
+        """Returns a stable hash of content_key(). It is computed from all items on every call."""
+        return hashlib.blake2b(repr(self.content_key()).encode(), digest_size=16).digest()
+
+    def clone(self) -> "Container":
+        """Returns a copy of this container. Immutable values are shared."""
+        data = self.data.copy()
+        for key, value in data.items():
+            value_type = type(value)
+            if value_type is array.array:
+                data[key] = value[:]
+            elif isinstance(value, list):
+                data[key] = value_type(value)
+            elif value_type is ActorIdentifier:
+                data[key] = ActorIdentifier(value.name, value.sub_name)
+        copy = object.__new__(Container)
+        copy.data = data
+        return copy
+
+    def validate(self) -> typing.List[str]:
+        """Returns a list of problems that would prevent this container from being written."""
+        problems: typing.List[str] = []
+        if len(self.data) > 0xFFFF:
+            problems.append(f"too many items ({len(self.data)})")
+        for key, value in self.data.items():
+            if not key:
+                problems.append("empty key")
+            problem = _check_value(value)
+            if problem:
+                problems.append(f"{key!r}: {problem}")
+        return problems
+
+    def __getstate__(self):
+        return (self.data,)
+
+    def __setstate__(self, state) -> None:
+        (self.data,) = state
+
     def _do_read(self, stream: ReadStream) -> None:
         data_type = stream.read_u8()
         if data_type != ContainerDataType.kContainer:
@@ -55,22 +326,22 @@ class Container(BinaryObject):
         if data_type == ContainerDataType.kInt:
             return stream.read_s32()
         if data_type == ContainerDataType.kIntArray:
-            return [stream.read_s32() for i in range(num_items)]
+            return _read_array(stream, "i", num_items)
 
         if data_type == ContainerDataType.kBool:
             return bool(stream.read_s32())
         if data_type == ContainerDataType.kBoolArray:
-            return [bool(stream.read_s32()) for i in range(num_items)]
+            return BoolArray(v != 0 for v in _read_array(stream, "i", num_items))
 
         if data_type == ContainerDataType.kFloat:
             return stream.read_f32()
         if data_type == ContainerDataType.kFloatArray:
-            return [stream.read_f32() for i in range(num_items)]
+            return _read_array(stream, "f", num_items)
 
         if data_type == ContainerDataType.kString:
             return stream.read_string_ref()
         if data_type == ContainerDataType.kStringArray:
-            return [stream.read_string_ref() for i in range(num_items)]
+            return StringArray(stream.read_string_ref() for i in range(num_items))
 
         if data_type == ContainerDataType.kArgument:
             return Argument(stream.read_string_ref())
@@ -78,6 +349,8 @@ class Container(BinaryObject):
         if data_type == ContainerDataType.kActorIdentifier:
             actor_identifier = ActorIdentifier()
             actor_identifier.read(stream)
+            if stream.intern_table is not None:
+                return stream.intern_table.identifier(actor_identifier)
             return actor_identifier
 
         if data_type == ContainerDataType.kContainer:
@@ -91,6 +364,10 @@ class Container(BinaryObject):
         raise ValueError(f"Unknown data type: {data_type}")
 
     def _do_write(self, stream: WriteStream) -> None:
+        if stream.measure_only:
+            self._measure(stream)
+            return
+
         stream.write(u8(ContainerDataType.kContainer))
         stream.write(u8(0))  # Padding
         stream.write(u16(len(self.data)))
@@ -112,6 +389,44 @@ class Container(BinaryObject):
             ptr_writer.write_current_offset(stream)
             self._write_item(stream, value)
 
+    def _measure(self, stream: SizeCountingWriteStream) -> None:
+        """Registers the same pointers and strings as _do_write and advances the stream by the same
+        number of bytes, without packing any data. Items are laid out with _item_layout, which is
+        shared with _write_item."""
+        start = pos = stream.tell()
+        num_items = len(self.data)
+        pos += 8
+        stream.register_pointer(pos)  # DIC
+        pos += 8
+        for i in range(num_items):
+            stream.register_pointer(pos)
+            pos += 8
+
+        # DIC: magic, entry count and one entry per unique non-empty key plus the root entry.
+        pos += 8
+        stream.register_string("")
+        stream.register_pointer(pos + 8)
+        pos += 16
+        for key in self.data.keys():
+            if key:
+                stream.register_string(key)
+                stream.register_pointer(pos + 8)
+                pos += 16
+
+        for value in self.data.values():
+            pos = align_up(pos, 8) + 16
+            data_type, num_items, strings, string_alignment = _item_layout(value)
+            if strings is None:
+                pos += 4 * num_items
+                continue
+            for i in range(num_items):
+                stream.register_pointer(pos)
+                pos += 8
+            for string in strings:
+                pos = align_up(pos, string_alignment) + _pascal_string_size(string)
+
+        stream.advance(pos - start)
+
     def _write_item_common_header(self, stream: WriteStream, data_type, num_items: int) -> None:
         stream.write(u8(data_type))
         stream.write(u8(0))  # Padding
@@ -120,71 +435,18 @@ class Container(BinaryObject):
         stream.write(u64(0))  # DIC pointer
 
     def _write_item(self, stream: WriteStream, value: ContainerDataPyTypes) -> None:
-        # Must come first because bool is derived from int.
-        if isinstance(value, bool):
-            self._write_item_common_header(stream, ContainerDataType.kBool, 1)
-            stream.write(u32(0x80000001 if value else 0))
-
-        elif isinstance(value, int):
-            self._write_item_common_header(stream, ContainerDataType.kInt, 1)
-            stream.write(s32(value))
-
-        elif isinstance(value, float):
-            self._write_item_common_header(stream, ContainerDataType.kFloat, 1)
-            stream.write(f32(value))
+        data_type, num_items, strings, string_alignment = _item_layout(value)
+        self._write_item_common_header(stream, data_type, num_items)
+        if strings is None:
+            stream.write(_item_values(value, data_type))
+            return
 
         # Yes, for some reason strings that appear in containers are not put into the string pool.
         # Nintendo is really consistent at being inconsistent.
-        elif isinstance(value, str):
-            if isinstance(value, Argument):
-                self._write_item_common_header(stream, ContainerDataType.kArgument, 1)
-            else:
-                self._write_item_common_header(stream, ContainerDataType.kString, 1)
-            ptr_writer = stream.write_placeholder_ptr()
+        ptr_writers: typing.List[PlaceholderWriter] = []
+        for i in range(num_items):
+            ptr_writers.append(stream.write_placeholder_ptr())
+        for ptr_writer, string in zip(ptr_writers, strings):
+            stream.align(string_alignment)
             ptr_writer.write_current_offset(stream)
-            stream.write(pascal_string(value))
-
-        elif isinstance(value, ActorIdentifier):
-            # An actor identifier is treated as two strings.
-            self._write_item_common_header(stream, ContainerDataType.kActorIdentifier, 2)
-            ptr_writer1 = stream.write_placeholder_ptr()
-            ptr_writer2 = stream.write_placeholder_ptr()
-            ptr_writer1.write_current_offset(stream)
-            stream.write(pascal_string(value.name))
-            # But unlike regular string arrays, the strings are aligned to 2-byte boundaries.
-            # Yes, Nintendo inconsistency strikes again.
-            stream.align(2)
-            ptr_writer2.write_current_offset(stream)
-            stream.write(pascal_string(value.sub_name))
-
-        elif isinstance(value, list):
-            if isinstance(value[0], int):
-                self._write_item_common_header(stream, ContainerDataType.kIntArray, len(value))
-                for v in value:
-                    stream.write(s32(v))
-
-            elif isinstance(value[0], bool):
-                self._write_item_common_header(stream, ContainerDataType.kBoolArray, len(value))
-                for v in value:
-                    stream.write(s32(1 if v else 0))
-
-            elif isinstance(value[0], float):
-                self._write_item_common_header(stream, ContainerDataType.kFloatArray, len(value))
-                for v in value:
-                    stream.write(f32(v))  # type: ignore
-
-            elif isinstance(value[0], str):
-                self._write_item_common_header(stream, ContainerDataType.kStringArray, len(value))
-                ptr_writers: typing.List[PlaceholderWriter] = []
-                for i in range(len(value)):
-                    ptr_writers.append(stream.write_placeholder_ptr())
-                for ptr_writer, v in zip(ptr_writers, value):
-                    stream.align(8)
-                    ptr_writer.write_current_offset(stream)
-                    stream.write(pascal_string(v))  # type: ignore
-
-            else:
-                raise ValueError(f"Invalid array data type")
-
-        else:
-            raise ValueError(f"Invalid data type")
+            stream.write(pascal_string(string))
@@ -134,20 +134,32 @@ class Tree(_Node):
                 for idx, node in self._entries.values()]
 
 class DicWriter(BinaryObject):
-    __slots__ = ['_tree']
+    __slots__ = ['_names']
     def __init__(self) -> None:
         super().__init__()
-        self._tree = Tree()
+        self._names: typing.List[str] = []
 
     def insert(self, key: str) -> None:
-        self._tree.insert(key)
+        self._names.append(key)
 
     def _do_read(self, stream: ReadStream) -> None:
         raise NotImplementedError()
 
     def _do_write(self, stream: WriteStream) -> None:
         stream.write(b'DIC ')
-        index_table = self._tree.get_index_table()
+        if stream.measure_only:
+            # The index table only affects the contents of the entries, so the tree is not built.
+            names = [''] + list(dict.fromkeys(self._names))
+            stream.write(u32(len(names) - 1))
+            for name in names:
+                stream.write(u64(0))
+                stream.write_string_ref(name)
+            return
+
+        tree = Tree()
+        for name in self._names:
+            tree.insert(name)
+        index_table = tree.get_index_table()
         stream.write(u32(len(index_table) - 1))
         for entry in index_table:
             stream.write(u32(entry.compact_bit_idx & 0xffffffff))
@@ -0,0 +1,283 @@
+"""Structural diff and patch between event flows.
+
+Both flows are converted to text records (see evfl.text). Actors are matched by identifier,
+entry points by name and events by name and then by content; other timeline structures are
+matched by content. Matching only relies on dict lookups, so diffing is linear in the size
+of the flows.
+
+A record from the source flow is reused if it is identical to the matched target record once
+its references have been translated through the matches. Everything else is stored in the
+patch as a new record.
+"""
+from collections import defaultdict, deque
+import json
+import typing
+
+from evfl import text
+from evfl.evfl import EventFlow
+
+_Records = typing.List[dict]
+_Map = typing.Dict[int, int]
+
+_LIST_OF_RECORD_TYPE = {
+    'actor': 'actors',
+    'action': 'events',
+    'switch': 'events',
+    'fork': 'events',
+    'join': 'events',
+    'sub_flow': 'events',
+    'entry_point': 'entry_points',
+    'clip': 'clips',
+    'oneshot': 'oneshots',
+    'trigger': 'triggers',
+    'subtimeline': 'subtimelines',
+    'cut': 'cuts',
+}
+
+# Lists must come after the lists they refer to (triggers refer to clips).
+_SECTION_LISTS = {
+    'flowchart': ('actors', 'entry_points', 'events'),
+    'timeline': ('actors', 'clips', 'oneshots', 'triggers', 'subtimelines', 'cuts'),
+}
+
+_EVENT_REF_FIELDS = ('name', 'nxt', 'join', 'forks', 'cases')
+
+_encode_key = json.JSONEncoder(check_circular=False, separators=(',', ':')).encode
+
+class ListPatch(typing.NamedTuple):
+    # Number of records in the source list (used to detect patches applied to the wrong flow).
+    source_size: int
+    # Runs of matched records: (source index, target index, count).
+    matches: typing.List[typing.Tuple[int, int, int]]
+    # Target list as a sequence of ('copy', source index, count) and ('insert', records) operations.
+    ops: typing.List[tuple]
+
+class SectionPatch(typing.NamedTuple):
+    record: dict
+    lists: typing.Dict[str, ListPatch]
+    # Name of the flowchart or timeline the section is computed from, or None if it is new.
+    source_name: typing.Optional[str] = None
+
+class Patch(typing.NamedTuple):
+    header: dict
+    # Section patches of every flowchart and timeline of the target flow, keyed by name.
+    flowcharts: typing.Dict[str, SectionPatch]
+    timelines: typing.Dict[str, SectionPatch]
+    changed: bool
+
+    @property
+    def flowchart(self) -> typing.Optional[SectionPatch]:
+        """The section patch of the first flowchart."""
+        return next(iter(self.flowcharts.values()), None)
+
+    @property
+    def timeline(self) -> typing.Optional[SectionPatch]:
+        """The section patch of the first timeline."""
+        return next(iter(self.timelines.values()), None)
+
+    def num_inserted(self) -> int:
+        """Returns the number of records that are stored in the patch."""
+        count = 0
+        for section in list(self.flowcharts.values()) + list(self.timelines.values()):
+            for list_patch in section.lists.values():
+                count += sum(len(op[1]) for op in list_patch.ops if op[0] == 'insert')
+        return count
+
+_Section = typing.Tuple[dict, typing.Dict[str, _Records]]
+
+def _split(flow: EventFlow) -> typing.Tuple[dict, typing.Dict[str, typing.Dict[str, _Section]]]:
+    """Returns the header record and the sections of every type, keyed by block name in file order."""
+    header: dict = dict()
+    sections: typing.Dict[str, typing.Dict[str, _Section]] = {section: dict() for section in _SECTION_LISTS}
+    lists: typing.Dict[str, _Records] = dict()
+    for record in text.iter_records(flow):
+        record_type = record['type']
+        if record_type == 'header':
+            header = record
+        elif record_type in _SECTION_LISTS:
+            lists = {name: [] for name in _SECTION_LISTS[record_type]}
+            sections[record_type][record['name']] = (record, lists)
+        else:
+            lists[_LIST_OF_RECORD_TYPE[record_type]].append(record)
+    return header, sections
+
+def _pair_sections(a: typing.Dict[str, _Section], b: typing.Dict[str, _Section]) -> typing.Dict[str, typing.Optional[str]]:
+    """Returns the name of the source section of every target section: the section with the same
+    name, or else the next source section that has no target section with its name."""
+    unpaired = iter([name for name in a if name not in b])
+    return {name: name if name in a else next(unpaired, None) for name in b}
+
+def _empty_lists(section: str) -> typing.Dict[str, _Records]:
+    return {name: [] for name in _SECTION_LISTS[section]}
+
+def _translate(maps: typing.Dict[str, _Map], list_name: str, ref: typing.Optional[int]) -> typing.Optional[int]:
+    # Unmatched references are translated to -1, which never compares equal to a valid reference.
+    return None if ref is None else maps[list_name].get(ref, -1)
+
+def _remap(record: dict, section: str, maps: typing.Dict[str, _Map]) -> dict:
+    """Returns a copy of a source record with references translated to target indices."""
+    r = dict(record)
+    record_type = r['type']
+    if record_type == 'actor':
+        # Timelines store raw entry point indices that do not refer to anything in the timeline.
+        if section == 'flowchart':
+            r['argument_entry_point'] = _translate(maps, 'entry_points', r['argument_entry_point'])
+    elif record_type in ('action', 'join', 'sub_flow'):
+        r['nxt'] = _translate(maps, 'events', r['nxt'])
+        if record_type == 'action':
+            r['actor'] = _translate(maps, 'actors', r['actor'])
+    elif record_type == 'switch':
+        r['actor'] = _translate(maps, 'actors', r['actor'])
+        r['cases'] = [[value, _translate(maps, 'events', case)] for value, case in r['cases']]
+    elif record_type == 'fork':
+        r['join'] = _translate(maps, 'events', r['join'])
+        r['forks'] = [_translate(maps, 'events', fork) for fork in r['forks']]
+    elif record_type == 'entry_point':
+        r['main_event'] = _translate(maps, 'events', r['main_event'])
+    elif record_type in ('clip', 'oneshot'):
+        r['actor'] = _translate(maps, 'actors', r['actor'])
+    elif record_type == 'trigger':
+        r['clip'] = _translate(maps, 'clips', r['clip'])
+    return r
+
+def _match(a: _Records, b: _Records, a_key: typing.Callable[[dict], typing.Any], b_key: typing.Callable[[dict], typing.Any],
+           matches: _Map, b_matched: typing.Set[int]) -> None:
+    """Matches records with equal keys in order of appearance. Already matched records are skipped."""
+    candidates: typing.Dict[typing.Any, typing.Deque[int]] = defaultdict(deque)
+    for j, record in enumerate(b):
+        if j not in b_matched:
+            candidates[b_key(record)].append(j)
+    if not candidates:
+        return
+    for i, record in enumerate(a):
+        if i in matches:
+            continue
+        queue = candidates.get(a_key(record))
+        if queue:
+            j = queue.popleft()
+            matches[i] = j
+            b_matched.add(j)
+
+def _identifier_key(record: dict) -> tuple:
+    return tuple(record['identifier'])
+
+def _name_key(record: dict) -> str:
+    return record['name']
+
+def _event_content_key(record: dict) -> str:
+    return _encode_key({k: v for k, v in record.items() if k not in _EVENT_REF_FIELDS})
+
+def _match_list(section: str, name: str, a: _Records, b: _Records, maps: typing.Dict[str, _Map]) -> _Map:
+    matches: _Map = dict()
+    b_matched: typing.Set[int] = set()
+    if name == 'actors':
+        _match(a, b, _identifier_key, _identifier_key, matches, b_matched)
+    elif name == 'entry_points':
+        _match(a, b, _name_key, _name_key, matches, b_matched)
+    elif name == 'events':
+        _match(a, b, _name_key, _name_key, matches, b_matched)
+        # Renamed events are matched by their content.
+        _match(a, b, _event_content_key, _event_content_key, matches, b_matched)
+    else:
+        _match(a, b, lambda r: _encode_key(_remap(r, section, maps)), _encode_key, matches, b_matched)
+    return matches
+
+def _runs(pairs: typing.Iterable[typing.Tuple[int, int]]) -> typing.List[typing.Tuple[int, int, int]]:
+    runs: typing.List[typing.Tuple[int, int, int]] = []
+    for i, j in pairs:
+        if runs:
+            start_i, start_j, count = runs[-1]
+            if start_i + count == i and start_j + count == j:
+                runs[-1] = (start_i, start_j, count + 1)
+                continue
+        runs.append((i, j, 1))
+    return runs
+
+def _diff_list(section: str, a: _Records, b: _Records, maps: typing.Dict[str, _Map], matches: _Map) -> ListPatch:
+    # Records are compared in encoded form because dict comparisons ignore the order of
+    # container items, which is significant.
+    reused: _Map = dict()
+    for i, j in matches.items():
+        if _encode_key(_remap(a[i], section, maps)) == _encode_key(b[j]):
+            reused[j] = i
+
+    ops: typing.List[tuple] = []
+    for j, record in enumerate(b):
+        i = reused.get(j)
+        last = ops[-1] if ops else None
+        if i is not None:
+            if last and last[0] == 'copy' and last[1] + last[2] == i:
+                ops[-1] = ('copy', last[1], last[2] + 1)
+            else:
+                ops.append(('copy', i, 1))
+        elif last and last[0] == 'insert':
+            last[1].append(record)
+        else:
+            ops.append(('insert', [record]))
+
+    return ListPatch(len(a), _runs(sorted(matches.items())), ops)
+
+def diff(a: EventFlow, b: EventFlow) -> Patch:
+    """Computes a patch that turns a into b when applied with patch().
+
+    Flowcharts and timelines are paired by name; blocks that only exist under a different name
+    are paired in order, so a renamed block is still diffed against its old version."""
+    a_header, a_sections = _split(a)
+    b_header, b_sections = _split(b)
+    changed = a_header != b_header
+
+    section_patches: typing.Dict[str, typing.Dict[str, SectionPatch]] = dict()
+    for section in _SECTION_LISTS:
+        section_patches[section] = dict()
+        changed = changed or list(a_sections[section].keys()) != list(b_sections[section].keys())
+        for name, source_name in _pair_sections(a_sections[section], b_sections[section]).items():
+            b_record, b_lists = b_sections[section][name]
+            if source_name is None:
+                a_record, a_lists = None, _empty_lists(section)
+            else:
+                a_record, a_lists = a_sections[section][source_name]
+            changed = changed or a_record != b_record
+
+            maps: typing.Dict[str, _Map] = dict()
+            for list_name in _SECTION_LISTS[section]:
+                maps[list_name] = _match_list(section, list_name, a_lists[list_name], b_lists[list_name], maps)
+
+            lists: typing.Dict[str, ListPatch] = dict()
+            for list_name in _SECTION_LISTS[section]:
+                list_patch = _diff_list(section, a_lists[list_name], b_lists[list_name], maps, maps[list_name])
+                lists[list_name] = list_patch
+                changed = changed or list_patch.ops != ([('copy', 0, list_patch.source_size)] if list_patch.source_size else [])
+            section_patches[section][name] = SectionPatch(b_record, lists, source_name)
+
+    return Patch(b_header, section_patches['flowchart'], section_patches['timeline'], changed)
+
+def patch(flow: EventFlow, p: Patch) -> EventFlow:
+    """Applies a patch computed by diff() to the flow it was computed from. Returns a new EventFlow."""
+    header, sections = _split(flow)
+    records = [p.header]
+    for section, section_patches in (('flowchart', p.flowcharts), ('timeline', p.timelines)):
+        for section_patch in section_patches.values():
+            if section_patch.source_name is None:
+                lists = _empty_lists(section)
+            elif section_patch.source_name in sections[section]:
+                _, lists = sections[section][section_patch.source_name]
+            else:
+                raise ValueError(f'Patch does not apply: no {section} named {section_patch.source_name!r}')
+
+            maps: typing.Dict[str, _Map] = dict()
+            for name, list_patch in section_patch.lists.items():
+                if list_patch.source_size != len(lists[name]):
+                    raise ValueError(f'Patch does not apply: {section} has {len(lists[name])} {name} '
+                                     f'(expected {list_patch.source_size})')
+                maps[name] = {i + k: j + k for i, j, count in list_patch.matches for k in range(count)}
+
+            records.append(section_patch.record)
+            for name in _SECTION_LISTS[section]:
+                source = lists[name]
+                for op in section_patch.lists[name].ops:
+                    if op[0] == 'copy':
+                        records.extend(_remap(source[i], section, maps) for i in range(op[1], op[1] + op[2]))
+                    else:
+                        records.extend(op[1])
+
+    return text.from_records(records)
@@ -3,13 +3,12 @@ import evfl.event
 from evfl.util import *
 
 class EntryPoint(BinaryObject):
-    __slots__ = ['name', 'main_event', '_sub_flow_event_indices', '_sub_flow_event_indices_offset_writer']
+    __slots__ = ['name', 'main_event', '_sub_flow_event_indices']
     def __init__(self, name: str) -> None:
         super().__init__()
         self.name = name
         self.main_event: Index[evfl.event.Event] = Index()
         self._sub_flow_event_indices: typing.List[int] = []
-        self._sub_flow_event_indices_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def _do_read(self, stream: ReadStream) -> None:
         sub_flow_event_indices_offset = stream.read_u64()
@@ -27,7 +26,8 @@ class EntryPoint(BinaryObject):
                 self._sub_flow_event_indices = [stream.read_u16() for i in range(num_sub_flow_event_indices)]
 
     def _do_write(self, stream: WriteStream) -> None:
-        self._sub_flow_event_indices_offset_writer = stream.write_placeholder_ptr_if(bool(self._sub_flow_event_indices), register=True)
+        stream.set_scratch(self, 'sub_flow_event_indices',
+                           stream.write_placeholder_ptr_if(bool(self._sub_flow_event_indices), register=True))
         stream.write(u64(0)) # x8
         stream.write_nullptr(register=True) # ptr_x10
         stream.write(u16(len(self._sub_flow_event_indices)))
@@ -36,8 +36,9 @@ class EntryPoint(BinaryObject):
         stream.write(u16(0)) # x1e
 
     def write_extra_data(self, stream: WriteStream) -> None:
-        if self._sub_flow_event_indices_offset_writer:
-            self._sub_flow_event_indices_offset_writer.write_current_offset(stream)
+        offset_writer: typing.Optional[PlaceholderWriter] = stream.get_scratch(self, 'sub_flow_event_indices')
+        if offset_writer:
+            offset_writer.write_current_offset(stream)
             for idx in self._sub_flow_event_indices:
                 stream.write(u16(idx))
             stream.align(8)
@@ -24,13 +24,12 @@ class BaseEvent(metaclass=abc.ABCMeta):
         pass
 
 class ActionEvent(BaseEvent):
-    __slots__ = ['nxt', 'actor', 'actor_action', 'params', '_params_offset_writer']
+    __slots__ = ['nxt', 'actor', 'actor_action', 'params']
     def __init__(self) -> None:
         self.nxt: Index[Event] = Index()
         self.actor: RequiredIndex[evfl.actor.Actor] = RequiredIndex()
         self.actor_action: RequiredIndex[StringHolder] = RequiredIndex()
         self.params: typing.Optional[Container] = None
-        self._params_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def _read(self, stream: ReadStream) -> None:
         self.nxt._idx = stream.read_u16()
@@ -45,24 +44,20 @@ class ActionEvent(BaseEvent):
         stream.write(u16(self.nxt._idx))
         stream.write(u16(self.actor._idx))
         stream.write(u16(self.actor_action._idx))
-        self._params_offset_writer = stream.write_placeholder_ptr_if(_should_write_params(self.params))
+        stream.set_scratch(self, 'params', stream.write_placeholder_ptr_if(_should_write_params(self.params)))
         stream.write(u64(0))
         stream.write(u64(0))
 
     def _write_extra_data(self, stream: WriteStream) -> None:
-        if self._params_offset_writer and self.params:
-            self._params_offset_writer.write_current_offset(stream)
-            self.params.write(stream)
+        stream.write_object_at_placeholder(self, 'params', self.params)
 
 class SwitchEvent(BaseEvent):
-    __slots__ = ['actor', 'actor_query', 'params', 'cases', '_params_offset_writer', '_cases_offset_writer']
+    __slots__ = ['actor', 'actor_query', 'params', 'cases']
     def __init__(self) -> None:
         self.actor: RequiredIndex[evfl.actor.Actor] = RequiredIndex()
         self.actor_query: RequiredIndex[StringHolder] = RequiredIndex()
         self.params: typing.Optional[Container] = None
         self.cases: typing.Dict[int, RequiredIndex[Event]] = dict()
-        self._params_offset_writer: typing.Optional[PlaceholderWriter] = None
-        self._cases_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def _read(self, stream: ReadStream) -> None:
         num_cases = stream.read_u16() # can be zero.
@@ -83,30 +78,28 @@ class SwitchEvent(BaseEvent):
         stream.write(u16(len(self.cases))) # can be zero.
         stream.write(u16(self.actor._idx))
         stream.write(u16(self.actor_query._idx))
-        self._params_offset_writer = stream.write_placeholder_ptr_if(_should_write_params(self.params))
-        self._cases_offset_writer = stream.write_placeholder_ptr_if(bool(self.cases), register=True)
+        stream.set_scratch(self, 'params', stream.write_placeholder_ptr_if(_should_write_params(self.params)))
+        stream.set_scratch(self, 'cases', stream.write_placeholder_ptr_if(bool(self.cases), register=True))
         stream.write(u64(0))
 
     def _write_extra_data(self, stream: WriteStream) -> None:
         # Nintendo's software writes the switch case struct first.
-        if self._cases_offset_writer:
+        cases_offset_writer: typing.Optional[PlaceholderWriter] = stream.get_scratch(self, 'cases')
+        if cases_offset_writer:
             stream.align(8)
-            self._cases_offset_writer.write_current_offset(stream)
+            cases_offset_writer.write_current_offset(stream)
             for value, event in self.cases.items():
                 stream.write(u32(value))
                 stream.write(u16(event._idx))
                 stream.align(8)
 
-        if self._params_offset_writer and self.params:
-            self._params_offset_writer.write_current_offset(stream)
-            self.params.write(stream)
+        stream.write_object_at_placeholder(self, 'params', self.params)
 
 class ForkEvent(BaseEvent):
-    __slots__ = ['join', 'forks', '_forks_offset_writer']
+    __slots__ = ['join', 'forks']
     def __init__(self) -> None:
         self.join: RequiredIndex[Event] = RequiredIndex()
         self.forks: typing.List[RequiredIndex[Event]] = []
-        self._forks_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def _read(self, stream: ReadStream) -> None:
         num_forks = stream.read_u16()
@@ -127,13 +120,14 @@ class ForkEvent(BaseEvent):
         stream.write(u16(len(self.forks)))
         stream.write(u16(self.join._idx))
         stream.write(u16(0)) # Unused
-        self._forks_offset_writer = stream.write_placeholder_ptr()
+        stream.set_scratch(self, 'forks', stream.write_placeholder_ptr())
         stream.write(u64(0))
         stream.write(u64(0))
 
     def _write_extra_data(self, stream: WriteStream) -> None:
-        if self._forks_offset_writer:
-            self._forks_offset_writer.write_current_offset(stream)
+        forks_offset_writer: typing.Optional[PlaceholderWriter] = stream.get_scratch(self, 'forks')
+        if forks_offset_writer:
+            forks_offset_writer.write_current_offset(stream)
             for fork in self.forks:
                 stream.write(u16(fork._idx))
             stream.align(8)
@@ -165,13 +159,12 @@ class JoinEvent(BaseEvent):
         return
 
 class SubFlowEvent(BaseEvent):
-    __slots__ = ['nxt', 'params', 'res_flowchart_name', 'entry_point_name', '_params_offset_writer']
+    __slots__ = ['nxt', 'params', 'res_flowchart_name', 'entry_point_name']
     def __init__(self) -> None:
         self.nxt: Index[Event] = Index()
         self.params: typing.Optional[Container] = None
         self.res_flowchart_name = ''
         self.entry_point_name = ''
-        self._params_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def _read(self, stream: ReadStream) -> None:
         self.nxt._idx = stream.read_u16()
@@ -187,15 +180,13 @@ class SubFlowEvent(BaseEvent):
         stream.write(u16(self.nxt._idx))
         stream.write(u16(0)) # Unused
         stream.write(u16(0)) # Unused
-        self._params_offset_writer = stream.write_placeholder_ptr_if(_should_write_params(self.params))
+        stream.set_scratch(self, 'params', stream.write_placeholder_ptr_if(_should_write_params(self.params)))
         assert self.entry_point_name
         stream.write_string_ref(self.res_flowchart_name)
         stream.write_string_ref(self.entry_point_name)
 
     def _write_extra_data(self, stream: WriteStream) -> None:
-        if self._params_offset_writer and self.params:
-            self._params_offset_writer.write_current_offset(stream)
-            self.params.write(stream)
+        stream.write_object_at_placeholder(self, 'params', self.params)
 
 class Event(BinaryObject):
     __slots__ = ['name', 'data']
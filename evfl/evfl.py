@@ -1,20 +1,128 @@
+import functools
 import io
+import os
+import stat
 import struct
 import typing
+import uuid
 
-from evfl.dic import DicWriter
+from evfl import optimize
+from evfl.common import InternTable
+from evfl.dic import DicReader, DicWriter
 from evfl.flowchart import Flowchart
 from evfl.timeline import Timeline
 from evfl.util import *
 
+class BlockMap(typing.MutableMapping[str, T]):
+    """Flowcharts or timelines of an event flow, keyed by name and in file order.
+
+    When a file is read lazily, blocks are only parsed when they are first accessed.
+    Keys are the names that are looked up in the file's DIC; the names that are written
+    are those of the blocks themselves."""
+    __slots__ = ['_blocks', '_load']
+
+    def __init__(self, blocks: typing.Optional[typing.Mapping[str, T]] = None) -> None:
+        # Unread blocks are stored as their offset in the file.
+        self._blocks: typing.Dict[str, typing.Union[T, int]] = dict(blocks) if blocks else dict()
+        self._load: typing.Optional[typing.Callable[[int], T]] = None
+
+    def __repr__(self) -> str:
+        return f'BlockMap({list(self._blocks.keys())})'
+
+    def __getitem__(self, name: str) -> T:
+        block = self._blocks[name]
+        if type(block) is int:
+            block = self._load(block)  # type: ignore
+            self._blocks[name] = block
+        return block  # type: ignore
+
+    def __setitem__(self, name: str, block: T) -> None:
+        self._blocks[name] = block
+
+    def __delitem__(self, name: str) -> None:
+        del self._blocks[name]
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._blocks)
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def clear(self) -> None:
+        self._blocks.clear()
+
+    def first(self) -> typing.Optional[T]:
+        for name in self._blocks:
+            return self[name]
+        return None
+
+    def is_loaded(self, name: str) -> bool:
+        return type(self._blocks[name]) is not int
+
+    def load_all(self) -> None:
+        for name in self._blocks:
+            self[name]
+
+    def __getstate__(self):
+        # Unread blocks refer to the original data, which is not pickled.
+        self.load_all()
+        return (self._blocks,)
+
+    def __setstate__(self, state) -> None:
+        (self._blocks,) = state
+        self._load = None
+
+def _read_block(data: bytes, intern_table: typing.Optional[InternTable], block_type: type, offset: int):
+    stream = ReadStream(data, intern_table)
+    with SeekContext(stream, offset):
+        block = block_type()
+        block.read(stream)
+    return block
+
 class EventFlow:
     def __init__(self) -> None:
         self.name = ''
-        self.flowchart: typing.Optional[Flowchart] = None
-        self.timeline: typing.Optional[Timeline] = None
+        self.flowcharts: BlockMap[Flowchart] = BlockMap()
+        self.timelines: BlockMap[Timeline] = BlockMap()
+
+    @property
+    def flowchart(self) -> typing.Optional[Flowchart]:
+        """The first flowchart. Setting it replaces all flowcharts."""
+        return self.flowcharts.first()
+
+    @flowchart.setter
+    def flowchart(self, flowchart: typing.Optional[Flowchart]) -> None:
+        self.flowcharts.clear()
+        if flowchart is not None:
+            self.flowcharts[flowchart.name] = flowchart
 
-    def read(self, data: bytes) -> None:
-        stream = ReadStream(data)
+    @property
+    def timeline(self) -> typing.Optional[Timeline]:
+        """The first timeline. Setting it replaces all timelines."""
+        return self.timelines.first()
+
+    @timeline.setter
+    def timeline(self, timeline: typing.Optional[Timeline]) -> None:
+        self.timelines.clear()
+        if timeline is not None:
+            self.timelines[timeline.name] = timeline
+
+    def __setstate__(self, state: dict) -> None:
+        # Flows that were pickled before multiple blocks were supported.
+        if 'flowchart' in state:
+            flowchart = state.pop('flowchart')
+            timeline = state.pop('timeline')
+            state['flowcharts'] = BlockMap({flowchart.name: flowchart} if flowchart else None)
+            state['timelines'] = BlockMap({timeline.name: timeline} if timeline else None)
+        self.__dict__.update(state)
+
+    def read(self, data: bytes, intern_table: typing.Optional[InternTable] = None, lazy: bool = False) -> None:
+        """Reads a flow from data. If an intern table is passed, equal strings and actor identifiers
+        are shared with all other flows that were read with the same table.
+
+        If lazy is set, flowcharts and timelines are only parsed when they are first accessed
+        and data must not be modified until then."""
+        stream = ReadStream(data, intern_table)
 
         magic = stream.read(8)
         if magic != b'BFEVFL\x00\x00':
@@ -43,28 +151,128 @@ class EventFlow:
 
         num_flowcharts = stream.read_u16()
         num_timelines = stream.read_u16()
-        assert 0 <= num_flowcharts <= 1 and 0 <= num_timelines <= 1
 
         x24 = stream.read_u32()
         assert x24 == 0
 
         flowchart_ptr_offset = stream.read_u64()
         flowchart_dic_offset = stream.read_u64()
-        if num_flowcharts == 1:
-            with SeekContext(stream, flowchart_ptr_offset):
-                self.flowchart = stream.read_ptr_object(Flowchart)
-
         timeline_ptr_offset = stream.read_u64()
         timeline_dic_offset = stream.read_u64()
-        if num_timelines == 1:
-            with SeekContext(stream, timeline_ptr_offset):
-                self.timeline = stream.read_ptr_object(Timeline)
+        self.flowcharts = self._read_blocks(stream, Flowchart, num_flowcharts, flowchart_ptr_offset,
+                                            flowchart_dic_offset, lazy)
+        self.timelines = self._read_blocks(stream, Timeline, num_timelines, timeline_ptr_offset,
+                                           timeline_dic_offset, lazy)
+
+    @staticmethod
+    def _read_blocks(stream: ReadStream, block_type: type, num_blocks: int, ptr_offset: int,
+                     dic_offset: int, lazy: bool) -> BlockMap:
+        blocks: BlockMap = BlockMap()
+        if num_blocks == 0:
+            return blocks
+        with SeekContext(stream, ptr_offset):
+            offsets = [stream.read_u64() for i in range(num_blocks)]
+        blocks._load = functools.partial(_read_block, stream.data, stream.intern_table, block_type)
+
+        # Blocks are named by the DIC, whose entries are in the same order as the array.
+        names: typing.List[str] = []
+        if dic_offset != 0:
+            with SeekContext(stream, dic_offset):
+                dic = DicReader()
+                dic.read(stream)
+            names = dic.items
+        if len(names) != num_blocks:
+            for offset in offsets:
+                block = blocks._load(offset)
+                blocks[block.name] = block
+            return blocks
+
+        for name, offset in zip(names, offsets):
+            blocks._blocks[name] = offset
+        if not lazy:
+            blocks.load_all()
+        return blocks
+
+    def validate(self) -> typing.List[str]:
+        """Checks that this flow can be written without writing anything.
+        Returns all problems that were found (an empty list if the flow is valid)."""
+        problems: typing.List[str] = []
+        if not self.flowcharts and not self.timelines:
+            problems.append('at least one flowchart or timeline must be set')
+        for kind, blocks in (('flowchart', self.flowcharts), ('timeline', self.timelines)):
+            if len(blocks) > 0xFFFF:
+                problems.append(f'too many {kind}s ({len(blocks)})')
+            names: typing.Set[str] = set()
+            for key, block in blocks.items():
+                # Files with a single block keep the short prefix.
+                where = kind if len(blocks) == 1 else f'{kind} {key!r}'
+                if block.name in names:
+                    problems.append(f'{where}: duplicate name')
+                names.add(block.name)
+                if key != block.name:
+                    problems.append(f'{where}: stored under a different name than its own ({block.name!r})')
+                problems.extend(f'{where}: {p}' for p in block.validate())
+        return problems
 
-    def write(self, underlying_stream: typing.BinaryIO) -> bool:
-        stream = WriteStream(underlying_stream)
+    def serialized_size(self, prune: bool = False) -> int:
+        """Returns the exact size in bytes of the file that write() would produce.
+
+        The writer runs against a stream that only counts bytes and skips building DIC trees
+        and sorting the string pool, so this is considerably cheaper than a real write."""
+        stream = SizeCountingWriteStream()
+        if not self.write_to_stream(stream, prune):
+            raise ValueError('at least one flowchart or timeline must be set')
+        return stream.size()
+
+    def write(self, underlying_stream: typing.BinaryIO, prune: bool = False) -> bool:
+        """Writes the flow to a binary stream. Returns False if the flow has no flowchart or timeline.
+
+        If prune is set, unused actors, actions and queries are left out (see evfl.optimize.prune_unused).
+        The flow itself is not modified."""
+        return self.write_to_stream(WriteStream(underlying_stream), prune)
+
+    def write_file(self, path: str, prune: bool = False) -> bool:
+        """Writes the flow to path atomically, by writing a temporary file in the same directory
+        and renaming it over path. Returns False and leaves path untouched if the flow cannot be written.
+
+        The file is built in memory first so that back-patching never seeks in the file itself.
+        The temporary file is flushed to disk before the rename, and it is given the permissions
+        of the file it replaces (new files get the usual permissions allowed by the umask)."""
+        stream = io.BytesIO()
+        if not self.write(stream, prune):
+            return False
+
+        try:
+            mode: typing.Optional[int] = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = None
+        tmp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # The mode passed to os.open is masked by the umask.
+                if mode is not None:
+                    os.chmod(tmp_path, mode)
+                f.write(stream.getbuffer())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
 
-        if not ((self.flowchart or self.timeline) and not (self.flowchart and self.timeline)):
+    def write_to_stream(self, stream: WriteStream, prune: bool = False) -> bool:
+        flowcharts = list(self.flowcharts.values())
+        timelines = list(self.timelines.values())
+        if not flowcharts and not timelines:
             return False
+        if prune:
+            # Copies are pruned so that the flow itself is left untouched.
+            flowcharts = [flowchart.clone() for flowchart in flowcharts]
+            timelines = [timeline.clone() for timeline in timelines]
+            for block in flowcharts + timelines:  # type: ignore
+                optimize.prune_unused(block)
 
         # Header
         stream.write(b'BFEVFL\x00\x00')
@@ -79,42 +287,51 @@ class EventFlow:
         first_block_offset_writer = stream.write_placeholder_u16()
         relocation_table_offset_writer = stream.write_placeholder_u32()
         file_size_writer = stream.write_placeholder_u32()
-        stream.write(u16(1 if self.flowchart else 0))
-        stream.write(u16(1 if self.timeline else 0))
+        stream.write(u16(len(flowcharts)))
+        stream.write(u16(len(timelines)))
         stream.write(u32(0)) # Unused?
-        self._write_root_structure_metadata(stream)
+        self._write_root_structure_metadata(stream, flowcharts, timelines)
 
-        if self.flowchart:
+        if flowcharts:
             first_block_offset_writer.write(stream, u16(stream.tell()))
-            self.flowchart.write(stream)
+        for flowchart in flowcharts:
+            flowchart.write(stream)
 
-        if self.timeline:
-            self.timeline.write(stream)
-            first_block_offset_writer.write(stream, u16(self.timeline._self_offset))
+        for timeline in timelines:
+            timeline.write(stream)
+        if not flowcharts:
+            first_block_offset_writer.write(stream, u16(stream.get_scratch(timelines[0], 'self_offset')))
 
         stream.finalise()
+        # Each block points to the string pool, which is only placed after the last block.
+        for block in flowcharts + timelines:  # type: ignore
+            offset_writer, block_offset = stream.get_scratch(block, 'string_pool_rel_offset')
+            offset_writer.write(stream, u32(stream.get_string_pool_offset() - block_offset))
         file_size_writer.write(stream, u32(stream.tell()))
         relocation_table_offset_writer.write(stream, u32(stream.get_relocation_table_offset()))
         return True
 
-    def _write_root_structure_metadata(self, stream: WriteStream) -> None:
-        flowchart_array_offset_writer = stream.write_placeholder_ptr_if(bool(self.flowchart), register=True)
+    def _write_root_structure_metadata(self, stream: WriteStream, flowcharts: typing.List[Flowchart],
+                                       timelines: typing.List[Timeline]) -> None:
+        flowchart_array_offset_writer = stream.write_placeholder_ptr_if(bool(flowcharts), register=True)
         flowchart_dic = DicWriter()
-        if self.flowchart:
-            flowchart_dic.insert(self.flowchart.name)
+        for flowchart in flowcharts:
+            flowchart_dic.insert(flowchart.name)
         flowchart_dic.write_placeholder_offset(stream)
 
-        timeline_array_offset_writer = stream.write_placeholder_ptr_if(bool(self.timeline), register=True)
+        timeline_array_offset_writer = stream.write_placeholder_ptr_if(bool(timelines), register=True)
         timeline_dic = DicWriter()
-        if self.timeline:
-            timeline_dic.insert(self.timeline.name)
+        for timeline in timelines:
+            timeline_dic.insert(timeline.name)
         timeline_dic.write_placeholder_offset(stream)
 
-        if self.flowchart:
+        if flowcharts:
             flowchart_array_offset_writer.write_current_offset(stream)
-            self.flowchart.write_placeholder_offset(stream)
+            for flowchart in flowcharts:
+                flowchart.write_placeholder_offset(stream)
         flowchart_dic.write(stream)
-        if self.timeline:
+        if timelines:
             timeline_array_offset_writer.write_current_offset(stream)
-            self.timeline.write_placeholder_offset(stream)
+            for timeline in timelines:
+                timeline.write_placeholder_offset(stream)
         timeline_dic.write(stream)
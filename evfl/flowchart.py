@@ -3,10 +3,13 @@ from evfl.actor import Actor, ActorIdentifier
 from evfl.container import Container
 from evfl.dic import DicReader, DicWriter
 from evfl.entry_point import EntryPoint
+from evfl.enums import EventType
 from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
 from evfl.util import *
 
 class Flowchart(BinaryObject):
+    __slots__ = ['name', 'actors', 'events', 'entry_points']
+
     def __init__(self) -> None:
         super().__init__()
         self.name = ''
@@ -69,6 +72,295 @@ class Flowchart(BinaryObject):
                 return actor
         raise ValueError(identifier)
 
+    def compute_hashes(self):
+        """Computes structural digests of this flowchart (see evfl.hashing).
+
+        The result is a snapshot: it is not updated when the flowchart is modified afterwards.
+        Container digests are cached on the containers, so recomputing is cheaper than the first call."""
+        from evfl.hashing import FlowchartHashes
+        return FlowchartHashes(self)
+
+    def validate(self) -> typing.List[str]:
+        """Checks in a single pass that the flowchart can be written.
+
+        Returns a list of problems: references to actors, events or entry points that are not
+        part of this flowchart, actions or queries that their actor does not have, counts and
+        values that do not fit in their fields, fork events that are not joined and sub flow
+        events without an entry point name. An empty list means that write() will succeed."""
+        problems: typing.List[str] = []
+        actor_ids = make_identity_index_map(self.actors)
+        event_ids = make_identity_index_map(self.events)
+        entry_point_ids = make_identity_index_map(self.entry_points)
+
+        for what, count in (('actors', len(self.actors)), ('events', len(self.events)),
+                            ('entry points', len(self.entry_points)),
+                            ('actions', self._get_action_count()), ('queries', self._get_query_count())):
+            if count > 0xFFFF:
+                problems.append(f'too many {what} ({count} > {0xFFFF})')
+
+        for i, actor in enumerate(self.actors):
+            where = f'actor {i} ({actor.identifier})'
+            entry_point = actor.argument_entry_point.v
+            if entry_point is not None and id(entry_point) not in entry_point_ids:
+                problems.append(f'{where}: argument entry point is not in the flowchart')
+            if not 0 <= actor.concurrent_clips <= 0xFFFF:
+                problems.append(f'{where}: concurrent_clips ({actor.concurrent_clips}) does not fit in u16')
+            if actor.params is not None:
+                problems.extend(f'{where}: params: {p}' for p in actor.params.validate())
+
+        # Problem locations are only formatted when a problem is found.
+        def event_where(i: int) -> str:
+            return f'event {i} ({self.events[i].name!r})'
+
+        def check_event_ref(where: typing.Callable[[], str], what: str, event: typing.Optional[Event],
+                            required: bool) -> bool:
+            if event is None:
+                if required:
+                    problems.append(f'{where()}: {what} is not set')
+                return False
+            if id(event) not in event_ids:
+                problems.append(f'{where()}: {what} is not in the flowchart')
+                return False
+            return True
+
+        # (id(actor), 'actions' or 'queries') -> names
+        actor_names: typing.Dict[typing.Tuple[int, str], typing.Set[str]] = dict()
+
+        def check_actor_ref(i: int, data, holder_attr: str, holders_attr: str, kind: str) -> None:
+            actor = getattr(data.actor, 'v', None)
+            if actor is None:
+                problems.append(f'{event_where(i)}: actor is not set')
+                return
+            if id(actor) not in actor_ids:
+                problems.append(f'{event_where(i)}: actor {actor.identifier} is not in the flowchart')
+            holder = getattr(getattr(data, holder_attr), 'v', None)
+            if holder is None:
+                problems.append(f'{event_where(i)}: {holder_attr} is not set')
+                return
+            key = (id(actor), holders_attr)
+            names = actor_names.get(key)
+            if names is None:
+                names = actor_names[key] = {h.v for h in getattr(actor, holders_attr)}
+            if holder.v not in names:
+                problems.append(f'{event_where(i)}: actor {actor.identifier} has no {kind} {holder.v!r}')
+
+        for i, event in enumerate(self.events):
+            where = lambda: event_where(i)
+            data = getattr(event, 'data', None)
+            data_type = type(data)
+            if data_type is ActionEvent or data_type is JoinEvent or data_type is SubFlowEvent:
+                check_event_ref(where, 'next event', data.nxt.v, required=False)  # type: ignore
+            if data_type is ActionEvent:
+                check_actor_ref(i, data, 'actor_action', 'actions', 'action')
+            elif data_type is SwitchEvent:
+                check_actor_ref(i, data, 'actor_query', 'queries', 'query')
+                if len(data.cases) > 0xFFFF:  # type: ignore
+                    problems.append(f'{where()}: too many cases ({len(data.cases)})')  # type: ignore
+                for value, case in data.cases.items():  # type: ignore
+                    if not (type(value) is int and 0 <= value <= 0xFFFFFFFF):
+                        problems.append(f'{where()}: case value {value!r} does not fit in u32')
+                    check_event_ref(where, f'case {value!r}', getattr(case, 'v', None), required=True)
+            elif data_type is ForkEvent:
+                if not data.forks:  # type: ignore
+                    problems.append(f'{where()}: fork has no branches')
+                elif len(data.forks) > 0xFFFF:  # type: ignore
+                    problems.append(f'{where()}: too many branches ({len(data.forks)})')  # type: ignore
+                for j, fork in enumerate(data.forks):  # type: ignore
+                    check_event_ref(where, f'branch {j}', getattr(fork, 'v', None), required=True)
+                join = getattr(data.join, 'v', None)  # type: ignore
+                if check_event_ref(where, 'join event', join, required=True) and type(join.data) is not JoinEvent:
+                    problems.append(f'{where()}: join event {join.name!r} is not a join')
+            elif data_type is SubFlowEvent:
+                if not data.entry_point_name:  # type: ignore
+                    problems.append(f'{where()}: sub flow has no entry point name')
+            elif data_type is not JoinEvent:
+                problems.append(f'{where()}: unknown event data type {data_type.__name__}')
+            params = getattr(data, 'params', None)
+            if params is not None:
+                params_problems = params.validate()
+                if params_problems:
+                    problems.extend(f'{where()}: params: {p}' for p in params_problems)
+
+        entry_point_names: typing.Set[str] = set()
+        for i, entry_point in enumerate(self.entry_points):
+            where = f'entry point {i} ({entry_point.name!r})'
+            if not entry_point.name:
+                problems.append(f'{where}: empty name')
+            elif entry_point.name in entry_point_names:
+                problems.append(f'{where}: duplicate name')
+            entry_point_names.add(entry_point.name)
+            check_event_ref(lambda: where, 'main event', entry_point.main_event.v, required=False)
+
+        return problems
+
+    def clone(self) -> 'Flowchart':
+        """Returns a structural copy of this flowchart in a single pass over its lists.
+
+        Actors, events and entry points are remapped by position; strings are shared.
+        References to objects that are not part of this flowchart are kept as is."""
+        # Objects are allocated without calling __init__ and every slot is assigned directly:
+        # constructors would build default indexes that are immediately replaced.
+        new = object.__new__
+        copy = new(Flowchart)
+        copy.name = self.name
+        copy.actors = [actor.clone() for actor in self.actors]
+        copy.events = [new(Event) for event in self.events]
+        copy.entry_points = [new(EntryPoint) for entry_point in self.entry_points]
+
+        remap: typing.Dict[int, typing.Any] = dict()
+        for old_list, new_list in ((self.actors, copy.actors), (self.events, copy.events), (self.entry_points, copy.entry_points)):
+            remap.update(zip(map(id, old_list), new_list))
+        for old_actor, new_actor in zip(self.actors, copy.actors):
+            remap.update(zip(map(id, old_actor.actions), new_actor.actions))
+            remap.update(zip(map(id, old_actor.queries), new_actor.queries))
+
+        for actor in copy.actors:
+            actor.argument_entry_point.v = remap.get(id(actor.argument_entry_point.v), actor.argument_entry_point.v)
+
+        for old, new_event in zip(self.events, copy.events):
+            new_event.name = old.name
+            data = old.data
+            # Exact type checks are much cheaper than isinstance checks against ABCs.
+            data_type = type(data)
+            new_data = new(data_type)
+            if data_type is ActionEvent:
+                new_data.nxt = clone_index(data.nxt, remap)
+                new_data.actor = clone_index(data.actor, remap)
+                new_data.actor_action = clone_index(data.actor_action, remap)
+                new_data.params = data.params.clone() if data.params else None
+            elif data_type is SwitchEvent:
+                new_data.actor = clone_index(data.actor, remap)
+                new_data.actor_query = clone_index(data.actor_query, remap)
+                new_data.params = data.params.clone() if data.params else None
+                new_data.cases = {value: clone_index(case, remap) for value, case in data.cases.items()}
+            elif data_type is ForkEvent:
+                new_data.join = clone_index(data.join, remap)
+                new_data.forks = [clone_index(fork, remap) for fork in data.forks]
+            elif data_type is JoinEvent:
+                new_data.nxt = clone_index(data.nxt, remap)
+            elif data_type is SubFlowEvent:
+                new_data.nxt = clone_index(data.nxt, remap)
+                new_data.params = data.params.clone() if data.params else None
+                new_data.res_flowchart_name = data.res_flowchart_name
+                new_data.entry_point_name = data.entry_point_name
+            else:
+                raise ValueError(f'Unknown event data type: {data_type.__name__}')
+            new_event.data = new_data
+
+        for old_entry_point, new_entry_point in zip(self.entry_points, copy.entry_points):
+            new_entry_point.name = old_entry_point.name
+            new_entry_point.main_event = clone_index(old_entry_point.main_event, remap)
+            new_entry_point._sub_flow_event_indices = list(old_entry_point._sub_flow_event_indices)
+
+        return copy
+
+    def __getstate__(self) -> tuple:
+        """Flattens the flowchart into index-based records so that pickling does not
+        recurse through event references or store writer state."""
+        actor_to_idx = make_identity_index_map(self.actors)
+        event_to_idx = make_identity_index_map(self.events)
+        entry_point_to_idx = make_identity_index_map(self.entry_points)
+        action_to_idx = [make_identity_index_map(actor.actions) for actor in self.actors]
+        query_to_idx = [make_identity_index_map(actor.queries) for actor in self.actors]
+
+        # RequiredIndex.v is unset on incomplete events.
+        def ref(index) -> typing.Any:
+            return flatten_ref(event_to_idx, getattr(index, 'v', None))
+
+        def actor_refs(data, holder_index, holder_to_idx: typing.List[typing.Dict[int, int]]) -> typing.Tuple[typing.Any, typing.Any]:
+            actor_ref = flatten_ref(actor_to_idx, getattr(data.actor, 'v', None))
+            holder = getattr(holder_index, 'v', None)
+            if type(actor_ref) is not int or actor_ref == -1:
+                return (actor_ref, holder)
+            return (actor_ref, flatten_ref(holder_to_idx[actor_ref], holder))
+
+        events = []
+        for event in self.events:
+            data = event.data
+            if isinstance(data, ActionEvent):
+                events.append((event.name, EventType.kAction.value, ref(data.nxt),
+                               actor_refs(data, data.actor_action, action_to_idx), data.params))
+            elif isinstance(data, SwitchEvent):
+                events.append((event.name, EventType.kSwitch.value, actor_refs(data, data.actor_query, query_to_idx),
+                               data.params, [(value, ref(case)) for value, case in data.cases.items()]))
+            elif isinstance(data, ForkEvent):
+                events.append((event.name, EventType.kFork.value, ref(data.join), [ref(fork) for fork in data.forks]))
+            elif isinstance(data, JoinEvent):
+                events.append((event.name, EventType.kJoin.value, ref(data.nxt)))
+            elif isinstance(data, SubFlowEvent):
+                events.append((event.name, EventType.kSubFlow.value, ref(data.nxt), data.params,
+                               data.res_flowchart_name, data.entry_point_name))
+
+        return (
+            self.name,
+            [actor._to_record() for actor in self.actors],
+            [flatten_ref(entry_point_to_idx, actor.argument_entry_point.v) for actor in self.actors],
+            events,
+            [(e.name, ref(e.main_event), e._sub_flow_event_indices) for e in self.entry_points],
+        )
+
+    def __setstate__(self, state: tuple) -> None:
+        self.__init__() # type: ignore
+        self.name, actor_records, actor_entry_point_refs, event_records, entry_point_records = state
+        self.actors = [Actor._from_record(record) for record in actor_records]
+
+        for name, main_event_ref, sub_flow_event_indices in entry_point_records:
+            entry_point = EntryPoint(name)
+            entry_point._sub_flow_event_indices = sub_flow_event_indices
+            self.entry_points.append(entry_point)
+
+        for actor, entry_point_ref in zip(self.actors, actor_entry_point_refs):
+            actor.argument_entry_point.v = unflatten_ref(self.entry_points, entry_point_ref)
+
+        event_types = {
+            EventType.kAction: ActionEvent,
+            EventType.kSwitch: SwitchEvent,
+            EventType.kFork: ForkEvent,
+            EventType.kJoin: JoinEvent,
+            EventType.kSubFlow: SubFlowEvent,
+        }
+        for record in event_records:
+            event = Event()
+            event.name = record[0]
+            event.data = event_types[record[1]]()
+            self.events.append(event)
+
+        events = self.events
+        def set_actor(data, refs: tuple, holder_attr: str) -> None:
+            actor = unflatten_ref(self.actors, refs[0])
+            data.actor.v = actor
+            if type(refs[0]) is int and actor is not None:
+                holders = actor.actions if holder_attr == 'actor_action' else actor.queries
+                getattr(data, holder_attr).v = unflatten_ref(holders, refs[1])
+            else:
+                getattr(data, holder_attr).v = refs[1]
+
+        for event, record in zip(self.events, event_records):
+            data = event.data
+            etype = record[1]
+            if etype == EventType.kAction:
+                data.nxt.v = unflatten_ref(events, record[2])
+                set_actor(data, record[3], 'actor_action')
+                data.params = record[4]
+            elif etype == EventType.kSwitch:
+                set_actor(data, record[2], 'actor_query')
+                data.params = record[3]
+                for value, case_ref in record[4]:
+                    data.cases[value] = make_rindex(unflatten_ref(events, case_ref))
+            elif etype == EventType.kFork:
+                data.join.v = unflatten_ref(events, record[2])
+                data.forks = [make_rindex(unflatten_ref(events, r)) for r in record[3]]
+            elif etype == EventType.kJoin:
+                data.nxt.v = unflatten_ref(events, record[2])
+            elif etype == EventType.kSubFlow:
+                data.nxt.v = unflatten_ref(events, record[2])
+                data.params = record[3]
+                data.res_flowchart_name = record[4]
+                data.entry_point_name = record[5]
+
+        for entry_point, record in zip(self.entry_points, entry_point_records):
+            entry_point.main_event.v = unflatten_ref(events, record[1])
+
     def _do_read(self, stream: ReadStream) -> None:
         magic = stream.read_u32()
         string_pool_offset = stream.read_u32()
@@ -175,7 +467,9 @@ class Flowchart(BinaryObject):
             entry_point.write_extra_data(stream)
 
         stream.align(8)
+        # Only correct if the string pool comes next: EventFlow rewrites it once the pool is placed.
         string_pool_rel_offset.write(stream, u32(stream.tell() - self_offset))
+        stream.set_scratch(self, 'string_pool_rel_offset', (string_pool_rel_offset, self_offset))
 
     def _set_values_from_indexes(self) -> None:
         # Yes, this is really ugly. I'm sorry.
@@ -0,0 +1,320 @@
+"""Stable structural hashes for flowcharts.
+
+Digests are computed bottom-up: containers (Container.digest), actors, events and then
+the whole flowchart. Event digests come in two flavours:
+
+- local digests cover the event type, its actor, action or query, parameters and switch
+  case values, but not the event name or the events it leads to;
+- subgraph digests additionally cover everything that is reachable from the event, which
+  makes them fingerprints of the event graph starting at that event.
+
+Subgraph digests are computed on the quotient of the event graph by the coarsest partition
+in which events of a block have equal local digests and successors in the same blocks
+(refine_partition), so events whose graphs unfold to the same tree always get equal digests
+regardless of event names, ordering or cycles. The quotient is then hashed bottom-up on its
+condensation; every cycle is encoded canonically from a root that depends only on its structure.
+"""
+import hashlib
+import typing
+
+from evfl.actor import Actor
+from evfl.container import Container
+from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+
+def _digest(value: typing.Any) -> bytes:
+    return hashlib.blake2b(repr(value).encode(), digest_size=16).digest()
+
+def _params_digest(params: typing.Optional[Container]) -> typing.Optional[bytes]:
+    return params.digest() if params is not None else None
+
+def actor_digest(actor: Actor) -> bytes:
+    entry_point = actor.argument_entry_point.v
+    return _digest((
+        'actor',
+        actor.identifier.name,
+        actor.identifier.sub_name,
+        actor.argument_name,
+        entry_point.name if entry_point else None,
+        tuple(s.v for s in actor.actions),
+        tuple(s.v for s in actor.queries),
+        _params_digest(actor.params),
+        actor.concurrent_clips,
+    ))
+
+def get_successors(event: Event) -> typing.List[typing.Optional[Event]]:
+    """Returns the events an event leads to, in a stable order. Missing next events are None."""
+    data = event.data
+    data_type = type(data)
+    if data_type is ActionEvent or data_type is JoinEvent or data_type is SubFlowEvent:
+        return [data.nxt.v]  # type: ignore
+    if data_type is SwitchEvent:
+        return [case.v for case in data.cases.values()]  # type: ignore
+    if data_type is ForkEvent:
+        return [fork.v for fork in data.forks] + [data.join.v]  # type: ignore
+    raise ValueError(f'Unknown event data type: {data_type.__name__}')
+
+def strongly_connected_components(events: typing.List[Event],
+                                  successors: typing.Dict[int, typing.List[typing.Optional[Event]]],
+                                  ) -> typing.Iterator[typing.List[Event]]:
+    """Yields the strongly connected components of the event graph, each component after all
+    components it leads to. successors must have an entry for every reachable event (keyed by id)."""
+    # Tarjan's algorithm (iterative).
+    index: typing.Dict[int, int] = dict()
+    lowlink: typing.Dict[int, int] = dict()
+    on_stack: typing.Set[int] = set()
+    stack: typing.List[Event] = []
+    counter = 0
+    for root in events:
+        if id(root) in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            event, i = work.pop()
+            key = id(event)
+            if i == 0:
+                index[key] = lowlink[key] = counter
+                counter += 1
+                stack.append(event)
+                on_stack.add(key)
+            succs = successors[key]
+            recursed = False
+            while i < len(succs):
+                succ = succs[i]
+                i += 1
+                if succ is None:
+                    continue
+                succ_key = id(succ)
+                if succ_key not in index:
+                    work.append((event, i))
+                    work.append((succ, 0))
+                    recursed = True
+                    break
+                if succ_key in on_stack:
+                    lowlink[key] = min(lowlink[key], index[succ_key])
+            if recursed:
+                continue
+            if lowlink[key] == index[key]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(id(member))
+                    component.append(member)
+                    if member is event:
+                        break
+                yield component
+            if work:
+                parent_key = id(work[-1][0])
+                lowlink[parent_key] = min(lowlink[parent_key], lowlink[key])
+
+def refine_partition(events: typing.List[Event], keys: typing.Dict[int, typing.Any],
+                     successors: typing.Dict[int, typing.List[typing.Optional[Event]]]) -> typing.Dict[int, int]:
+    """Returns the coarsest partition of events in which events of a block have equal keys and
+    successors in the same blocks, as a map from id(event) to block number. events must not
+    contain duplicates. Successors that are not in events are ignored, so keys must already
+    distinguish them.
+
+    This is Hopcroft's partition refinement: blocks are only split by a block whose members
+    have changed, and the largest part of a split block is not queued again, so every event
+    is only examined O(log n) times."""
+    block_of: typing.Dict[int, int] = dict()
+    blocks: typing.List[typing.Set[int]] = []
+    numbering: typing.Dict[typing.Any, int] = dict()
+    for event in events:
+        block = numbering.setdefault(keys[id(event)], len(numbering))
+        if block == len(blocks):
+            blocks.append(set())
+        blocks[block].add(id(event))
+        block_of[id(event)] = block
+
+    # Predecessors within events, with the position of the successor.
+    predecessors: typing.Dict[int, typing.List[typing.Tuple[int, int]]] = {id(event): [] for event in events}
+    for event in events:
+        for position, succ in enumerate(successors[id(event)]):
+            if succ is not None and id(succ) in predecessors:
+                predecessors[id(succ)].append((id(event), position))
+
+    pending = list(range(len(blocks)))
+    is_pending = set(pending)
+    while pending:
+        splitter = pending.pop()
+        is_pending.discard(splitter)
+        positions: typing.Dict[int, typing.List[int]] = dict()
+        for member in blocks[splitter]:
+            for pred, position in predecessors[member]:
+                positions.setdefault(pred, []).append(position)
+
+        # Events of a block are split by the positions of their successors in the splitter.
+        touched: typing.Dict[int, typing.Dict[tuple, typing.List[int]]] = dict()
+        for pred, pred_positions in positions.items():
+            pred_positions.sort()
+            touched.setdefault(block_of[pred], dict()).setdefault(tuple(pred_positions), []).append(pred)
+
+        for block, groups in touched.items():
+            block_members = blocks[block]
+            parts = list(groups.values())
+            if len(parts) == 1 and len(parts[0]) == len(block_members):
+                continue
+            block_members.difference_update(*parts)
+            if not block_members:
+                # Every event was touched: the largest part keeps the block number.
+                largest = max(range(len(parts)), key=lambda i: len(parts[i]))
+                block_members.update(parts.pop(largest))
+
+            new_blocks = []
+            for part in parts:
+                new_block = len(blocks)
+                blocks.append(set(part))
+                for member in part:
+                    block_of[member] = new_block
+                new_blocks.append(new_block)
+            if block not in is_pending:
+                # The block was already used as a splitter, so any one of its parts can be skipped.
+                new_blocks.append(block)
+                new_blocks.remove(max(new_blocks, key=lambda b: len(blocks[b])))
+            pending.extend(new_blocks)
+            is_pending.update(new_blocks)
+
+    return block_of
+
+class FlowchartHashes:
+    """Structural digests of a flowchart and its actors and events.
+
+    Instances are snapshots: they must be recomputed (Flowchart.compute_hashes()) after the
+    flowchart is modified.
+    """
+    def __init__(self, flowchart) -> None:
+        self._actors: typing.Dict[int, bytes] = {id(actor): actor_digest(actor) for actor in flowchart.actors}
+        self._events: typing.Dict[int, bytes] = dict()
+        self._subgraphs: typing.Dict[int, bytes] = dict()
+
+        for event in flowchart.events:
+            self._events[id(event)] = self._local_event_digest(event)
+        self._compute_subgraph_digests(flowchart.events)
+
+        event_to_idx = {id(event): i for i, event in enumerate(flowchart.events)}
+        def ref(event: typing.Optional[Event]) -> typing.Optional[int]:
+            return event_to_idx.get(id(event), -1) if event is not None else None
+
+        self.flowchart: bytes = _digest((
+            'flowchart',
+            flowchart.name,
+            tuple(self._actors[id(actor)] for actor in flowchart.actors),
+            tuple((event.name, self._events[id(event)], tuple(ref(e) for e in get_successors(event)))
+                  for event in flowchart.events),
+            tuple((entry_point.name, ref(entry_point.main_event.v)) for entry_point in flowchart.entry_points),
+        ))
+
+    def actor(self, actor: Actor) -> bytes:
+        return self._actors[id(actor)]
+
+    def event(self, event: Event) -> bytes:
+        """Returns the local digest of an event."""
+        return self._events[id(event)]
+
+    def subgraph(self, event: Event) -> bytes:
+        """Returns the digest of the event graph that starts at an event."""
+        return self._subgraphs[id(event)]
+
+    def _actor_ref(self, actor: Actor) -> bytes:
+        digest = self._actors.get(id(actor))
+        return digest if digest is not None else actor_digest(actor)
+
+    def _local_event_digest(self, event: Event) -> bytes:
+        data = event.data
+        data_type = type(data)
+        if data_type is ActionEvent:
+            return _digest(('action', self._actor_ref(data.actor.v), data.actor_action.v.v,  # type: ignore
+                            _params_digest(data.params)))  # type: ignore
+        if data_type is SwitchEvent:
+            return _digest(('switch', self._actor_ref(data.actor.v), data.actor_query.v.v,  # type: ignore
+                            _params_digest(data.params), tuple(data.cases.keys())))  # type: ignore
+        if data_type is ForkEvent:
+            return _digest(('fork', len(data.forks)))  # type: ignore
+        if data_type is JoinEvent:
+            return _digest(('join',))
+        if data_type is SubFlowEvent:
+            return _digest(('sub_flow', data.res_flowchart_name, data.entry_point_name,  # type: ignore
+                            _params_digest(data.params)))  # type: ignore
+        raise ValueError(f'Unknown event data type: {data_type.__name__}')
+
+    def _compute_subgraph_digests(self, events: typing.List[Event]) -> None:
+        # Events that are referenced but not part of the flowchart are hashed as well.
+        successors: typing.Dict[int, typing.List[typing.Optional[Event]]] = dict()
+        pending = list(events)
+        events = []
+        for event in pending:
+            if id(event) in successors:
+                continue
+            if id(event) not in self._events:
+                self._events[id(event)] = self._local_event_digest(event)
+            successors[id(event)] = succs = get_successors(event)
+            events.append(event)
+            pending.extend(succ for succ in succs if succ is not None and id(succ) not in successors)
+
+        # Events with equal subgraphs are exactly the events of a block of the coarsest stable
+        # partition, so digests are computed once per block on the quotient graph.
+        keys = {id(event): (self._events[id(event)], tuple(s is None for s in successors[id(event)]))
+                for event in events}
+        block_of = refine_partition(events, keys, successors)
+        representatives: typing.Dict[int, Event] = dict()
+        for event in events:
+            representatives.setdefault(block_of[id(event)], event)
+        quotient = {id(rep): [None if s is None else representatives[block_of[id(s)]] for s in successors[id(rep)]]
+                    for rep in representatives.values()}
+
+        block_subgraphs: typing.Dict[int, bytes] = dict()
+        for component in strongly_connected_components(list(representatives.values()), quotient):
+            self._hash_component(component, quotient, block_subgraphs)
+        for event in events:
+            self._subgraphs[id(event)] = block_subgraphs[id(representatives[block_of[id(event)]])]
+
+    def _hash_component(self, component: typing.List[Event],
+                        successors: typing.Dict[int, typing.List[typing.Optional[Event]]],
+                        subgraphs: typing.Dict[int, bytes]) -> None:
+        """Computes the subgraph digests of a strongly connected component of the quotient graph,
+        in which no two events have equal subgraphs."""
+        if len(component) == 1:
+            event = component[0]
+            succs = successors[id(event)]
+            if all(succ is not event for succ in succs):
+                subgraphs[id(event)] = _digest((self._events[id(event)],
+                                                tuple(subgraphs[id(s)] if s is not None else None for s in succs)))
+                return
+
+        members = {id(event) for event in component}
+
+        def local(event: Event) -> bytes:
+            return _digest((self._events[id(event)], tuple(
+                None if s is None else (b'' if id(s) in members else subgraphs[id(s)])
+                for s in successors[id(event)])))
+
+        def encode(root: Event) -> typing.Tuple[bytes, typing.Dict[int, int]]:
+            # Numbers events in breadth-first order from root. As the component is strongly
+            # connected and minimal, this is a canonical encoding of the component rooted at root.
+            numbers = {id(root): 0}
+            queue = [root]
+            encoding = []
+            for event in queue:
+                refs = []
+                for s in successors[id(event)]:
+                    if s is None:
+                        refs.append(None)
+                    elif id(s) in members:
+                        if id(s) not in numbers:
+                            numbers[id(s)] = len(queue)
+                            queue.append(s)
+                        refs.append(numbers[id(s)])
+                    else:
+                        refs.append(subgraphs[id(s)])
+                encoding.append((self._events[id(event)], tuple(refs)))
+            return _digest(('cycle', tuple(encoding))), numbers
+
+        # The root is the one with the smallest encoding among the events whose local digest is
+        # the least common in the component, which keeps the number of encodings small.
+        by_local: typing.Dict[bytes, typing.List[Event]] = dict()
+        for event in component:
+            by_local.setdefault(local(event), []).append(event)
+        candidates = min(by_local.items(), key=lambda item: (len(item[1]), item[0]))[1]
+        component_digest, numbers = min((encode(event) for event in candidates), key=lambda e: e[0])
+        for event in component:
+            subgraphs[id(event)] = _digest((component_digest, numbers[id(event)]))
@@ -0,0 +1,105 @@
+import bisect
+import typing
+
+T = typing.TypeVar('T')
+
+class _Node(typing.Generic[T]):
+    __slots__ = ['center', 'by_start', 'by_end', 'left', 'right']
+    def __init__(self, center: float) -> None:
+        self.center = center
+        # Intervals that contain the center, sorted by start (ascending) and by end (descending).
+        self.by_start: typing.List[typing.Tuple[float, float, T]] = []
+        self.by_end: typing.List[typing.Tuple[float, float, T]] = []
+        self.left: typing.Optional[_Node[T]] = None
+        self.right: typing.Optional[_Node[T]] = None
+
+class IntervalTree(typing.Generic[T]):
+    """Static centered interval tree over half-open intervals [start, end).
+
+    Point and range queries run in O(log n + k). Empty intervals are never active
+    and are not stored. The tree is a snapshot: rebuild it after changing the intervals."""
+
+    __slots__ = ['_root', '_starts', '_start_items', '_size']
+    def __init__(self, intervals: typing.Iterable[typing.Tuple[float, float, T]]) -> None:
+        items = sorted((i for i in intervals if i[0] < i[1]), key=lambda i: i[0])
+        self._size = len(items)
+        self._starts = [i[0] for i in items]
+        self._start_items = [i[2] for i in items]
+        self._root = self._build(items)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _build(items: typing.List[typing.Tuple[float, float, T]]) -> typing.Optional[_Node[T]]:
+        """Builds a subtree from intervals that are sorted by start."""
+        if not items:
+            return None
+        # The median start is always contained in its own (non-empty) interval,
+        # so every node keeps at least one interval and recursion terminates.
+        node: _Node[T] = _Node(items[len(items) // 2][0])
+        left = []
+        right = []
+        for item in items:
+            if item[1] <= node.center:
+                left.append(item)
+            elif item[0] > node.center:
+                right.append(item)
+            else:
+                node.by_start.append(item)
+        node.by_end = sorted(node.by_start, key=lambda i: i[1], reverse=True)
+        node.left = IntervalTree._build(left)
+        node.right = IntervalTree._build(right)
+        return node
+
+    def at(self, t: float) -> typing.List[T]:
+        """Returns the values of all intervals such that start <= t < end."""
+        result: typing.List[T] = []
+        node = self._root
+        while node:
+            if t < node.center:
+                for start, end, value in node.by_start:
+                    if start > t:
+                        break
+                    result.append(value)
+                node = node.left
+            else:
+                for start, end, value in node.by_end:
+                    if end <= t:
+                        break
+                    result.append(value)
+                node = node.right
+        return result
+
+    def between(self, t0: float, t1: float) -> typing.List[T]:
+        """Returns the values of all intervals that overlap [t0, t1)."""
+        if t1 <= t0:
+            return []
+        result = self.at(t0)
+        lo = bisect.bisect_right(self._starts, t0)
+        hi = bisect.bisect_left(self._starts, t1, lo)
+        result.extend(self._start_items[lo:hi])
+        return result
+
+class PointIndex(typing.Generic[T]):
+    """Sorted index over values that happen at a single point in time."""
+
+    __slots__ = ['_times', '_items']
+    def __init__(self, points: typing.Iterable[typing.Tuple[float, T]]) -> None:
+        # Sorting is stable, so values at the same time keep their original order.
+        points = sorted(points, key=lambda p: p[0])
+        self._times = [p[0] for p in points]
+        self._items = [p[1] for p in points]
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def between(self, t0: float, t1: float) -> typing.List[T]:
+        """Returns the values whose time is in [t0, t1), in time order."""
+        lo = bisect.bisect_left(self._times, t0)
+        hi = bisect.bisect_left(self._times, t1, lo)
+        return self._items[lo:hi]
+
+    def last_at_or_before(self, t: float) -> typing.Optional[T]:
+        i = bisect.bisect_right(self._times, t)
+        return self._items[i - 1] if i else None
@@ -0,0 +1,184 @@
+"""Optimisation passes that make flowcharts smaller without changing their behaviour.
+
+merge_duplicate_events merges events that are indistinguishable: events with the same content
+(type, actor, action or query, parameters, case values) whose successors are themselves
+indistinguishable. Generated flowcharts often end many chains with identical terminal events,
+which all collapse into one.
+
+Equivalence classes are the blocks of the coarsest partition of the whole event graph in which
+events of a block have the same content and successors in the same blocks, computed with
+Hopcroft's partition refinement (evfl.hashing.refine_partition). Events are therefore merged
+across cycles, and an event outside of a cycle is merged with an equivalent event of a cycle.
+These are exactly the events that get equal subgraph digests in evfl.hashing.
+Fork and join events are never merged because joins are paired with their fork.
+
+prune_unused removes actions and queries that nothing refers to, as well as unused actors.
+"""
+import typing
+
+from evfl.common import ActorIdentifier
+from evfl.container import Container
+from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+from evfl.flowchart import Flowchart
+from evfl.hashing import get_successors, refine_partition
+from evfl.timeline import Timeline
+
+def _params_key(params: typing.Optional[Container]) -> typing.Optional[tuple]:
+    return params.content_key() if params is not None else None
+
+def _local_key(event: Event) -> typing.Optional[tuple]:
+    """Returns a key that is equal for events with the same content, or None for events that
+    must not be merged. Parameters are compared by content (Container.content_key)."""
+    data = event.data
+    data_type = type(data)
+    if data_type is ActionEvent:
+        return ('action', id(data.actor.v), data.actor_action.v.v, _params_key(data.params))  # type: ignore
+    if data_type is SwitchEvent:
+        return ('switch', id(data.actor.v), data.actor_query.v.v, _params_key(data.params),  # type: ignore
+                tuple(data.cases.keys()))  # type: ignore
+    if data_type is SubFlowEvent:
+        return ('sub_flow', data.res_flowchart_name, data.entry_point_name, _params_key(data.params))  # type: ignore
+    if data_type is ForkEvent or data_type is JoinEvent:
+        return None
+    raise ValueError(f'Unknown event data type: {data_type.__name__}')
+
+def _find_representatives(flowchart: Flowchart) -> typing.Dict[int, Event]:
+    """Returns a map from id(event) to the event it should be replaced with, for every event
+    that has an equivalent event earlier in the event list."""
+    in_flowchart = {id(event) for event in flowchart.events}
+    successors: typing.Dict[int, typing.List[typing.Optional[Event]]] = dict()
+    pending = list(flowchart.events)
+    events: typing.List[Event] = []
+    for event in pending:
+        if id(event) in successors:
+            continue
+        successors[id(event)] = succs = get_successors(event)
+        events.append(event)
+        pending.extend(succ for succ in succs if succ is not None and id(succ) not in successors)
+
+    # Events that must not be merged get a key of their own.
+    keys: typing.Dict[int, typing.Any] = dict()
+    for event in events:
+        key = _local_key(event) if id(event) in in_flowchart else None
+        keys[id(event)] = (key if key is not None else ('unique', id(event)),
+                           tuple(s is None for s in successors[id(event)]))
+    event_class = refine_partition(events, keys, successors)
+
+    representatives: typing.Dict[int, Event] = dict()
+    first_of_class: typing.Dict[int, Event] = dict()
+    for event in flowchart.events:
+        representative = first_of_class.setdefault(event_class[id(event)], event)
+        if representative is not event:
+            representatives[id(event)] = representative
+    return representatives
+
+def merge_duplicate_events(flowchart: Flowchart) -> int:
+    """Merges indistinguishable events in place and returns the number of events that were removed.
+
+    The first event of each group of equivalent events (in event list order) is kept, together
+    with its name, and every reference to the other events is redirected to it."""
+    representatives = _find_representatives(flowchart)
+    if not representatives:
+        return 0
+
+    def redirect(index) -> None:
+        # RequiredIndex.v is unset on incomplete events.
+        event = getattr(index, 'v', None)
+        if event is not None:
+            index.v = representatives.get(id(event), event)
+
+    # Sub flow event indices refer to the event list, so they are remapped to the indices of the
+    # representatives in the new list. Merged events can make some of them identical.
+    old_events = flowchart.events
+    flowchart.events = [event for event in old_events if id(event) not in representatives]
+    new_indices = {id(event): i for i, event in enumerate(flowchart.events)}
+    for entry_point in flowchart.entry_points:
+        indices = (new_indices[id(representatives.get(id(old_events[i]), old_events[i]))]
+                   for i in entry_point._sub_flow_event_indices)
+        entry_point._sub_flow_event_indices = list(dict.fromkeys(indices))
+    for event in flowchart.events:
+        data = event.data
+        data_type = type(data)
+        if data_type is ActionEvent or data_type is JoinEvent or data_type is SubFlowEvent:
+            redirect(data.nxt)  # type: ignore
+        elif data_type is SwitchEvent:
+            for case in data.cases.values():  # type: ignore
+                redirect(case)
+        elif data_type is ForkEvent:
+            for fork in data.forks:  # type: ignore
+                redirect(fork)
+            redirect(data.join)  # type: ignore
+    for entry_point in flowchart.entry_points:
+        redirect(entry_point.main_event)
+    return len(representatives)
+
+class PruneResult(typing.NamedTuple):
+    actors: int
+    actions: int
+    queries: int
+
+def prune_unused(block: typing.Union[Flowchart, Timeline], remove_actors: bool = True) -> PruneResult:
+    """Removes actions and queries that no event (or clip or oneshot for timelines) refers to,
+    as well as actors that are not referred to at all if remove_actors is set.
+    Actors that are named by an ActorIdentifier parameter or that are bound to an argument
+    (argument_name) are always kept, since they can be looked up without an index.
+
+    Usage is collected in a single pass; indexes are renumbered when the block is written.
+    Returns the number of removed actors, actions and queries."""
+    # id(actor) -> (used action names, used query names)
+    used: typing.Dict[int, typing.Tuple[typing.Set[str], typing.Set[str]]] = dict()
+
+    def get_used(actor) -> typing.Tuple[typing.Set[str], typing.Set[str]]:
+        entry = used.get(id(actor))
+        if entry is None:
+            used[id(actor)] = entry = (set(), set())
+        return entry
+
+    # (name, sub_name) of the actors that parameters refer to.
+    named: typing.Set[typing.Tuple[str, str]] = set()
+
+    def add_named(params: typing.Optional[Container]) -> None:
+        if params is not None:
+            for value in params.data.values():
+                if isinstance(value, ActorIdentifier):
+                    named.add((value.name, value.sub_name))
+
+    if isinstance(block, Flowchart):
+        for event in block.events:
+            data = event.data
+            data_type = type(data)
+            if data_type is ActionEvent:
+                get_used(data.actor.v)[0].add(data.actor_action.v.v)  # type: ignore
+            elif data_type is SwitchEvent:
+                get_used(data.actor.v)[1].add(data.actor_query.v.v)  # type: ignore
+            add_named(getattr(data, 'params', None))
+    else:
+        for clip in block.clips:
+            get_used(clip.actor.v)[0].add(clip.actor_action.v.v)
+            add_named(clip.params)
+        for oneshot in block.oneshots:
+            get_used(oneshot.actor.v)[0].add(oneshot.actor_action.v.v)
+            add_named(oneshot.params)
+    for actor in block.actors:
+        add_named(actor.params)
+
+    num_actors = num_actions = num_queries = 0
+    actors = []
+    for actor in block.actors:
+        entry = used.get(id(actor))
+        if entry is None:
+            identifier = actor.identifier
+            referenced = actor.argument_name or (identifier.name, identifier.sub_name) in named
+            if remove_actors and not referenced:
+                num_actors += 1
+                continue
+            entry = (set(), set())
+        actions = [action for action in actor.actions if action.v in entry[0]]
+        queries = [query for query in actor.queries if query.v in entry[1]]
+        num_actions += len(actor.actions) - len(actions)
+        num_queries += len(actor.queries) - len(queries)
+        actor.actions = actions
+        actor.queries = queries
+        actors.append(actor)
+    block.actors = actors
+    return PruneResult(num_actors, num_actions, num_queries)
@@ -0,0 +1,138 @@
+"""Timeline playback engine.
+
+All clip Enter/Leave, oneshot and cut events are merged into a single time-ordered
+queue when the player is created. Playback then only moves a cursor over that queue,
+which makes seeking a binary search and lets a whole timeline be played back in a
+single call for batch previews.
+"""
+import bisect
+from enum import IntEnum
+import heapq
+import typing
+
+from evfl.actor import Actor
+from evfl.enums import TimelineState
+from evfl.timeline import Clip, Cut, Oneshot, Timeline, TimelineIndex
+
+class PlaybackEventType(IntEnum):
+    # Values are also the tie-break order for events that happen at the same time.
+    kClipLeave = 0
+    kCut = 1
+    kClipEnter = 2
+    kOneshot = 3
+
+class PlaybackEvent(typing.NamedTuple):
+    time: float
+    type: PlaybackEventType
+    # None for cuts.
+    actor: typing.Optional[Actor]
+    item: typing.Union[Clip, Oneshot, Cut]
+
+PlaybackCallback = typing.Callable[[PlaybackEvent], None]
+
+class TimelinePlayer:
+    def __init__(self, timeline: Timeline) -> None:
+        self.timeline = timeline
+        self.state = TimelineState.kNotStarted
+        self.time = 0.0
+
+        def stream(events: typing.Iterable[PlaybackEvent], order: PlaybackEventType):
+            # (time, order, sequence number) is unique, so events themselves are never compared.
+            return sorted(((e.time, order, i, e) for i, e in enumerate(events)), key=lambda x: x[:3])
+
+        def clip_enters() -> typing.Iterator[PlaybackEvent]:
+            for c in timeline.clips:
+                yield PlaybackEvent(c.start_time, PlaybackEventType.kClipEnter, c.actor.v, c)
+                # A zero-duration clip is left right after it is entered, not before.
+                if c.duration == 0:
+                    yield PlaybackEvent(c.start_time, PlaybackEventType.kClipLeave, c.actor.v, c)
+
+        streams = [
+            stream((PlaybackEvent(c.start_time + c.duration, PlaybackEventType.kClipLeave, c.actor.v, c)
+                    for c in timeline.clips if c.duration != 0), PlaybackEventType.kClipLeave),
+            stream((PlaybackEvent(c.start_time, PlaybackEventType.kCut, None, c) for c in timeline.cuts),
+                   PlaybackEventType.kCut),
+            stream(clip_enters(), PlaybackEventType.kClipEnter),
+            stream((PlaybackEvent(o.time, PlaybackEventType.kOneshot, o.actor.v, o) for o in timeline.oneshots),
+                   PlaybackEventType.kOneshot),
+        ]
+        self._events: typing.List[PlaybackEvent] = [x[3] for x in heapq.merge(*streams, key=lambda x: x[:3])]
+        self._times = [e.time for e in self._events]
+        self._cursor = 0
+        self.end_time = max([timeline.duration] + self._times[-1:])
+
+        self._callbacks: typing.List[PlaybackCallback] = []
+        self._actor_callbacks: typing.Dict[int, typing.List[PlaybackCallback]] = dict()
+        self._index: typing.Optional[TimelineIndex] = None
+
+    def add_callback(self, callback: PlaybackCallback, actor: typing.Optional[Actor] = None) -> None:
+        """Registers a callback for events of the specified actor, or for all events if actor is None."""
+        if actor is None:
+            self._callbacks.append(callback)
+        else:
+            self._actor_callbacks.setdefault(id(actor), []).append(callback)
+
+    def play(self) -> None:
+        if self.state == TimelineState.kStop:
+            self.seek(0.0)
+        self.state = TimelineState.kPlaying
+
+    def pause(self) -> None:
+        if self.state == TimelineState.kPlaying:
+            self.state = TimelineState.kPause
+
+    def resume(self) -> None:
+        if self.state == TimelineState.kPause:
+            self.state = TimelineState.kPlaying
+
+    def stop(self) -> None:
+        self.state = TimelineState.kStop
+
+    def seek(self, time: float) -> None:
+        """Moves the playhead without emitting any event. Events at `time` will be emitted next."""
+        self.time = min(max(time, 0.0), self.end_time)
+        self._cursor = bisect.bisect_left(self._times, self.time)
+        if self.state == TimelineState.kStop:
+            self.state = TimelineState.kPause
+
+    def advance(self, dt: float) -> int:
+        """Advances playback by dt and emits all events in [time, time + dt).
+
+        When the end of the timeline is reached, all remaining events are emitted and
+        the player stops. Returns the number of emitted events."""
+        if self.state != TimelineState.kPlaying:
+            return 0
+        new_time = self.time + dt
+        if new_time >= self.end_time:
+            end = len(self._events)
+            self.time = self.end_time
+            self.state = TimelineState.kStop
+        else:
+            end = bisect.bisect_left(self._times, new_time, self._cursor)
+            self.time = new_time
+        count = end - self._cursor
+        self._dispatch(self._cursor, end)
+        self._cursor = end
+        return count
+
+    def run(self) -> int:
+        """Plays the rest of the timeline immediately. Returns the number of emitted events."""
+        self.state = TimelineState.kPlaying
+        return self.advance(self.end_time - self.time)
+
+    def active_clips(self) -> typing.List[Clip]:
+        """Returns the clips that are playing at the current time."""
+        if self._index is None:
+            self._index = self.timeline.index()
+        return self._index.clips_at(self.time)
+
+    def _dispatch(self, begin: int, end: int) -> None:
+        callbacks = self._callbacks
+        actor_callbacks = self._actor_callbacks
+        for i in range(begin, end):
+            event = self._events[i]
+            for callback in callbacks:
+                callback(event)
+            if event.actor is not None:
+                for callback in actor_callbacks.get(id(event.actor), ()):
+                    callback(event)
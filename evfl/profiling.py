@@ -0,0 +1,227 @@
+"""Opt-in instrumentation of the binary reader and writer.
+
+    with evfl.profiling.profile() as report:
+        flow.read(data)
+    print(report.format())
+
+While a profile is active, the methods that read and write each part of a file are replaced
+with wrappers that record call counts and timings, and the stream primitives are replaced with
+wrappers that count seeks, bytes and struct calls. Everything is restored when the context
+exits, so there is no cost at all when profiling is not used.
+
+Times are exclusive: time spent in a nested section (e.g. a container that belongs to an
+event) is attributed to that section only. Profiling is process-wide and not thread-safe.
+"""
+import contextlib
+import functools
+import struct
+import time
+import typing
+
+from evfl import util
+import evfl.evfl
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier
+from evfl.container import Container
+from evfl.dic import DicReader, DicWriter
+from evfl.entry_point import EntryPoint
+from evfl.event import Event
+from evfl.evfl import EventFlow
+from evfl.flowchart import Flowchart
+from evfl.timeline import Timeline, Clip, Oneshot, Trigger, Subtimeline, Cut
+from evfl.util import Stream, ReadStream, WriteStream
+
+# Section name -> (class, methods whose calls are counted, methods that only add time).
+_SECTIONS: typing.Dict[str, typing.List[typing.Tuple[type, typing.Tuple[str, ...], typing.Tuple[str, ...]]]] = {
+    'header': [(EventFlow, ('read', 'write_to_stream'), ())],
+    'flowchart': [(Flowchart, ('_do_read', '_do_write'), ())],
+    'timeline': [(Timeline, ('_do_read', '_do_write'), ())],
+    'timeline_structures': [(Clip, ('_do_read', '_do_write'), ('write_extra_data',)),
+                            (Oneshot, ('_do_read', '_do_write'), ('write_extra_data',)),
+                            (Trigger, ('_do_read', '_do_write'), ()),
+                            (Subtimeline, ('_do_read', '_do_write'), ()),
+                            (Cut, ('_do_read', '_do_write'), ('write_extra_data',))],
+    'actors': [(Actor, ('_do_read', '_do_write'), ('write_extra_data',))],
+    'events': [(Event, ('_do_read', '_do_write'), ('write_extra_data',))],
+    'entry_points': [(EntryPoint, ('_do_read', '_do_write'), ('write_extra_data',))],
+    'containers': [(Container, ('_do_read', '_do_write'), ()),
+                   (ActorIdentifier, ('_do_read', '_do_write'), ())],
+    'dics': [(DicReader, ('_do_read',), ()), (DicWriter, ('_do_write',), ())],
+    'string_pool': [(ReadStream, ('read_string_ref',), ()), (WriteStream, ('_write_string_pool',), ())],
+    'relocation_table': [(WriteStream, ('_write_relocation_table',), ())],
+}
+
+class SectionStats:
+    __slots__ = ['count', 'time']
+
+    def __init__(self) -> None:
+        self.count = 0
+        # Exclusive time in seconds.
+        self.time = 0.0
+
+    def __repr__(self) -> str:
+        return f'SectionStats(count={self.count}, time={self.time:.6f})'
+
+class Report:
+    def __init__(self) -> None:
+        self.sections: typing.Dict[str, SectionStats] = {name: SectionStats() for name in _SECTIONS}
+        self.seeks = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.struct_calls = 0
+        # Wall time spent inside the profile context.
+        self.total_time = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'sections': {name: {'count': s.count, 'time': s.time} for name, s in self.sections.items()},
+            'seeks': self.seeks,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'struct_calls': self.struct_calls,
+            'total_time': self.total_time,
+        }
+
+    def format(self) -> str:
+        lines = [f'{"section":20} {"count":>8} {"time (ms)":>10} {"share":>6}']
+        for name, s in self.sections.items():
+            share = s.time / self.total_time if self.total_time else 0.0
+            lines.append(f'{name:20} {s.count:8} {s.time * 1e3:10.3f} {share:6.1%}')
+        lines.append(f'seeks: {self.seeks}, bytes read: {self.bytes_read}, '
+                     f'bytes written: {self.bytes_written}, struct calls: {self.struct_calls}')
+        lines.append(f'total: {self.total_time * 1e3:.3f} ms')
+        return '\n'.join(lines)
+
+class _CountingStruct:
+    """Stands in for the struct module in evfl.util and counts calls."""
+    def __init__(self, report: Report) -> None:
+        self._report = report
+
+    def pack(self, *args) -> bytes:
+        self._report.struct_calls += 1
+        return struct.pack(*args)
+
+    def unpack(self, *args) -> tuple:
+        self._report.struct_calls += 1
+        return struct.unpack(*args)
+
+    def unpack_from(self, *args, **kwargs) -> tuple:
+        self._report.struct_calls += 1
+        return struct.unpack_from(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(struct, name)
+
+class _Patcher:
+    def __init__(self) -> None:
+        self._originals: typing.List[typing.Tuple[typing.Any, str, typing.Any, bool]] = []
+
+    def patch(self, owner: typing.Any, name: str, make_replacement: typing.Callable[[typing.Any], typing.Any]) -> None:
+        original = getattr(owner, name)
+        self._originals.append((owner, name, original, name in vars(owner)))
+        setattr(owner, name, make_replacement(original))
+
+    def restore(self) -> None:
+        while self._originals:
+            owner, name, original, was_own = self._originals.pop()
+            if was_own:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
+
+def _section_wrapper(fn: typing.Callable, stats: SectionStats, counted: bool,
+                     stack: typing.List[typing.List[float]]) -> typing.Callable:
+    perf_counter = time.perf_counter
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Time spent in nested sections.
+        nested = [0.0]
+        stack.append(nested)
+        start = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            stack.pop()
+            stats.time += elapsed - nested[0]
+            if counted:
+                stats.count += 1
+            if stack:
+                stack[-1][0] += elapsed
+    return wrapper
+
+def _install(report: Report, patcher: _Patcher) -> None:
+    stack: typing.List[typing.List[float]] = []
+    for name, targets in _SECTIONS.items():
+        stats = report.sections[name]
+        for cls, counted_methods, other_methods in targets:
+            for method in counted_methods:
+                patcher.patch(cls, method, lambda fn: _section_wrapper(fn, stats, True, stack))
+            for method in other_methods:
+                patcher.patch(cls, method, lambda fn: _section_wrapper(fn, stats, False, stack))
+
+    def count_seeks(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            report.seeks += 1
+            return fn(*args)
+        return wrapper
+    patcher.patch(Stream, 'seek', count_seeks)
+    patcher.patch(Stream, 'skip', count_seeks)
+
+    def count_read(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            data = fn(*args)
+            report.bytes_read += len(data)
+            return data
+        return wrapper
+    patcher.patch(ReadStream, 'read', count_read)
+
+    # Strings are read directly from the underlying buffer rather than through the stream.
+    def count_string_read(fn, overhead: int):
+        @functools.wraps(fn)
+        def wrapper(data, offset):
+            s = fn(data, offset)
+            report.bytes_read += len(s.encode()) + overhead
+            return s
+        return wrapper
+    patcher.patch(util, 'read_string', lambda fn: count_string_read(fn, 1))
+    patcher.patch(evfl.evfl, 'read_string', lambda fn: count_string_read(fn, 1))
+    patcher.patch(util, 'read_pascal_string', lambda fn: count_string_read(fn, 2))
+
+    def count_write(fn):
+        @functools.wraps(fn)
+        def wrapper(self, data):
+            report.bytes_written += len(data)
+            return fn(self, data)
+        return wrapper
+    patcher.patch(WriteStream, 'write', count_write)
+
+    patcher.patch(util, 'struct', lambda module: _CountingStruct(report))
+
+_active = False
+
+@contextlib.contextmanager
+def profile() -> typing.Iterator[Report]:
+    """Profiles all reads and writes that happen inside the context and yields the report.
+
+    The report is complete once the context exits.
+    """
+    global _active
+    if _active:
+        raise RuntimeError('A profile is already active')
+    report = Report()
+    patcher = _Patcher()
+    _active = True
+    try:
+        _install(report, patcher)
+        start = time.perf_counter()
+        try:
+            yield report
+        finally:
+            report.total_time = time.perf_counter() - start
+    finally:
+        patcher.restore()
+        _active = False
@@ -0,0 +1,347 @@
+"""Deterministic generators of large synthetic flowcharts and timelines.
+
+The generated structures are valid (they can be written, read back and round-tripped) and
+only depend on the arguments, so they can be used for scaling benchmarks and stress tests.
+"""
+import contextlib
+import gc
+import random
+import typing
+
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier, Argument, StringHolder
+from evfl.container import Container
+from evfl.entry_point import EntryPoint
+from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+from evfl.flowchart import Flowchart
+from evfl.timeline import Timeline, Clip, Oneshot, Cut
+from evfl.util import RequiredIndex
+
+T = typing.TypeVar('T')
+
+# Indices are 16-bit and 0xFFFF is used for null references.
+MAX_EVENTS = 0xFFFF
+MAX_ACTORS = 0xFFFF
+
+_PARAM_VALUES: typing.List[typing.Callable[[random.Random], typing.Any]] = [
+    lambda rng: rng.randrange(-1000, 1000),
+    lambda rng: rng.random() < 0.5,
+    lambda rng: float(rng.randrange(-1000, 1000)) / 4,
+    lambda rng: f'Message{rng.randrange(1000)}',
+    lambda rng: Argument(f'Arg_{rng.randrange(10)}'),
+    lambda rng: ActorIdentifier(f'Actor{rng.randrange(100)}'),
+    lambda rng: [rng.randrange(100) for i in range(rng.randrange(1, 4))],
+    lambda rng: [float(rng.randrange(100)) for i in range(rng.randrange(1, 4))],
+    lambda rng: [f'Item{rng.randrange(100)}' for i in range(rng.randrange(1, 4))],
+]
+_NUM_PARAM_NAMES = 32
+
+def _pick(rng: random.Random, items: typing.Sequence[T]) -> T:
+    # Much cheaper than rng.choice() or rng.randrange().
+    return items[int(rng.random() * len(items))]
+
+def _make_params(rng: random.Random, density: float) -> typing.Optional[Container]:
+    """Returns a container with `density` items on average (or None if it would be empty)."""
+    count = int(density)
+    if rng.random() < density - count:
+        count += 1
+    if count == 0:
+        return None
+    container = Container()
+    data = container.data
+    for i in rng.sample(range(_NUM_PARAM_NAMES), min(count, _NUM_PARAM_NAMES)):
+        data[f'Param{i}'] = _PARAM_VALUES[i % len(_PARAM_VALUES)](rng)
+    return container
+
+@contextlib.contextmanager
+def _gc_paused() -> typing.Iterator[None]:
+    """Pauses the cyclic garbage collector, which would otherwise repeatedly scan the
+    large number of objects that are being created."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class _ParamsPool:
+    """Hands out containers with the items of a fixed set of random containers, which is much
+    faster than generating a new container for every event."""
+    SIZE = 256
+
+    def __init__(self, rng: random.Random, density: float) -> None:
+        self.rng = rng
+        # (items, keys of items that are mutable and must not be shared) or None for no params.
+        self.entries: typing.List[typing.Optional[typing.Tuple[dict, typing.List[str]]]] = []
+        for i in range(self.SIZE):
+            container = _make_params(rng, density)
+            if container is None:
+                self.entries.append(None)
+                continue
+            mutable_keys = [key for key, value in container.data.items() if isinstance(value, (list, ActorIdentifier))]
+            self.entries.append((container.data, mutable_keys))
+
+    def get(self) -> typing.Optional[Container]:
+        entry = self.entries[int(self.rng.random() * self.SIZE)]
+        if entry is None:
+            return None
+        items, mutable_keys = entry
+        data = items.copy()
+        for key in mutable_keys:
+            value = data[key]
+            data[key] = value[:] if type(value) is list else ActorIdentifier(value.name, value.sub_name)  # type: ignore
+        return Container(data)
+
+def _make_actors(rng: random.Random, count: int, num_actions: int, num_queries: int,
+                 param_density: float) -> typing.List[Actor]:
+    if not 0 < count <= MAX_ACTORS:
+        raise ValueError(f'Invalid number of actors: {count}')
+    actors = []
+    for i in range(count):
+        actor = Actor()
+        actor.identifier = ActorIdentifier(f'Actor{i}', str(i % 3) if i % 5 == 0 else '')
+        actor.actions = [StringHolder(f'Action{j}') for j in range(num_actions)]
+        actor.queries = [StringHolder(f'Query{j}') for j in range(num_queries)]
+        actor.params = _make_params(rng, param_density)
+        actor.concurrent_clips = 1
+        actors.append(actor)
+    return actors
+
+class _FlowchartBuilder:
+    def __init__(self, flowchart: Flowchart, rng: random.Random, num_events: int, switch_ratio: float,
+                 switch_fanout: int, fork_ratio: float, fork_width: int, max_fork_depth: int,
+                 sub_flow_ratio: float, param_density: float, sub_flow_entry_points: typing.List[str]) -> None:
+        self.flowchart = flowchart
+        self.events = flowchart.events
+        self.actors = flowchart.actors
+        self.rng = rng
+        self.remaining = num_events
+        self.switch_ratio = switch_ratio
+        self.switch_fanout = switch_fanout
+        self.fork_ratio = fork_ratio
+        self.fork_width = fork_width
+        self.max_fork_depth = max_fork_depth
+        self.sub_flow_ratio = sub_flow_ratio
+        self.params = _ParamsPool(rng, param_density)
+        self.sub_flow_entry_points = sub_flow_entry_points
+
+    def _new_event(self, data) -> Event:
+        event = Event()
+        event.name = f'Event{len(self.events)}'
+        event.data = data
+        self.events.append(event)
+        self.remaining -= 1
+        return event
+
+    def _action(self) -> Event:
+        random = self.rng.random
+        actors = self.actors
+        actor = actors[int(random() * len(actors))]
+        actions = actor.actions
+        data = ActionEvent()
+        data.actor.v = actor
+        data.actor_action.v = actions[int(random() * len(actions))]
+        data.params = self.params.get()
+        return self._new_event(data)
+
+    def _sub_flow(self) -> Event:
+        rng = self.rng
+        data = SubFlowEvent()
+        data.entry_point_name = _pick(rng, self.sub_flow_entry_points)
+        data.res_flowchart_name = '' if rng.random() < 0.5 else f'SubFlowchart{int(rng.random() * 10)}'
+        data.params = self.params.get()
+        return self._new_event(data)
+
+    def sequence(self, budget: int, depth: int) -> typing.Tuple[Event, typing.List[Event]]:
+        """Generates exactly `budget` events (budget >= 1).
+        Returns the first event and the events whose next event is still unset."""
+        first: typing.Optional[Event] = None
+        tails: typing.List[Event] = []
+        while budget > 0:
+            start = self.remaining
+            entry, new_tails = self._segment(budget, depth)
+            budget -= start - self.remaining
+            if first is None:
+                first = entry
+            for tail in tails:
+                tail.data.nxt.v = entry  # type: ignore
+            tails = new_tails
+        assert first is not None
+        return first, tails
+
+    def _segment(self, budget: int, depth: int) -> typing.Tuple[Event, typing.List[Event]]:
+        rng = self.rng
+        x = rng.random()
+        fanout = self.switch_fanout
+        if x < self.switch_ratio and budget >= 1 + fanout and len(self.actors[0].queries) > 0:
+            return self._switch(budget, depth)
+        x -= self.switch_ratio
+        width = self.fork_width
+        if x < self.fork_ratio and depth < self.max_fork_depth and budget >= 2 + width:
+            return self._fork(budget, depth)
+        x -= self.fork_ratio
+        if x < self.sub_flow_ratio and self.sub_flow_entry_points:
+            event = self._sub_flow()
+        else:
+            event = self._action()
+        return event, [event]
+
+    def _branch_budget(self, budget: int, branches: int) -> int:
+        return 1 + int(self.rng.random() * max(1, min(8, budget // branches)))
+
+    def _switch(self, budget: int, depth: int) -> typing.Tuple[Event, typing.List[Event]]:
+        rng = self.rng
+        actor = _pick(rng, self.actors)
+        data = SwitchEvent()
+        data.actor.v = actor
+        data.actor_query.v = _pick(rng, actor.queries)
+        data.params = self.params.get()
+        event = self._new_event(data)
+        budget -= 1
+
+        tails: typing.List[Event] = []
+        fanout = self.switch_fanout
+        for value in range(fanout):
+            # Keep at least one event for each remaining case.
+            branch_budget = min(self._branch_budget(budget, fanout), budget - (fanout - value - 1))
+            start = self.remaining
+            case_entry, case_tails = self.sequence(branch_budget, depth)
+            budget -= start - self.remaining
+            case = RequiredIndex()  # type: RequiredIndex[Event]
+            case.v = case_entry
+            data.cases[value] = case
+            tails.extend(case_tails)
+        return event, tails
+
+    def _fork(self, budget: int, depth: int) -> typing.Tuple[Event, typing.List[Event]]:
+        data = ForkEvent()
+        event = self._new_event(data)
+        join_data = JoinEvent()
+        join = self._new_event(join_data)
+        data.join.v = join
+        budget -= 2
+
+        width = self.fork_width
+        for i in range(width):
+            branch_budget = min(self._branch_budget(budget, width), budget - (width - i - 1))
+            start = self.remaining
+            branch_entry, _ = self.sequence(branch_budget, depth + 1)
+            budget -= start - self.remaining
+            fork = RequiredIndex()  # type: RequiredIndex[Event]
+            fork.v = branch_entry
+            data.forks.append(fork)
+            # Branches end with a null next event.
+        return event, [join]
+
+def generate_flowchart(num_events: int = 1000, num_entry_points: int = 10, num_actors: int = 16,
+                       actions_per_actor: int = 8, queries_per_actor: int = 4,
+                       switch_ratio: float = 0.1, switch_fanout: int = 3,
+                       fork_ratio: float = 0.02, fork_width: int = 2, max_fork_depth: int = 2,
+                       sub_flow_ratio: float = 0.05, param_density: float = 1.5,
+                       seed: int = 0, name: str = '') -> Flowchart:
+    """Generates a valid flowchart with exactly `num_events` events.
+
+    Events are split evenly among the entry points. Each entry point leads to a sequence of
+    segments: action events, sub flow calls to the other entry points, switches with
+    `switch_fanout` cases that merge again, and forks with `fork_width` branches (nested up to
+    `max_fork_depth` levels). Ratios are per-segment probabilities. `param_density` is the
+    average number of parameters per event and actor."""
+    if not 0 < num_events <= MAX_EVENTS:
+        raise ValueError(f'Invalid number of events: {num_events}')
+    if not 0 < num_entry_points <= num_events:
+        raise ValueError(f'Invalid number of entry points: {num_entry_points}')
+    if switch_fanout < 1 or fork_width < 1:
+        raise ValueError('Switch fan-out and fork width must be positive')
+    if actions_per_actor < 1:
+        raise ValueError('Actors must have at least one action')
+
+    with _gc_paused():
+        return _generate_flowchart(num_events, num_entry_points, num_actors, actions_per_actor, queries_per_actor,
+                                   switch_ratio, switch_fanout, fork_ratio, fork_width, max_fork_depth,
+                                   sub_flow_ratio, param_density, seed, name)
+
+def _generate_flowchart(num_events: int, num_entry_points: int, num_actors: int, actions_per_actor: int,
+                        queries_per_actor: int, switch_ratio: float, switch_fanout: int, fork_ratio: float,
+                        fork_width: int, max_fork_depth: int, sub_flow_ratio: float, param_density: float,
+                        seed: int, name: str) -> Flowchart:
+    rng = random.Random(seed)
+    flowchart = Flowchart()
+    flowchart.name = name or f'SyntheticFlowchart{num_events}'
+    flowchart.actors = _make_actors(rng, num_actors, actions_per_actor, queries_per_actor, param_density)
+    entry_point_names = [f'Entry{i}' for i in range(num_entry_points)]
+    builder = _FlowchartBuilder(flowchart, rng, num_events, switch_ratio, switch_fanout, fork_ratio, fork_width,
+                                max_fork_depth, sub_flow_ratio, param_density, entry_point_names)
+
+    for i, entry_point_name in enumerate(entry_point_names):
+        budget = num_events // num_entry_points + (1 if i < num_events % num_entry_points else 0)
+        entry_point = EntryPoint(entry_point_name)
+        entry_point.main_event.v, _ = builder.sequence(budget, 0)
+        flowchart.entry_points.append(entry_point)
+
+    assert len(flowchart.events) == num_events
+    return flowchart
+
+def generate_timeline(num_clips: int = 1000, num_actors: int = 8, actions_per_actor: int = 4,
+                      overlap: float = 2.0, num_oneshots: int = 0, num_cuts: int = 0,
+                      param_density: float = 1.0, seed: int = 0, name: str = '') -> Timeline:
+    """Generates a valid timeline with `num_clips` clips.
+
+    Clips start at regular intervals and `overlap` is the average number of clips that are
+    playing at any given time. Concurrent clip slots and triggers are assigned, and the timeline
+    is set up to reassign them when it is written."""
+    if num_clips < 0 or 2 * num_clips > 0xFFFF:
+        raise ValueError(f'Invalid number of clips: {num_clips}')
+    if overlap <= 0:
+        raise ValueError('Overlap must be positive')
+
+    with _gc_paused():
+        return _generate_timeline(num_clips, num_actors, actions_per_actor, overlap, num_oneshots, num_cuts,
+                                  param_density, seed, name)
+
+def _generate_timeline(num_clips: int, num_actors: int, actions_per_actor: int, overlap: float,
+                       num_oneshots: int, num_cuts: int, param_density: float, seed: int, name: str) -> Timeline:
+    rng = random.Random(seed)
+    timeline = Timeline()
+    timeline.name = name or f'SyntheticTimeline{num_clips}'
+    timeline.auto_concurrent_clips = True
+    timeline.auto_triggers = True
+    timeline.params = _make_params(rng, param_density) or Container()
+    timeline.actors = _make_actors(rng, num_actors, actions_per_actor, 0, param_density)
+    actors = timeline.actors
+    params = _ParamsPool(rng, param_density)
+
+    end = 0.0
+    for i in range(num_clips):
+        actor = _pick(rng, actors)
+        clip = Clip()
+        clip.start_time = float(i)
+        # Durations are multiples of 1/4 so that they are exact in 32-bit floats.
+        clip.duration = max(0.25, round(rng.uniform(0.5, 1.5) * overlap * 4) / 4)
+        clip.actor.v = actor
+        clip.actor_action.v = _pick(rng, actor.actions)
+        clip.params = params.get()
+        timeline.clips.append(clip)
+        end = max(end, clip.start_time + clip.duration)
+    timeline.duration = end
+
+    for i in range(num_oneshots):
+        actor = _pick(rng, actors)
+        oneshot = Oneshot()
+        oneshot.time = float(rng.randrange(int(end) + 1))
+        oneshot.actor.v = actor
+        oneshot.actor_action.v = _pick(rng, actor.actions)
+        oneshot.params = params.get()
+        timeline.oneshots.append(oneshot)
+    timeline.oneshots.sort(key=lambda o: o.time)
+
+    for i in range(num_cuts):
+        cut = Cut()
+        cut.start_time = end * i / num_cuts
+        cut.name = f'Cut{i}'
+        cut.params = params.get()
+        timeline.cuts.append(cut)
+
+    timeline.assign_concurrent_clips()
+    timeline.generate_triggers()
+    return timeline
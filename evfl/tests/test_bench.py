@@ -0,0 +1,55 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from evfl import bench
+
+class BenchTest(unittest.TestCase):
+    def test_main(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(bench.main(['-k', 'GanonQuest', '--no-synthetic', '--quick', '-r', '1', '-o', output]), 0)
+                with open(output) as f:
+                    results = json.load(f)
+                # Comparing against the previous run must work as well.
+                self.assertEqual(bench.main(['-k', 'GanonQuest', '--no-synthetic', '--quick', '-r', '1',
+                                             '-b', 'read', '--compare', output, '-o', output]), 0)
+
+        self.assertEqual(results['version'], bench.RESULTS_VERSION)
+        benchmarks = {r['benchmark'] for r in results['results']}
+        self.assertEqual(benchmarks, {'read', 'write', 'roundtrip', 'serialized_size', 'dic', 'string_pool',
+                                      'relocation_table', 'text_dump', 'text_load', 'pickle_dumps',
+                                      'pickle_loads', 'clone', 'deepcopy', 'graph'})
+        pickle_sizes = {r['encoded_size'] for r in results['results'] if r['benchmark'].startswith('pickle')}
+        self.assertEqual(len(pickle_sizes), 1)
+        self.assertGreater(pickle_sizes.pop(), 0)
+        self.assertTrue(all(r['input'] == 'GanonQuest.bfevfl' and r['median'] > 0 for r in results['results']))
+
+    def test_targets(self) -> None:
+        size = bench.TARGET_MIN_SIZE
+        fast = bench.Result('a', 0, 'text_load', 1, 1, 0.001, 0.001, size)
+        slow = bench.Result('b', 0, 'text_load', 1, 1, 10.0, 10.0, size)
+        small = bench.Result('c', 0, 'text_load', 1, 1, 10.0, 10.0, 1)
+        untargeted = bench.Result('d', 0, 'read', 1, 1, 10.0, 10.0, size)
+        self.assertEqual(bench.missed_targets([fast, slow, small, untargeted]), [slow])
+
+    def test_synthetic(self) -> None:
+        for inp in bench.synthetic_inputs(quick=True):
+            with self.subTest(input=inp.name):
+                results = bench.run([inp], ['roundtrip'], repeat=1, min_time=0)
+                self.assertEqual(len(results), 1)
+
+    def test_memory(self) -> None:
+        results = bench.measure_memory(i for i in bench.corpus_inputs() if i.name == 'Demo102_0.bfevtm')
+        self.assertEqual(len(results), 1)
+        self.assertGreater(results[0].retained, 0)
+        self.assertEqual(results[0].events, 0)
+        self.assertGreater(results[0].clips, 0)
+
+        per_object = bench.memory_per_object(100)
+        self.assertEqual(set(per_object.keys()), {'event', 'actor', 'clip'})
+        self.assertTrue(all(size > 0 for size in per_object.values()))
@@ -0,0 +1,70 @@
+import io
+import os
+import pickle
+import unittest
+
+from evfl import synth, text
+from evfl.evfl import EventFlow
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+def _write(flow: EventFlow) -> bytes:
+    stream = io.BytesIO()
+    flow.write(stream)
+    return stream.getvalue()
+
+def _make_flow() -> EventFlow:
+    flow = EventFlow()
+    flow.name = 'Bundle'
+    for i, name in enumerate(('First', 'Second', 'Third')):
+        flow.flowcharts[name] = synth.generate_flowchart(50 * (i + 1), num_entry_points=2, seed=i, name=name)
+    for i, name in enumerate(('TimelineA', 'TimelineB')):
+        flow.timelines[name] = synth.generate_timeline(20, num_cuts=1, seed=i, name=name)
+    return flow
+
+class MultipleBlocksTest(unittest.TestCase):
+    def test_roundtrip(self) -> None:
+        data = _write(_make_flow())
+        flow = EventFlow()
+        flow.read(data)
+        self.assertEqual(list(flow.flowcharts.keys()), ['First', 'Second', 'Third'])
+        self.assertEqual(list(flow.timelines.keys()), ['TimelineA', 'TimelineB'])
+        self.assertEqual(len(flow.flowcharts['Second'].events), 100)
+        self.assertIs(flow.flowchart, flow.flowcharts['First'])
+        self.assertEqual(_write(flow), data)
+        self.assertEqual(flow.serialized_size(), len(data))
+        self.assertEqual(flow.validate(), [])
+
+    def test_lazy(self) -> None:
+        data = _write(_make_flow())
+        flow = EventFlow()
+        flow.read(data, lazy=True)
+        self.assertFalse(any(flow.flowcharts.is_loaded(name) for name in flow.flowcharts))
+        self.assertEqual(flow.flowcharts['Third'].name, 'Third')
+        self.assertTrue(flow.flowcharts.is_loaded('Third'))
+        self.assertFalse(flow.flowcharts.is_loaded('First'))
+
+        copy = pickle.loads(pickle.dumps(flow))
+        self.assertTrue(all(copy.flowcharts.is_loaded(name) for name in copy.flowcharts))
+        self.assertEqual(_write(copy), data)
+        self.assertEqual(_write(flow), data)
+
+    def test_text(self) -> None:
+        flow = _make_flow()
+        self.assertEqual(_write(text.loads(text.dumps(flow))), _write(flow))
+
+    def test_single(self) -> None:
+        with open(os.path.join(_ORIGINAL_DIR, 'Demo102_0.bfevtm'), 'rb') as f:
+            flow = EventFlow()
+            flow.read(f.read())
+        self.assertEqual(list(flow.timelines.keys()), [flow.timeline.name])
+        self.assertEqual(len(flow.flowcharts), 0)
+        self.assertIsNone(flow.flowchart)
+
+    def test_validate(self) -> None:
+        flow = _make_flow()
+        flow.flowcharts['Second'].name = 'First'
+        self.assertEqual(flow.validate(), [
+            "flowchart 'Second': duplicate name",
+            "flowchart 'Second': stored under a different name than its own ('First')",
+        ])
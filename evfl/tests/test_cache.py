@@ -0,0 +1,91 @@
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from evfl.cache import ParseCache
+from evfl.evfl import EventFlow
+
+def _read_file(name: str) -> bytes:
+    with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', name), 'rb') as f:
+        return f.read()
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+
+    def tearDown(self) -> None:
+        self._tmp.cleanup()
+
+    def test_hit(self) -> None:
+        cache = ParseCache(self.directory)
+        for name in ['Common.bfevfl', 'Demo149_1.bfevtm']:
+            data = _read_file(name)
+            cache.load(data)
+            flow = ParseCache(self.directory).load(data)
+            stream = io.BytesIO()
+            flow.write(stream)
+            self.assertEqual(data, stream.getbuffer())
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.load(_read_file('Common.bfevfl')).name, 'Common')
+        self.assertEqual(cache.hits, 1)
+
+    def test_stale_entry(self) -> None:
+        cache = ParseCache(self.directory)
+        data = _read_file('TipsCommon.bfevfl')
+        cache.load(data)
+        path = cache._path(cache.digest(data))
+        with open(path, 'r+b') as f:
+            f.seek(6)
+            f.write(b'\xff\xff')
+        self.assertIsNone(cache.get(cache.digest(data)))
+        self.assertFalse(os.path.exists(path))
+
+    def test_eviction(self) -> None:
+        files = ['Common.bfevfl', 'TipsCommon.bfevfl', 'Demo103_0.bfevtm']
+        cache = ParseCache(self.directory, max_size=1 << 30)
+        for i, name in enumerate(files):
+            digest = cache.digest(_read_file(name))
+            cache.load(_read_file(name))
+            os.utime(cache._path(digest), (1000 + i, 1000 + i))
+        sizes = [os.path.getsize(cache._path(cache.digest(_read_file(name)))) for name in files]
+
+        # Accessing the oldest entry makes it the most recently used one.
+        cache.get(cache.digest(_read_file(files[0])))
+        cache.max_size = sizes[0] + sizes[2]
+        cache._evict()
+        remaining = [os.path.exists(cache._path(cache.digest(_read_file(name)))) for name in files]
+        self.assertEqual(remaining, [True, False, True])
+        self.assertLessEqual(cache.size(), cache.max_size)
+
+    def test_eviction_scans(self) -> None:
+        files = ['Common.bfevfl', 'TipsCommon.bfevfl', 'Demo103_0.bfevtm']
+        cache = ParseCache(self.directory, max_size=1 << 30)
+        with mock.patch.object(cache, '_entries', wraps=cache._entries) as entries:
+            for name in files:
+                cache.load(_read_file(name))
+            # Only the first put scans the directory while the cache is below its limit.
+            self.assertEqual(entries.call_count, 1)
+
+        cache.max_size = cache.size() - 1
+        cache.load(_read_file('Demo149_1.bfevtm'))
+        self.assertLessEqual(cache.size(), cache.max_size - cache.max_size // 8)
+        self.assertEqual(cache._total_size, cache.size())
+
+class FormatVersionTest(unittest.TestCase):
+    # If this fails, the pickled representation has changed: bump ParseCache.FORMAT_VERSION
+    # and update the digest.
+    PICKLE_DIGEST = (4, '32553dccd954cf7308234b21c952e050a3b70615564d57887cd4ff3089308e58')
+
+    def test(self) -> None:
+        h = hashlib.sha256()
+        for name in ['Common.bfevfl', 'Demo149_1.bfevtm']:
+            flow = EventFlow()
+            flow.read(_read_file(name))
+            h.update(pickle.dumps(flow, 4))
+        self.assertEqual((ParseCache.FORMAT_VERSION, h.hexdigest()), self.PICKLE_DIGEST)
+
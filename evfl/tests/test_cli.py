@@ -0,0 +1,33 @@
+import contextlib
+import io
+import os
+import unittest
+
+from evfl import cli
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+class ExpandPathsTest(unittest.TestCase):
+    def test(self) -> None:
+        from_dir = cli.expand_paths([_ORIGINAL_DIR])
+        from_glob = cli.expand_paths([os.path.join(_ORIGINAL_DIR, '*.bfev*')])
+        self.assertEqual(len(from_dir), 15)
+        self.assertEqual(sorted(from_dir), sorted(from_glob))
+        self.assertEqual(cli.expand_paths([from_dir[0], from_dir[0]]), [from_dir[0]])
+
+class MainTest(unittest.TestCase):
+    def test_roundtrip(self) -> None:
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(cli.main(['roundtrip', _ORIGINAL_DIR, '-j', '2', '-q']), 0)
+
+    def test_errors(self) -> None:
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(cli.main(['info', os.path.realpath(__file__), '-j', '1']), 1)
+        self.assertIn('Wrong magic', stderr.getvalue())
+
+    def test_stats(self) -> None:
+        stdout = io.StringIO()
+        with contextlib.redirect_stderr(io.StringIO()), contextlib.redirect_stdout(stdout):
+            self.assertEqual(cli.main(['stats', os.path.join(_ORIGINAL_DIR, '*.bfevtm'), '-j', '1']), 0)
+        self.assertIn('timelines: 5', stdout.getvalue())
@@ -0,0 +1,57 @@
+import io
+import os
+import unittest
+
+from evfl.event import ActionEvent
+from evfl.evfl import EventFlow
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+def _read(name: str) -> EventFlow:
+    flow = EventFlow()
+    with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+        flow.read(f.read())
+    return flow
+
+class CloneRoundTripTest(unittest.TestCase):
+    def test(self) -> None:
+        for name in sorted(os.listdir(_ORIGINAL_DIR)):
+            with self.subTest(file=name):
+                with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+                    data = f.read()
+                flow = EventFlow()
+                flow.read(data)
+                copy = EventFlow()
+                copy.name = flow.name
+                copy.flowchart = flow.flowchart.clone() if flow.flowchart else None
+                copy.timeline = flow.timeline.clone() if flow.timeline else None
+                stream = io.BytesIO()
+                copy.write(stream)
+                self.assertEqual(data, stream.getbuffer())
+
+class CloneIndependenceTest(unittest.TestCase):
+    def test_flowchart(self) -> None:
+        flowchart = _read('Common.bfevfl').flowchart
+        assert flowchart
+        copy = flowchart.clone()
+        event_to_idx = {id(e): i for i, e in enumerate(flowchart.events)}
+        for old, new in zip(flowchart.events, copy.events):
+            self.assertIsNot(old, new)
+            if isinstance(old.data, ActionEvent):
+                self.assertIs(new.data.actor.v, copy.actors[flowchart.actors.index(old.data.actor.v)])
+                self.assertIn(new.data.actor_action.v, new.data.actor.v.actions)
+                if old.data.nxt.v:
+                    self.assertIs(new.data.nxt.v, copy.events[event_to_idx[id(old.data.nxt.v)]])
+                if old.data.params:
+                    self.assertIsNot(new.data.params, old.data.params)
+                    new.data.params.data['Test'] = 1
+                    self.assertNotIn('Test', old.data.params.data)
+
+    def test_timeline(self) -> None:
+        timeline = _read('Demo149_1.bfevtm').timeline
+        assert timeline
+        copy = timeline.clone()
+        for old, new in zip(timeline.triggers, copy.triggers):
+            self.assertIs(new.clip.v, copy.clips[timeline.clips.index(old.clip.v)])
+        copy.actors[0].identifier.name = 'Renamed'
+        self.assertNotEqual(timeline.actors[0].identifier.name, 'Renamed')
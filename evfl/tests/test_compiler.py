@@ -0,0 +1,73 @@
+import os
+import typing
+import unittest
+
+from evfl.compiler import compile_flowchart, interpret
+from evfl.evfl import EventFlow
+
+_FILES = ['AutoPlacement_Animal.bfevfl', 'Common.bfevfl', 'Demo346_0.bfevfl',
+          'Npc_HatenoVillage017.bfevfl', 'Npc_SouthHateru007.bfevfl', 'TipsCommon.bfevfl']
+
+def _read_flow(name: str) -> EventFlow:
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', name)
+    flow = EventFlow()
+    with open(path, 'rb') as f:
+        flow.read(f.read())
+    return flow
+
+class _Recorder:
+    """Records every callback and answers queries with a deterministic sequence."""
+    class Stop(Exception):
+        pass
+
+    def __init__(self) -> None:
+        self.trace: typing.List[tuple] = []
+
+    def _record(self, item: tuple) -> None:
+        self.trace.append(item)
+        if len(self.trace) > 500:
+            raise _Recorder.Stop()
+
+    def action(self, params) -> None:
+        self._record(('action', id(params)))
+
+    def query(self, params) -> int:
+        self._record(('query', id(params)))
+        return len(self.trace) % 3
+
+    def sub_flow(self, res_flowchart_name: str, entry_point_name: str, params) -> None:
+        self._record(('sub_flow', res_flowchart_name, entry_point_name))
+
+class CompiledMatchesInterpreterTest(unittest.TestCase):
+    def test(self) -> None:
+        for name in _FILES:
+            flowchart = _read_flow(name).flowchart
+            assert flowchart
+            program = compile_flowchart(flowchart)
+            for entry_point in flowchart.entry_points:
+                with self.subTest(file=name, entry_point=entry_point.name):
+                    traces = []
+                    for use_compiled in (False, True):
+                        rec = _Recorder()
+                        try:
+                            if use_compiled:
+                                program.bind(sub_flow=rec.sub_flow, default_action=rec.action,
+                                             default_query=rec.query).run(entry_point.name)
+                            else:
+                                interpret(flowchart, entry_point.name, sub_flow=rec.sub_flow,
+                                          default_action=rec.action, default_query=rec.query)
+                        except _Recorder.Stop:
+                            pass
+                        traces.append(rec.trace)
+                    self.assertEqual(traces[0], traces[1])
+                    self.assertTrue(traces[0])
+
+class CompileCacheTest(unittest.TestCase):
+    def test(self) -> None:
+        cache: dict = dict()
+        program1 = compile_flowchart(_read_flow('Common.bfevfl').flowchart, cache) # type: ignore
+        program2 = compile_flowchart(_read_flow('Common.bfevfl').flowchart, cache) # type: ignore
+        self.assertIs(program1, program2)
+        self.assertEqual(len(cache), 1)
+        compile_flowchart(_read_flow('TipsCommon.bfevfl').flowchart, cache) # type: ignore
+        self.assertEqual(len(cache), 2)
@@ -0,0 +1,94 @@
+import array
+import io
+import pickle
+import random
+import struct
+import unittest
+
+from evfl.common import BoolArray, StringArray
+from evfl.container import Container
+from evfl.util import ReadStream, WriteStream
+
+def _roundtrip(container: Container) -> Container:
+    stream = io.BytesIO()
+    writer = WriteStream(stream)
+    container.write(writer)
+    writer.finalise()
+    result = Container()
+    result.read(ReadStream(stream.getvalue()))
+    return result
+
+class ContainerArrayTest(unittest.TestCase):
+    def test_types(self) -> None:
+        container = Container()
+        container.data['Ints'] = [1, -2, 0x7FFFFFFF]
+        container.data['Floats'] = [1, 2.5]
+        container.data['Bools'] = [True, False, True]
+        container.data['Strings'] = ['a', 'bc']
+        container.data['EmptyInts'] = array.array('i')
+        data = _roundtrip(container).data
+        self.assertEqual(data['Ints'], array.array('i', [1, -2, 0x7FFFFFFF]))
+        self.assertEqual(data['Floats'], array.array('f', [1.0, 2.5]))
+        self.assertEqual(data['Bools'], [True, False, True])
+        self.assertEqual(data['Strings'], ['a', 'bc'])
+        self.assertEqual(data['EmptyInts'], array.array('i'))
+        self.assertEqual(_roundtrip(container).content_key(), container.content_key())
+
+    def test_empty_arrays(self) -> None:
+        container = Container()
+        container.data['Ints'] = array.array('i')
+        container.data['Floats'] = array.array('f')
+        container.data['Bools'] = BoolArray()
+        container.data['Strings'] = StringArray()
+        data = _roundtrip(container).data
+        for key, value in container.data.items():
+            with self.subTest(key=key):
+                self.assertIs(type(data[key]), type(value))
+                self.assertEqual(len(data[key]), 0)
+        # Arrays that were read back can be written again.
+        self.assertEqual(_roundtrip(Container(data)).content_key(), container.content_key())
+        self.assertNotEqual(container.content_key(), Container(dict(container.data, Bools=StringArray())).content_key())
+
+        self.assertEqual(_roundtrip(_container(Bools=BoolArray([True]))).data['Bools'], [True])
+        with self.assertRaises(ValueError):
+            _roundtrip(_container(Bools=BoolArray([1])))
+
+    def test_float_bits(self) -> None:
+        rng = random.Random(0)
+        raw = bytes(rng.getrandbits(8) for i in range(4 * 0xFFFF))
+        # Include a signalling NaN, which must not be quieted.
+        raw = struct.pack('<I', 0x7F800001) + raw[4:]
+        floats = array.array('f')
+        floats.frombytes(raw)
+        container = Container()
+        container.data['Floats'] = floats
+        result = _roundtrip(container).data['Floats']
+        self.assertIs(type(result), array.array)
+        self.assertEqual(result.tobytes(), raw)
+
+    def test_invalid_lists(self) -> None:
+        for value in ([], [1, 'a'], [True, 1]):
+            with self.subTest(value=value):
+                container = Container()
+                container.data['Value'] = value
+                with self.assertRaises(ValueError):
+                    _roundtrip(container)
+                self.assertEqual(len(container.validate()), 1)
+
+    def test_clone_and_pickle(self) -> None:
+        container = Container()
+        container.data['Floats'] = array.array('f', [0.5, 1.5])
+        for copy in (container.clone(), pickle.loads(pickle.dumps(container))):
+            self.assertEqual(copy.content_key(), container.content_key())
+            self.assertIsNot(copy.data['Floats'], container.data['Floats'])
+        self.assertEqual(container.digest(), Container.digest(_with_list()))
+
+def _with_list() -> Container:
+    container = Container()
+    container.data['Floats'] = [0.5, 1.5]
+    return container
+
+def _container(**items) -> Container:
+    container = Container()
+    container.data.update(items)
+    return container
@@ -0,0 +1,93 @@
+import io
+import os
+import unittest
+
+import evfl
+from evfl.evfl import EventFlow
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+def _read_flow(name: str) -> EventFlow:
+    with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+        flow = EventFlow()
+        flow.read(f.read())
+        return flow
+
+def _write(flow: EventFlow) -> bytes:
+    stream = io.BytesIO()
+    flow.write(stream)
+    return stream.getvalue()
+
+class DiffPatchTest(unittest.TestCase):
+    def test_identical(self) -> None:
+        a = _read_flow('Npc_HatenoVillage017.bfevfl')
+        p = evfl.diff(a, _read_flow('Npc_HatenoVillage017.bfevfl'))
+        self.assertFalse(p.changed)
+        self.assertEqual(p.num_inserted(), 0)
+        self.assertEqual(len(p.flowchart.lists['events'].ops), 1)
+
+    def test_corpus_pairs(self) -> None:
+        names = sorted(os.listdir(_ORIGINAL_DIR))
+        # Every file is diffed against the next one, which covers flowchart <-> timeline changes.
+        for a_name, b_name in zip(names, names[1:] + names[:1]):
+            with self.subTest(a=a_name, b=b_name):
+                a = _read_flow(a_name)
+                b = _read_flow(b_name)
+                self.assertEqual(_write(evfl.patch(a, evfl.diff(a, b))), _write(b))
+
+    def test_edits(self) -> None:
+        a = _read_flow('Common.bfevfl')
+        b = _read_flow('Common.bfevfl')
+        flowchart = b.flowchart
+        flowchart.events[3].name = 'RenamedEvent'
+        del flowchart.events[10]
+        for event in flowchart.events:
+            data = event.data
+            for attr in ('nxt', 'join'):
+                index = getattr(data, attr, None)
+                if index is not None and getattr(index, 'v', None) not in flowchart.events:
+                    index.v = None
+            if hasattr(data, 'cases'):
+                data.cases = {value: case for value, case in data.cases.items() if case.v in flowchart.events}
+            if hasattr(data, 'forks'):
+                data.forks = [fork for fork in data.forks if fork.v in flowchart.events]
+        for entry_point in flowchart.entry_points:
+            if entry_point.main_event.v not in flowchart.events:
+                entry_point.main_event.v = None
+        flowchart.events.append(flowchart.events.pop(0))
+
+        p = evfl.diff(a, b)
+        self.assertTrue(p.changed)
+        self.assertLess(p.num_inserted(), len(flowchart.events) // 2)
+        self.assertEqual(_write(evfl.patch(a, p)), _write(b))
+
+    def test_wrong_source(self) -> None:
+        p = evfl.diff(_read_flow('Common.bfevfl'), _read_flow('TipsCommon.bfevfl'))
+        with self.assertRaises(ValueError):
+            evfl.patch(_read_flow('Animal_Forest.bfevfl'), p)
+
+    def test_multiple_blocks(self) -> None:
+        def flow_of(*names: str) -> EventFlow:
+            flow = EventFlow()
+            flow.name = 'Multi'
+            for name in names:
+                source = _read_flow(name)
+                flow.flowcharts.update(source.flowcharts)
+                flow.timelines.update(source.timelines)
+            return flow
+
+        a = flow_of('Common.bfevfl', 'TipsCommon.bfevfl', 'Demo102_0.bfevtm')
+        b = flow_of('TipsCommon.bfevfl', 'Common.bfevfl', 'GanonQuest.bfevfl', 'Demo103_0.bfevtm')
+        b.flowcharts['Common'].events[0].name = 'RenamedEvent'
+        p = evfl.diff(a, b)
+        self.assertTrue(p.changed)
+        self.assertEqual(list(p.flowcharts), ['TipsCommon', 'Common', 'GanonQuest'])
+        self.assertEqual([s.source_name for s in p.flowcharts.values()], ['TipsCommon', 'Common', None])
+        # The only timeline was replaced, so it is diffed against the old one.
+        self.assertEqual(p.timeline.source_name, 'Demo102_0')
+        self.assertLess(p.num_inserted(), len(b.flowcharts['Common'].events))
+        self.assertEqual(_write(evfl.patch(a, p)), _write(b))
+
+        self.assertFalse(evfl.diff(a, flow_of('Common.bfevfl', 'TipsCommon.bfevfl', 'Demo102_0.bfevtm')).changed)
+        with self.assertRaises(ValueError):
+            evfl.patch(flow_of('Common.bfevfl', 'Demo102_0.bfevtm'), p)
@@ -0,0 +1,166 @@
+import array
+import os
+import unittest
+
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier, Argument, StringHolder
+from evfl.container import Container
+from evfl.event import Event, ActionEvent
+from evfl.evfl import EventFlow
+from evfl.flowchart import Flowchart
+from evfl.util import make_index, make_rindex
+
+def _read_flow(name: str) -> EventFlow:
+    with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', name), 'rb') as f:
+        flow = EventFlow()
+        flow.read(f.read())
+        return flow
+
+def _container(**items) -> Container:
+    container = Container()
+    container.data.update(items)
+    return container
+
+class ContainerContentKeyTest(unittest.TestCase):
+    def test(self) -> None:
+        self.assertEqual(_container(a=1, b=[1.0, 2.0]).content_key(), _container(a=1, b=[1.0, 2.0]).content_key())
+        self.assertEqual(_container(a=1).digest(), _container(a=1).digest())
+        self.assertNotEqual(_container(a=1).content_key(), _container(a=1.0).content_key())
+        self.assertNotEqual(_container(a=1).content_key(), _container(a=True).content_key())
+        self.assertNotEqual(_container(a='x').content_key(), _container(a=Argument('x')).content_key())
+        self.assertNotEqual(_container(a=1, b=2).content_key(), _container(b=2, a=1).content_key())
+        self.assertEqual(_container(a=ActorIdentifier('A', 'B')).content_key(),
+                         _container(a=ActorIdentifier('A', 'B')).content_key())
+
+    def test_floats(self) -> None:
+        # Keys and digests both compare the f32 encoding that is written.
+        for a, b in ((0.0, -0.0), (1.0, 1.0 + 1e-9)):
+            equal = _container(x=a).content_key() == _container(x=b).content_key()
+            self.assertEqual(equal, _container(x=a).digest() == _container(x=b).digest())
+        self.assertNotEqual(_container(x=0.0).content_key(), _container(x=-0.0).content_key())
+        self.assertEqual(_container(x=1.0).content_key(), _container(x=1.0 + 1e-9).content_key())
+        self.assertEqual(_container(x=float('nan')).content_key(), _container(x=float('nan')).content_key())
+        self.assertNotEqual(_container(x=[0.0]).content_key(), _container(x=array.array('f', [-0.0])).content_key())
+        self.assertEqual(_container(x=[1, 2.5]).digest(), _container(x=array.array('f', [1.0, 2.5])).digest())
+
+    def test_identity(self) -> None:
+        # Containers are mutable, so a container in a set is still found after it is modified.
+        container = _container(a=1, b=[1, 2])
+        self.assertNotEqual(container, _container(a=1, b=[1, 2]))
+        containers = {container}
+        digest = container.digest()
+        container.data['a'] = 2
+        self.assertIn(container, containers)
+        self.assertNotEqual(container.digest(), digest)
+        digest = container.digest()
+        container.data['b'].append(3)
+        self.assertNotEqual(container.digest(), digest)
+
+class FlowchartHashesTest(unittest.TestCase):
+    def test_stable(self) -> None:
+        for name in ['Common.bfevfl', 'Npc_SouthHateru007.bfevfl', 'Demo346_0.bfevfl']:
+            with self.subTest(file=name):
+                a = _read_flow(name).flowchart
+                b = _read_flow(name).flowchart
+                self.assertEqual(a.compute_hashes().flowchart, b.compute_hashes().flowchart)
+                self.assertEqual(a.clone().compute_hashes().flowchart, a.compute_hashes().flowchart)
+                for ea, eb in zip(a.events, b.events):
+                    self.assertEqual(a.compute_hashes().subgraph(ea), b.compute_hashes().subgraph(eb))
+
+    def test_rename(self) -> None:
+        flowchart = _read_flow('Common.bfevfl').flowchart
+        hashes = flowchart.compute_hashes()
+        flowchart.events[0].name = 'Renamed'
+        renamed = flowchart.compute_hashes()
+        self.assertNotEqual(renamed.flowchart, hashes.flowchart)
+        for event in flowchart.events:
+            self.assertEqual(renamed.subgraph(event), hashes.subgraph(event))
+
+    def test_snapshot(self) -> None:
+        flowchart = _read_flow('Common.bfevfl').flowchart
+        hashes = flowchart.compute_hashes()
+        event = next(e for e in flowchart.events if getattr(e.data, 'params', None))
+        digest = hashes.event(event)
+        event.data.params.data['Changed'] = 1
+        self.assertEqual(hashes.event(event), digest)
+        self.assertNotEqual(flowchart.compute_hashes().event(event), digest)
+
+    def test_equal_subgraphs(self) -> None:
+        flowchart = Flowchart()
+        actor = Actor()
+        actor.identifier = ActorIdentifier('EventSystemActor')
+        actor.actions = [StringHolder('Demo_WaitFrame'), StringHolder('Demo_Other')]
+        flowchart.actors.append(actor)
+
+        def add(action: int, frame: int) -> Event:
+            event = Event()
+            event.name = f'Event{len(flowchart.events)}'
+            event.data = ActionEvent()
+            event.data.actor = make_rindex(actor)
+            event.data.actor_action = make_rindex(actor.actions[action])
+            event.data.params = _container(Frame=frame)
+            flowchart.events.append(event)
+            return event
+
+        def loop(frames) -> Event:
+            events = [add(0, frame) for frame in frames]
+            for event, nxt in zip(events, events[1:] + events[:1]):
+                event.data.nxt = make_index(nxt)
+            return events[0]
+
+        loop_a = loop([1, 2, 3])
+        loop_b = loop([1, 2, 3])
+        loop_c = loop([1, 2, 4])
+        entry_a = add(1, 0)
+        entry_a.data.nxt = make_index(loop_a)
+        entry_b = add(1, 0)
+        entry_b.data.nxt = make_index(loop_b.data.nxt.v.data.nxt.v.data.nxt.v)
+
+        hashes = flowchart.compute_hashes()
+        self.assertEqual(hashes.event(loop_a), hashes.event(loop_c))
+        self.assertEqual(hashes.subgraph(loop_a), hashes.subgraph(loop_b))
+        self.assertNotEqual(hashes.subgraph(loop_a), hashes.subgraph(loop_c))
+        self.assertNotEqual(hashes.subgraph(loop_a), hashes.subgraph(loop_a.data.nxt.v))
+        self.assertEqual(hashes.subgraph(entry_a), hashes.subgraph(entry_b))
+
+        # A cycle of equal events is equivalent to a single event that leads to itself.
+        loop_d = loop([5, 5])
+        loop_e = loop([5])
+        hashes = flowchart.compute_hashes()
+        self.assertEqual(hashes.subgraph(loop_d), hashes.subgraph(loop_d.data.nxt.v))
+        self.assertEqual(hashes.subgraph(loop_d), hashes.subgraph(loop_e))
+
+    def test_long_cycles(self) -> None:
+        # Cycles that only differ after more events than any fixed number of refinement rounds.
+        flowchart = Flowchart()
+        actor = Actor()
+        actor.identifier = ActorIdentifier('EventSystemActor')
+        actor.actions = [StringHolder('A'), StringHolder('X'), StringHolder('Y'), StringHolder('Z')]
+        flowchart.actors.append(actor)
+
+        def loop(pattern: str) -> Event:
+            events = []
+            for action in pattern:
+                event = Event()
+                event.name = f'Event{len(flowchart.events)}'
+                event.data = ActionEvent()
+                event.data.actor = make_rindex(actor)
+                event.data.actor_action = make_rindex(actor.actions['AXYZ'.index(action)])
+                flowchart.events.append(event)
+                events.append(event)
+            for event, nxt in zip(events, events[1:] + events[:1]):
+                event.data.nxt = make_index(nxt)
+            return events[0]
+
+        a = 'A' * 20
+        xyz = loop('X' + a + 'Y' + a + 'Z' + a)
+        xzy = loop('X' + a + 'Z' + a + 'Y' + a)
+        # The same cycle as xyz, listed from another event.
+        yzx = loop('Y' + a + 'Z' + a + 'X' + a)
+        hashes = flowchart.compute_hashes()
+        self.assertNotEqual(hashes.subgraph(xyz), hashes.subgraph(xzy))
+        event = yzx
+        for i in range(42):
+            event = event.data.nxt.v
+        self.assertEqual(hashes.subgraph(event), hashes.subgraph(xyz))
+        self.assertEqual(len({hashes.subgraph(e) for e in flowchart.events}), 2 * 63)
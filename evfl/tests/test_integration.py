@@ -1,8 +1,13 @@
+import enum
 import io
 import os
+import stat
+import tempfile
 import typing
 import unittest
 
+from evfl import synth
+from evfl.event import ActionEvent
 from evfl.evfl import EventFlow
 
 def _open_test_file(name: str) -> typing.BinaryIO:
@@ -51,3 +56,104 @@ class IntegrationTest(unittest.TestCase):
                 flow.write(stream)
 
                 self.assertEqual(data, stream.getbuffer())
+
+                # Writer state must not be kept on the objects.
+                stream = io.BytesIO()
+                flow.write(stream)
+                self.assertEqual(data, stream.getbuffer())
+
+class SlotsTest(unittest.TestCase):
+    def test(self) -> None:
+        for file in ('Animal_Forest.bfevfl', 'Demo102_0.bfevtm'):
+            with self.subTest(file=file):
+                with _open_test_file(f'original/{file}') as f:
+                    flow = EventFlow()
+                    flow.read(f.read())
+                objects: typing.List[typing.Any] = []
+                if flow.flowchart:
+                    objects += [flow.flowchart, *flow.flowchart.actors, *flow.flowchart.entry_points]
+                    objects += flow.flowchart.events + [e.data for e in flow.flowchart.events]
+                    objects += [e.data.params for e in flow.flowchart.events if getattr(e.data, 'params', None)]
+                if flow.timeline:
+                    t = flow.timeline
+                    objects += [t, *t.actors, *t.clips, *t.oneshots, *t.triggers, *t.subtimelines, *t.cuts]
+                for obj in objects:
+                    self.assertFalse(hasattr(obj, '__dict__'), type(obj).__name__)
+
+class SerializedSizeTest(unittest.TestCase):
+    def test(self) -> None:
+        flows = []
+        original_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+        for file in sorted(os.listdir(original_dir)):
+            with _open_test_file(f'original/{file}') as f:
+                flow = EventFlow()
+                flow.read(f.read())
+                flows.append((file, flow))
+        flow = EventFlow()
+        flow.flowchart = synth.generate_flowchart(2000, num_entry_points=20)
+        flows.append(('synthetic flowchart', flow))
+        flow = EventFlow()
+        flow.timeline = synth.generate_timeline(1000, num_oneshots=100, num_cuts=10)
+        flows.append(('synthetic timeline', flow))
+
+        for name, flow in flows:
+            with self.subTest(file=name):
+                stream = io.BytesIO()
+                flow.write(stream)
+                self.assertEqual(flow.serialized_size(), len(stream.getbuffer()))
+
+    def test_subclasses(self) -> None:
+        class Mode(enum.IntEnum):
+            Fast = 2
+
+        class Ratio(float):
+            pass
+
+        flow = EventFlow()
+        flow.flowchart = synth.generate_flowchart(20)
+        params = next(e.data.params for e in flow.flowchart.events if isinstance(e.data, ActionEvent))
+        params.data['Mode'] = Mode.Fast
+        params.data['Ratio'] = Ratio(0.5)
+        stream = io.BytesIO()
+        flow.write(stream)
+        self.assertEqual(flow.serialized_size(), len(stream.getbuffer()))
+
+    def test_invalid(self) -> None:
+        with self.assertRaises(ValueError):
+            EventFlow().serialized_size()
+
+class WriteFileTest(unittest.TestCase):
+    def test(self) -> None:
+        with _open_test_file('original/Demo102_0.bfevtm') as f:
+            data = f.read()
+        flow = EventFlow()
+        flow.read(data)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'Demo102_0.bfevtm')
+            with open(path, 'wb') as f:
+                f.write(b'old contents')
+            self.assertTrue(flow.write_file(path))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(os.listdir(directory), ['Demo102_0.bfevtm'])
+
+            self.assertFalse(EventFlow().write_file(os.path.join(directory, 'Invalid.bfevfl')))
+            self.assertEqual(os.listdir(directory), ['Demo102_0.bfevtm'])
+
+    @unittest.skipIf(os.name != 'posix', 'requires POSIX permissions')
+    def test_mode(self) -> None:
+        flow = EventFlow()
+        flow.flowchart = synth.generate_flowchart(10)
+        old_umask = os.umask(0o077)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'Flow.bfevfl')
+                self.assertTrue(flow.write_file(path))
+                self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+
+                # Existing permissions are kept even if the umask would not allow them.
+                os.chmod(path, 0o644)
+                self.assertTrue(flow.write_file(path))
+                self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o644)
+        finally:
+            os.umask(old_umask)
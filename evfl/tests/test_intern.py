@@ -0,0 +1,53 @@
+import io
+import os
+import pickle
+import unittest
+
+from evfl.common import ActorIdentifier, InternTable
+from evfl.evfl import EventFlow
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+_FILES = ['Npc_HatenoVillage017.bfevfl', 'Npc_SouthHateru007.bfevfl', 'Demo102_0.bfevtm', 'Demo103_0.bfevtm']
+
+def _read(name: str, intern_table: InternTable) -> EventFlow:
+    with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+        flow = EventFlow()
+        flow.read(f.read(), intern_table)
+    return flow
+
+def _actors(flow: EventFlow) -> list:
+    return flow.flowchart.actors if flow.flowchart else flow.timeline.actors  # type: ignore
+
+class InternTableTest(unittest.TestCase):
+    def test_shared(self) -> None:
+        table = InternTable()
+        flows = [_read(name, table) for name in _FILES]
+        identifiers = dict()
+        strings = dict()
+        for flow in flows:
+            for actor in _actors(flow):
+                self.assertIs(identifiers.setdefault(actor.identifier, actor.identifier), actor.identifier)
+                for holder in actor.actions:
+                    self.assertIs(strings.setdefault(holder.v, holder.v), holder.v)
+        self.assertLess(len(identifiers), sum(len(_actors(flow)) for flow in flows))
+
+    def test_roundtrip(self) -> None:
+        table = InternTable()
+        for name in _FILES:
+            with self.subTest(file=name):
+                with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+                    data = f.read()
+                flow = _read(name, table)
+                stream = io.BytesIO()
+                flow.write(stream)
+                self.assertEqual(data, stream.getbuffer())
+
+    def test_identifier_hash(self) -> None:
+        identifier = ActorIdentifier('Npc', 'Sub')
+        self.assertEqual(hash(identifier), hash(ActorIdentifier('Npc', 'Sub')))
+        identifier.name = 'Other'
+        self.assertEqual(hash(identifier), hash(ActorIdentifier('Other', 'Sub')))
+        identifier.sub_name = ''
+        self.assertEqual(identifier, ActorIdentifier('Other'))
+        self.assertEqual(hash(identifier), hash(ActorIdentifier('Other')))
+        self.assertEqual(pickle.loads(pickle.dumps(identifier)), identifier)
@@ -0,0 +1,53 @@
+import os
+import random
+import unittest
+
+from evfl.evfl import EventFlow
+from evfl.interval_tree import IntervalTree, PointIndex
+
+class IntervalTreeBruteForceTest(unittest.TestCase):
+    """Compares query results against a linear scan on random intervals."""
+    def test(self) -> None:
+        rng = random.Random(1234)
+        intervals = []
+        for i in range(2000):
+            start = float(rng.randrange(0, 1000))
+            intervals.append((start, start + rng.choice([0, 1, 5, 50, 300]), i))
+        tree = IntervalTree(intervals)
+
+        for i in range(300):
+            t0 = rng.uniform(-10, 1400)
+            t1 = t0 + rng.choice([0, 1, 10, 100])
+            expected_at = sorted(v for s, e, v in intervals if s <= t0 < e)
+            expected_between = sorted(v for s, e, v in intervals if s < e and s < t1 and e > t0 and t0 < t1)
+            self.assertEqual(sorted(tree.at(t0)), expected_at)
+            self.assertEqual(sorted(tree.between(t0, t1)), expected_between)
+            # Endpoints must be handled exactly.
+            point = float(rng.randrange(0, 1000))
+            self.assertEqual(sorted(tree.at(point)), sorted(v for s, e, v in intervals if s <= point < e))
+
+class PointIndexTest(unittest.TestCase):
+    def test(self) -> None:
+        index = PointIndex([(5.0, 'b'), (1.0, 'a'), (5.0, 'c'), (9.0, 'd')])
+        self.assertEqual(index.between(1.0, 5.0), ['a'])
+        self.assertEqual(index.between(1.0, 5.5), ['a', 'b', 'c'])
+        self.assertEqual(index.between(10.0, 20.0), [])
+        self.assertEqual(index.last_at_or_before(4.0), 'a')
+        self.assertEqual(index.last_at_or_before(5.0), 'c')
+        self.assertIsNone(index.last_at_or_before(0.0))
+
+class TimelineIndexTest(unittest.TestCase):
+    def test(self) -> None:
+        path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', 'Demo149_1.bfevtm')
+        flow = EventFlow()
+        with open(path, 'rb') as f:
+            flow.read(f.read())
+        timeline = flow.timeline
+        assert timeline
+        index = timeline.index()
+        for t in range(0, int(timeline.duration), 97):
+            expected = [c for c in timeline.clips if c.start_time <= t < c.start_time + c.duration]
+            self.assertEqual(sorted(map(id, index.clips_at(t))), sorted(map(id, expected)))
+            expected_triggers = [tr for tr in timeline.triggers if t <= tr.get_trigger_time() < t + 97]
+            self.assertEqual(index.triggers_between(t, t + 97), expected_triggers)
+        self.assertIs(index.cut_at(timeline.duration), max(timeline.cuts, key=lambda c: c.start_time))
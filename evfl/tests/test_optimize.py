@@ -0,0 +1,245 @@
+import glob
+import io
+import os
+import typing
+import unittest
+
+from evfl import synth
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier, StringHolder
+from evfl.container import Container
+from evfl.entry_point import EntryPoint
+from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+from evfl.evfl import EventFlow
+from evfl.flowchart import Flowchart
+from evfl.hashing import FlowchartHashes
+from evfl.optimize import PruneResult, merge_duplicate_events, prune_unused
+from evfl.util import make_index, make_rindex
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+def _action_event(name: str, actor: Actor, action: StringHolder, nxt: typing.Optional[Event] = None,
+                  frames: typing.Optional[int] = None) -> Event:
+    event = Event()
+    event.name = name
+    event.data = ActionEvent()
+    event.data.actor = make_rindex(actor)
+    event.data.actor_action = make_rindex(action)
+    event.data.nxt = make_index(nxt)
+    if frames is not None:
+        event.data.params = Container()
+        event.data.params.data['Frame'] = frames
+    return event
+
+def _make_flowchart() -> typing.Tuple[Flowchart, Actor]:
+    flowchart = Flowchart()
+    flowchart.name = 'Test'
+    actor = Actor()
+    actor.identifier = ActorIdentifier('EventSystemActor')
+    actor.actions = [StringHolder('Demo_Talk'), StringHolder('WaitFrame')]
+    flowchart.actors.append(actor)
+    return flowchart, actor
+
+def _entry_digests(flowchart: Flowchart) -> typing.List[bytes]:
+    hashes = FlowchartHashes(flowchart)
+    return [hashes.subgraph(ep.main_event.v) for ep in flowchart.entry_points if ep.main_event.v]
+
+class MergeDuplicateEventsTest(unittest.TestCase):
+    def test_terminal_events(self) -> None:
+        flowchart, actor = _make_flowchart()
+        talk, wait = actor.actions
+        wait0 = _action_event('Wait0', actor, wait, frames=10)
+        wait1 = _action_event('Wait1', actor, wait, frames=10)
+        wait2 = _action_event('Wait2', actor, wait, frames=20)
+        talk0 = _action_event('Talk0', actor, talk, wait0)
+        talk1 = _action_event('Talk1', actor, talk, wait1)
+        talk2 = _action_event('Talk2', actor, talk, wait2)
+        flowchart.events = [talk0, wait0, talk1, wait1, talk2, wait2]
+        for i, event in enumerate((talk0, talk1, talk2)):
+            entry_point = EntryPoint(f'Entry{i}')
+            entry_point.main_event = make_index(event)
+            flowchart.entry_points.append(entry_point)
+
+        # Wait1 is merged into Wait0, which makes Talk1 equivalent to Talk0.
+        self.assertEqual(merge_duplicate_events(flowchart), 2)
+        self.assertEqual([e.name for e in flowchart.events], ['Talk0', 'Wait0', 'Talk2', 'Wait2'])
+        self.assertIs(flowchart.entry_points[1].main_event.v, talk0)
+        self.assertEqual(flowchart.validate(), [])
+        self.assertEqual(merge_duplicate_events(flowchart), 0)
+
+    def test_cycle(self) -> None:
+        flowchart, actor = _make_flowchart()
+        wait = actor.actions[1]
+        a = _action_event('A', actor, wait)
+        b = _action_event('B', actor, wait, a)
+        a.data.nxt = make_index(b)
+        flowchart.events = [a, b]
+        self.assertEqual(merge_duplicate_events(flowchart), 1)
+        self.assertIs(a.data.nxt.v, a)
+
+    def test_across_cycles(self) -> None:
+        flowchart, actor = _make_flowchart()
+        talk, wait = actor.actions
+
+        def loop(names: str, actions) -> typing.List[Event]:
+            events = [_action_event(name, actor, action) for name, action in zip(names, actions)]
+            for event, nxt in zip(events, events[1:] + events[:1]):
+                event.data.nxt = make_index(nxt)
+            return events
+
+        p, q = loop('PQ', [talk, wait])
+        r, s = loop('RS', [talk, wait])
+        # Not part of a cycle, but equivalent to P.
+        t = _action_event('T', actor, talk, q)
+        u, v = loop('UV', [wait, wait])
+        w = _action_event('W', actor, wait, v)
+        flowchart.events = [p, q, r, s, t, u, v, w]
+        hashes = FlowchartHashes(flowchart)
+        self.assertEqual(hashes.subgraph(p), hashes.subgraph(r))
+        self.assertEqual(hashes.subgraph(p), hashes.subgraph(t))
+        self.assertEqual(hashes.subgraph(u), hashes.subgraph(w))
+
+        self.assertEqual(merge_duplicate_events(flowchart), 5)
+        self.assertEqual([e.name for e in flowchart.events], ['P', 'Q', 'U'])
+        self.assertIs(q.data.nxt.v, p)
+        self.assertIs(u.data.nxt.v, u)
+
+    def test_large_cycle(self) -> None:
+        # Refinement used to take one round per event here.
+        flowchart, actor = _make_flowchart()
+        talk, wait = actor.actions
+        num_events = 4000
+        events = [_action_event(f'Event{i}', actor, talk if i == 0 else wait) for i in range(num_events)]
+        for i, event in enumerate(events):
+            event.data.nxt = make_index(events[(i + 1) % num_events])
+        flowchart.events = events
+        self.assertEqual(merge_duplicate_events(flowchart), 0)
+
+        # A cycle that repeats a three-event pattern collapses into three events.
+        events = [_action_event(f'Event{i}', actor, talk if i % 3 == 0 else wait) for i in range(3 * num_events)]
+        for i, event in enumerate(events):
+            event.data.nxt = make_index(events[(i + 1) % len(events)])
+        flowchart.events = events
+        self.assertEqual(merge_duplicate_events(flowchart), 3 * num_events - 3)
+        self.assertEqual([e.name for e in flowchart.events], ['Event0', 'Event1', 'Event2'])
+        self.assertIs(events[2].data.nxt.v, events[0])
+
+    def test_fork_join(self) -> None:
+        flowchart, actor = _make_flowchart()
+        wait = actor.actions[1]
+        events = []
+        for i in range(2):
+            join = Event()
+            join.name = f'Join{i}'
+            join.data = JoinEvent()
+            branch = _action_event(f'Branch{i}', actor, wait, join)
+            fork = Event()
+            fork.name = f'Fork{i}'
+            fork.data = ForkEvent()
+            fork.data.forks = [make_rindex(branch)]
+            fork.data.join = make_rindex(join)
+            events += [fork, branch, join]
+        flowchart.events = events
+        self.assertEqual(merge_duplicate_events(flowchart), 0)
+
+    def test_corpus(self) -> None:
+        for path in sorted(glob.glob(os.path.join(_ORIGINAL_DIR, '*.bfevfl'))):
+            with self.subTest(path=os.path.basename(path)):
+                flow = EventFlow()
+                with open(path, 'rb') as f:
+                    flow.read(f.read())
+                flowchart = flow.flowchart
+                before = _entry_digests(flowchart)
+                num_events = len(flowchart.events)
+                removed = merge_duplicate_events(flowchart)
+                self.assertEqual(len(flowchart.events), num_events - removed)
+                self.assertEqual(_entry_digests(flowchart), before)
+                self.assertEqual(flowchart.validate(), [])
+                for entry_point in flowchart.entry_points:
+                    for i in entry_point._sub_flow_event_indices:
+                        self.assertIsInstance(flowchart.events[i].data, SubFlowEvent)
+                stream = io.BytesIO()
+                flow.write(stream)
+                EventFlow().read(stream.getvalue())
+
+    def test_synthetic(self) -> None:
+        flowchart = synth.generate_flowchart(2000, num_entry_points=20, fork_ratio=0.05)
+        before = _entry_digests(flowchart)
+        merge_duplicate_events(flowchart)
+        self.assertEqual(_entry_digests(flowchart), before)
+        self.assertEqual(flowchart.validate(), [])
+
+class PruneUnusedTest(unittest.TestCase):
+    def test_flowchart(self) -> None:
+        flowchart, actor = _make_flowchart()
+        talk = actor.actions[0]
+        actor.queries = [StringHolder('CheckFlag'), StringHolder('GeneralChoice2')]
+        unused_actor = Actor()
+        unused_actor.identifier = ActorIdentifier('Npc_Unused')
+        unused_actor.actions = [StringHolder('Demo_Idle')]
+        flowchart.actors.append(unused_actor)
+
+        switch = Event()
+        switch.name = 'Switch'
+        switch.data = SwitchEvent()
+        switch.data.actor = make_rindex(actor)
+        switch.data.actor_query = make_rindex(actor.queries[1])
+        flowchart.events = [_action_event('Talk', actor, talk), switch]
+
+        self.assertEqual(prune_unused(flowchart), PruneResult(actors=1, actions=1, queries=1))
+        self.assertEqual(flowchart.actors, [actor])
+        self.assertEqual([a.v for a in actor.actions], ['Demo_Talk'])
+        self.assertEqual([q.v for q in actor.queries], ['GeneralChoice2'])
+        self.assertEqual(flowchart.validate(), [])
+        self.assertEqual(prune_unused(flowchart), PruneResult(0, 0, 0))
+
+        flowchart.actors.append(unused_actor)
+        self.assertEqual(prune_unused(flowchart, remove_actors=False), PruneResult(0, 1, 0))
+        self.assertIs(flowchart.actors[1], unused_actor)
+        self.assertEqual(unused_actor.actions, [])
+
+    def test_referenced_actors(self) -> None:
+        flowchart, actor = _make_flowchart()
+        named_actor = Actor()
+        named_actor.identifier = ActorIdentifier('Npc_Named', 'Sub')
+        named_actor.actions = [StringHolder('Demo_Idle')]
+        bound_actor = Actor()
+        bound_actor.identifier = ActorIdentifier('Npc_Bound')
+        bound_actor.argument_name = 'Target'
+        unused_actor = Actor()
+        unused_actor.identifier = ActorIdentifier('Npc_Named')
+        flowchart.actors += [named_actor, bound_actor, unused_actor]
+
+        event = _action_event('Talk', actor, actor.actions[0])
+        event.data.params = Container()
+        event.data.params.data['Target'] = ActorIdentifier('Npc_Named', 'Sub')
+        flowchart.events = [event]
+
+        self.assertEqual(prune_unused(flowchart), PruneResult(actors=1, actions=2, queries=0))
+        self.assertEqual(flowchart.actors, [actor, named_actor, bound_actor])
+        self.assertEqual(named_actor.actions, [])
+        self.assertEqual(flowchart.validate(), [])
+
+    def test_corpus(self) -> None:
+        for path in sorted(glob.glob(os.path.join(_ORIGINAL_DIR, '*.bfev*'))):
+            with self.subTest(path=os.path.basename(path)):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                flow = EventFlow()
+                flow.read(data)
+                before = _entry_digests(flow.flowchart) if flow.flowchart else None
+
+                stream = io.BytesIO()
+                flow.write(stream, prune=True)
+                self.assertLessEqual(len(stream.getbuffer()), len(data))
+                self.assertEqual(flow.serialized_size(prune=True), len(stream.getbuffer()))
+                # The flow itself is left untouched.
+                unpruned = io.BytesIO()
+                flow.write(unpruned)
+                self.assertEqual(unpruned.getbuffer(), data)
+
+                pruned = EventFlow()
+                pruned.read(stream.getvalue())
+                self.assertEqual(pruned.validate(), [])
+                if before is not None:
+                    self.assertEqual(_entry_digests(pruned.flowchart), before)
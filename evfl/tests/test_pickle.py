@@ -0,0 +1,67 @@
+import io
+import os
+import pickle
+import unittest
+
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier, StringHolder
+from evfl.event import Event, ActionEvent
+from evfl.evfl import EventFlow
+from evfl.flowchart import Flowchart
+from evfl.util import make_index, make_rindex
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+class PickleRoundTripTest(unittest.TestCase):
+    def test(self) -> None:
+        for name in sorted(os.listdir(_ORIGINAL_DIR)):
+            with self.subTest(file=name):
+                with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+                    data = f.read()
+                flow = EventFlow()
+                flow.read(data)
+                flow = pickle.loads(pickle.dumps(flow, pickle.HIGHEST_PROTOCOL))
+                stream = io.BytesIO()
+                flow.write(stream)
+                self.assertEqual(data, stream.getbuffer())
+
+class PickleLongChainTest(unittest.TestCase):
+    """Event chains must not be pickled recursively."""
+    def test(self) -> None:
+        flowchart = Flowchart()
+        actor = Actor()
+        actor.identifier = ActorIdentifier('EventSystemActor')
+        actor.actions = [StringHolder('Demo_WaitFrame')]
+        flowchart.actors.append(actor)
+        nxt = None
+        for i in range(20000):
+            event = Event()
+            event.name = f'Event{i}'
+            event.data = ActionEvent()
+            event.data.actor = make_rindex(actor)
+            event.data.actor_action = make_rindex(actor.actions[0])
+            event.data.nxt = make_index(nxt)
+            flowchart.events.append(event)
+            nxt = event
+
+        copy = pickle.loads(pickle.dumps(flowchart, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(len(copy.events), 20000)
+        self.assertIs(copy.events[1].data.nxt.v, copy.events[0])
+        self.assertIs(copy.events[5].data.actor_action.v, copy.actors[0].actions[0])
+        self.assertIsNone(copy.events[0].data.nxt.v)
+
+class PickleDanglingReferenceTest(unittest.TestCase):
+    """References to objects that are not part of the flowchart are kept as objects."""
+    def test(self) -> None:
+        flowchart = Flowchart()
+        outside = Event()
+        outside.name = 'Outside'
+        outside.data = ActionEvent()
+        event = Event()
+        event.name = 'Inside'
+        event.data = ActionEvent()
+        event.data.nxt = make_index(outside)
+        flowchart.events.append(event)
+
+        copy = pickle.loads(pickle.dumps(flowchart))
+        self.assertEqual(copy.events[0].data.nxt.v.name, 'Outside')
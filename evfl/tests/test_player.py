@@ -0,0 +1,95 @@
+import os
+import typing
+import unittest
+
+from evfl.actor import Actor
+from evfl.common import StringHolder
+from evfl.enums import TimelineState
+from evfl.evfl import EventFlow
+from evfl.player import PlaybackEvent, PlaybackEventType, TimelinePlayer
+from evfl.timeline import Clip, Timeline
+from evfl.util import make_rindex
+
+def _read_timeline(name: str) -> Timeline:
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', name)
+    flow = EventFlow()
+    with open(path, 'rb') as f:
+        flow.read(f.read())
+    assert flow.timeline
+    return flow.timeline
+
+class TimelinePlayerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.timeline = _read_timeline('Demo102_0.bfevtm')
+        self.player = TimelinePlayer(self.timeline)
+        self.events: typing.List[PlaybackEvent] = []
+        self.player.add_callback(self.events.append)
+
+    def test_run(self) -> None:
+        self.player.play()
+        count = self.player.run()
+        self.assertEqual(count, 2 * len(self.timeline.clips) + len(self.timeline.oneshots) + len(self.timeline.cuts))
+        self.assertEqual(self.events, sorted(self.events, key=lambda e: (e.time, e.type)))
+        self.assertEqual(self.player.state, TimelineState.kStop)
+
+    def test_steps_match_run(self) -> None:
+        self.player.play()
+        while self.player.state == TimelineState.kPlaying:
+            self.player.advance(1.0 / 30.0 * 17)
+        stepped = list(self.events)
+
+        self.events.clear()
+        self.player.play()
+        self.player.run()
+        self.assertEqual(stepped, self.events)
+
+    def test_pause_and_seek(self) -> None:
+        self.player.play()
+        self.player.advance(100.0)
+        self.player.pause()
+        self.assertEqual(self.player.advance(100.0), 0)
+        self.player.seek(1000.0)
+        self.assertEqual(self.player.state, TimelineState.kPause)
+        self.events.clear()
+        self.player.resume()
+        self.player.run()
+        self.assertTrue(all(e.time >= 1000.0 for e in self.events))
+        self.assertEqual(len(self.events), sum(1 for e in self.player._events if e.time >= 1000.0))
+
+    def test_actor_callbacks(self) -> None:
+        actor = self.timeline.actors[1]
+        actor_events: typing.List[PlaybackEvent] = []
+        self.player.add_callback(actor_events.append, actor)
+        self.player.play()
+        self.player.run()
+        self.assertEqual(actor_events, [e for e in self.events if e.actor is actor])
+        self.assertEqual(sum(1 for e in actor_events if e.type == PlaybackEventType.kClipEnter),
+                         sum(1 for c in self.timeline.clips if c.actor.v is actor))
+
+    def test_active_clips(self) -> None:
+        self.player.seek(500.0)
+        self.assertEqual(sorted(map(id, self.player.active_clips())),
+                         sorted(id(c) for c in self.timeline.clips if c.start_time <= 500.0 < c.start_time + c.duration))
+
+    def test_zero_duration_clip(self) -> None:
+        timeline = Timeline()
+        actor = Actor()
+        actor.actions = [StringHolder('Move')]
+        timeline.actors = [actor]
+        for start_time, duration in [(0.0, 5.0), (5.0, 0.0)]:
+            clip = Clip()
+            clip.start_time = start_time
+            clip.duration = duration
+            clip.actor = make_rindex(actor)
+            clip.actor_action = make_rindex(actor.actions[0])
+            timeline.clips.append(clip)
+        events: typing.List[PlaybackEvent] = []
+        player = TimelinePlayer(timeline)
+        player.add_callback(events.append)
+        player.play()
+        player.run()
+        a, b = timeline.clips
+        self.assertEqual([(e.item, e.type) for e in events], [
+            (a, PlaybackEventType.kClipEnter), (a, PlaybackEventType.kClipLeave),
+            (b, PlaybackEventType.kClipEnter), (b, PlaybackEventType.kClipLeave),
+        ])
@@ -0,0 +1,74 @@
+import io
+import os
+import struct
+import unittest
+
+from evfl import profiling, util
+from evfl.evfl import EventFlow
+from evfl.util import ReadStream, WriteStream
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+def _read_file(name: str) -> bytes:
+    with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+        return f.read()
+
+class ProfileTest(unittest.TestCase):
+    def test_read_flowchart(self) -> None:
+        data = _read_file('Animal_Forest.bfevfl')
+        with profiling.profile() as report:
+            flow = EventFlow()
+            flow.read(data)
+        assert flow.flowchart
+        sections = report.sections
+        self.assertEqual(sections['header'].count, 1)
+        self.assertEqual(sections['flowchart'].count, 1)
+        self.assertEqual(sections['actors'].count, len(flow.flowchart.actors))
+        self.assertEqual(sections['events'].count, len(flow.flowchart.events))
+        self.assertEqual(sections['entry_points'].count, len(flow.flowchart.entry_points))
+        self.assertEqual(sections['timeline'].count, 0)
+        self.assertGreater(sections['containers'].count, 0)
+        self.assertGreater(sections['dics'].count, 0)
+        self.assertGreater(sections['string_pool'].count, 0)
+        self.assertTrue(0 < report.bytes_read <= len(data))
+        self.assertEqual(report.bytes_written, 0)
+        self.assertGreater(report.seeks, 0)
+        self.assertGreater(report.struct_calls, 0)
+        self.assertLessEqual(sum(s.time for s in sections.values()), report.total_time)
+
+    def test_write_timeline(self) -> None:
+        flow = EventFlow()
+        flow.read(_read_file('Demo102_0.bfevtm'))
+        assert flow.timeline
+        stream = io.BytesIO()
+        with profiling.profile() as report:
+            flow.write(stream)
+        sections = report.sections
+        self.assertEqual(sections['timeline'].count, 1)
+        self.assertEqual(sections['actors'].count, len(flow.timeline.actors))
+        self.assertGreaterEqual(sections['timeline_structures'].count, len(flow.timeline.clips) + len(flow.timeline.triggers))
+        self.assertEqual(sections['string_pool'].count, 1)
+        self.assertEqual(sections['relocation_table'].count, 1)
+        self.assertEqual(sections['events'].count, 0)
+        # Placeholders are written twice.
+        self.assertGreater(report.bytes_written, len(stream.getvalue()))
+        self.assertEqual(report.bytes_read, 0)
+        self.assertIn('relocation_table', report.format())
+        self.assertEqual(report.to_dict()['sections']['timeline']['count'], 1)
+
+    def test_restore(self) -> None:
+        read = ReadStream.read
+        write = WriteStream.write
+        with self.assertRaises(KeyError):
+            with profiling.profile():
+                self.assertIsNot(util.struct, struct)
+                with self.assertRaises(RuntimeError):
+                    with profiling.profile():
+                        pass
+                raise KeyError()
+        self.assertIs(util.struct, struct)
+        self.assertIs(ReadStream.read, read)
+        self.assertIs(WriteStream.write, write)
+        self.assertNotIn('read_string_ref', vars(WriteStream))
+        with profiling.profile():
+            pass
@@ -0,0 +1,61 @@
+import io
+import unittest
+
+from evfl import synth, text
+from evfl.event import ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+from evfl.evfl import EventFlow
+
+def _roundtrip(flow: EventFlow) -> bool:
+    stream = io.BytesIO()
+    flow.write(stream)
+    data = stream.getvalue()
+    copy = EventFlow()
+    copy.read(data)
+    stream = io.BytesIO()
+    copy.write(stream)
+    return stream.getvalue() == data
+
+class GenerateFlowchartTest(unittest.TestCase):
+    def test(self) -> None:
+        flowchart = synth.generate_flowchart(3000, num_entry_points=7, switch_ratio=0.2, fork_ratio=0.1,
+                                             max_fork_depth=3, sub_flow_ratio=0.1, param_density=3)
+        self.assertEqual(len(flowchart.events), 3000)
+        self.assertEqual(len(flowchart.entry_points), 7)
+        types = {type(event.data) for event in flowchart.events}
+        self.assertEqual(types, {ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent})
+        for event in flowchart.events:
+            if isinstance(event.data, SwitchEvent):
+                self.assertEqual(len(event.data.cases), 3)
+
+        flow = EventFlow()
+        flow.name = flowchart.name
+        flow.flowchart = flowchart
+        self.assertTrue(_roundtrip(flow))
+
+    def test_deterministic(self) -> None:
+        def dump(seed: int) -> str:
+            flow = EventFlow()
+            flow.flowchart = synth.generate_flowchart(500, seed=seed)
+            return text.dumps(flow)
+        self.assertEqual(dump(1), dump(1))
+        self.assertNotEqual(dump(1), dump(2))
+
+    def test_limits(self) -> None:
+        self.assertEqual(len(synth.generate_flowchart(synth.MAX_EVENTS, num_entry_points=50).events), synth.MAX_EVENTS)
+        with self.assertRaises(ValueError):
+            synth.generate_flowchart(synth.MAX_EVENTS + 1)
+
+class GenerateTimelineTest(unittest.TestCase):
+    def test(self) -> None:
+        timeline = synth.generate_timeline(2000, num_actors=4, overlap=3.0, num_oneshots=50, num_cuts=5)
+        self.assertEqual(len(timeline.clips), 2000)
+        self.assertEqual(len(timeline.triggers), 4000)
+        # Clips start every time unit, so the overlap is the total duration per time unit.
+        average_overlap = sum(clip.duration for clip in timeline.clips) / len(timeline.clips)
+        self.assertAlmostEqual(average_overlap, 3.0, delta=0.1)
+        self.assertTrue(all(actor.concurrent_clips > 1 for actor in timeline.actors))
+
+        flow = EventFlow()
+        flow.name = timeline.name
+        flow.timeline = timeline
+        self.assertTrue(_roundtrip(flow))
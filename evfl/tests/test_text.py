@@ -0,0 +1,83 @@
+import array
+import io
+import os
+import unittest
+
+from evfl import text
+from evfl.common import ActorIdentifier, Argument, BoolArray, StringArray
+from evfl.evfl import EventFlow
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+def _read_file(name: str) -> bytes:
+    with open(os.path.join(_ORIGINAL_DIR, name), 'rb') as f:
+        return f.read()
+
+class TextRoundTripTest(unittest.TestCase):
+    def test(self) -> None:
+        for name in sorted(os.listdir(_ORIGINAL_DIR)):
+            with self.subTest(file=name):
+                data = _read_file(name)
+                flow = EventFlow()
+                flow.read(data)
+                encoded = text.dumps(flow)
+                flow = text.load(io.StringIO(encoded))
+                self.assertEqual(text.dumps(flow), encoded)
+                stream = io.BytesIO()
+                flow.write(stream)
+                self.assertEqual(data, stream.getbuffer())
+
+class TextContainerTypesTest(unittest.TestCase):
+    def test(self) -> None:
+        flow = EventFlow()
+        flow.read(_read_file('Common.bfevfl'))
+        params = flow.flowchart.actors[0].params
+        params.data['argument'] = Argument('Arg_Actor')
+        params.data['identifier'] = ActorIdentifier('Npc', 'Sub')
+        params.data['floats'] = [1.0, 2.5]
+        params.data['ints'] = [1, 2]
+        params.data['strings'] = ['a', 'b']
+
+        data = text.loads(text.dumps(flow)).flowchart.actors[0].params.data
+        self.assertIs(type(data['argument']), Argument)
+        self.assertEqual(data['argument'], 'Arg_Actor')
+        self.assertEqual(data['identifier'], ActorIdentifier('Npc', 'Sub'))
+        self.assertEqual([type(v) for v in data['floats']], [float, float])
+        self.assertEqual([type(v) for v in data['ints']], [int, int])
+        self.assertEqual(list(data.keys()), list(params.data.keys()))
+
+    def test_arrays(self) -> None:
+        flow = EventFlow()
+        flow.read(_read_file('Common.bfevfl'))
+        params = flow.flowchart.actors[0].params
+        params.data['int_array'] = array.array('i', [1, -2])
+        params.data['float_array'] = array.array('f', [0.1, -0.0])
+        params.data['empty_int_array'] = array.array('i')
+        params.data['empty_float_array'] = array.array('f')
+        params.data['bool_array'] = BoolArray([True, False])
+        params.data['empty_bool_array'] = BoolArray()
+        params.data['empty_string_array'] = StringArray()
+        stream = io.BytesIO()
+        flow.write(stream)
+
+        loaded = text.loads(text.dumps(flow))
+        data = loaded.flowchart.actors[0].params.data
+        for key in ('int_array', 'float_array', 'empty_int_array', 'empty_float_array'):
+            self.assertIs(type(data[key]), array.array)
+            self.assertEqual(data[key].typecode, params.data[key].typecode)
+        self.assertEqual(data['float_array'].tobytes(), params.data['float_array'].tobytes())
+        for key in ('bool_array', 'empty_bool_array', 'empty_string_array'):
+            self.assertIs(type(data[key]), type(params.data[key]))
+            self.assertEqual(data[key], params.data[key])
+        loaded_stream = io.BytesIO()
+        loaded.write(loaded_stream)
+        self.assertEqual(loaded_stream.getbuffer(), stream.getbuffer())
+
+class TextErrorTest(unittest.TestCase):
+    def test_missing_header(self) -> None:
+        with self.assertRaises(ValueError):
+            text.loads('{"type":"flowchart","name":"x"}\n')
+
+    def test_unknown_record(self) -> None:
+        with self.assertRaisesRegex(ValueError, 'line 2'):
+            text.loads('{"type":"header","format":"evfl-jsonl","version":1,"name":"x"}\n{"type":"foo"}\n')
@@ -0,0 +1,102 @@
+import io
+import os
+import unittest
+
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier, StringHolder
+from evfl.evfl import EventFlow
+from evfl.timeline import Clip, Timeline, TriggerType
+from evfl.util import make_rindex
+
+def _read_flow(name: str) -> EventFlow:
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', name)
+    flow = EventFlow()
+    with open(path, 'rb') as f:
+        flow.read(f.read())
+    return flow
+
+def _make_clip(actor: Actor, start_time: float, duration: float) -> Clip:
+    clip = Clip()
+    clip.start_time = start_time
+    clip.duration = duration
+    clip.actor = make_rindex(actor)
+    clip.actor_action = make_rindex(actor.actions[0])
+    return clip
+
+class AssignConcurrentClipsTest(unittest.TestCase):
+    def test(self) -> None:
+        timeline = Timeline()
+        actor = Actor()
+        actor.identifier = ActorIdentifier('Camera')
+        actor.actions = [StringHolder('Move')]
+        idle_actor = Actor()
+        timeline.actors = [actor, idle_actor]
+        timeline.clips = [_make_clip(actor, s, d) for s, d in [
+            (0.0, 10.0), (5.0, 10.0), (10.0, 2.0), (12.0, 1.0), (20.0, 5.0),
+        ]]
+        timeline.assign_concurrent_clips()
+        self.assertEqual([c.actor_concurrent_clip for c in timeline.clips], [0, 1, 0, 0, 0])
+        self.assertEqual(actor.concurrent_clips, 2)
+        self.assertEqual(idle_actor.concurrent_clips, 1)
+
+class AssignConcurrentClipsCorpusTest(unittest.TestCase):
+    """Checks that computed slots never overlap and use as few slots as possible."""
+    def test(self) -> None:
+        for name in ['Demo102_0.bfevtm', 'Demo103_0.bfevtm', 'Demo149_1.bfevtm', 'Demo149_1_effect.bfevtm']:
+            with self.subTest(file=name):
+                timeline = _read_flow(name).timeline
+                assert timeline
+                timeline.assign_concurrent_clips()
+                for actor in timeline.actors:
+                    clips = [c for c in timeline.clips if c.actor.v is actor]
+                    max_overlap = max([sum(1 for o in clips if o.start_time <= c.start_time < o.start_time + o.duration)
+                                       for c in clips] + [1])
+                    self.assertEqual(actor.concurrent_clips, max_overlap)
+                    for a in clips:
+                        for b in clips:
+                            if a is not b and a.actor_concurrent_clip == b.actor_concurrent_clip:
+                                self.assertTrue(a.start_time + a.duration <= b.start_time or
+                                                b.start_time + b.duration <= a.start_time)
+
+    def test_write_matches_nintendo(self) -> None:
+        # Nintendo's slot assignment happens to be minimal for this file.
+        with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', 'Demo103_0.bfevtm'), 'rb') as f:
+            data = f.read()
+        flow = EventFlow()
+        flow.read(data)
+        assert flow.timeline
+        for clip in flow.timeline.clips:
+            clip.actor_concurrent_clip = 0
+        flow.timeline.auto_concurrent_clips = True
+        stream = io.BytesIO()
+        flow.write(stream)
+        self.assertEqual(data, stream.getbuffer())
+
+class GenerateTriggersTest(unittest.TestCase):
+    """Tests whether generated triggers are identical to the ones in Nintendo's files."""
+    def test(self) -> None:
+        for name in ['Demo102_0.bfevtm', 'Demo103_0.bfevtm', 'Demo103_0_effect.bfevtm',
+                     'Demo149_1.bfevtm', 'Demo149_1_effect.bfevtm']:
+            with self.subTest(file=name):
+                with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', name), 'rb') as f:
+                    data = f.read()
+                flow = EventFlow()
+                flow.read(data)
+                assert flow.timeline
+                flow.timeline.triggers = []
+                flow.timeline.auto_triggers = True
+                stream = io.BytesIO()
+                flow.write(stream)
+                self.assertEqual(data, stream.getbuffer())
+
+    def test_zero_duration(self) -> None:
+        timeline = Timeline()
+        actor = Actor()
+        actor.actions = [StringHolder('Move')]
+        timeline.actors = [actor]
+        a, b, c = timeline.clips = [_make_clip(actor, s, d) for s, d in [(0.0, 5.0), (5.0, 0.0), (5.0, 2.0)]]
+        timeline.generate_triggers()
+        self.assertEqual([(t.clip.v, t.type) for t in timeline.triggers], [
+            (a, TriggerType.ENTER), (a, TriggerType.LEAVE), (b, TriggerType.ENTER), (b, TriggerType.LEAVE),
+            (c, TriggerType.ENTER), (c, TriggerType.LEAVE),
+        ])
@@ -0,0 +1,58 @@
+import io
+import os
+import unittest
+
+try:
+    import numpy as np
+    from evfl.timeline_arrays import read_timeline_arrays
+except ImportError:
+    np = None
+
+from evfl.evfl import EventFlow
+
+_FILES = ['Demo102_0.bfevtm', 'Demo103_0.bfevtm', 'Demo103_0_effect.bfevtm',
+          'Demo149_1.bfevtm', 'Demo149_1_effect.bfevtm']
+
+def _read_file(name: str) -> bytes:
+    with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original', name), 'rb') as f:
+        return f.read()
+
+@unittest.skipIf(np is None, 'NumPy is not installed')
+class TimelineArraysTest(unittest.TestCase):
+    def test_binary_matches_objects(self) -> None:
+        for name in _FILES:
+            with self.subTest(file=name):
+                data = _read_file(name)
+                flow = EventFlow()
+                flow.read(data)
+                assert flow.timeline
+                from_objects = flow.timeline.to_arrays()
+                from_binary = read_timeline_arrays(data)
+                for a, b in zip(from_objects, from_binary):
+                    self.assertTrue(np.array_equal(a, b))
+                self.assertEqual(from_objects.triggers['time'].tolist(),
+                                 [t.get_trigger_time() for t in flow.timeline.triggers])
+
+    def test_round_trip(self) -> None:
+        for name in _FILES:
+            with self.subTest(file=name):
+                data = _read_file(name)
+                flow = EventFlow()
+                flow.read(data)
+                assert flow.timeline
+                flow.timeline.from_arrays(flow.timeline.to_arrays())
+                stream = io.BytesIO()
+                flow.write(stream)
+                self.assertEqual(data, stream.getbuffer())
+
+    def test_retime(self) -> None:
+        flow = EventFlow()
+        flow.read(_read_file('Demo149_1.bfevtm'))
+        timeline = flow.timeline
+        assert timeline
+        expected = [c.start_time * 2 + 10 if c.actor.v is timeline.actors[3] else c.start_time for c in timeline.clips]
+        arrays = timeline.to_arrays()
+        mask = arrays.clips['actor'] == 3
+        arrays.clips['start_time'][mask] = arrays.clips['start_time'][mask] * 2 + 10
+        timeline.from_arrays(arrays)
+        self.assertEqual([c.start_time for c in timeline.clips], expected)
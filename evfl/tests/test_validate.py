@@ -0,0 +1,141 @@
+import glob
+import io
+import os
+import unittest
+
+from evfl import synth
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier, StringHolder
+from evfl.container import Container
+from evfl.entry_point import EntryPoint
+from evfl.event import Event, ActionEvent, ForkEvent, SubFlowEvent, SwitchEvent
+from evfl.evfl import EventFlow
+from evfl.flowchart import Flowchart
+from evfl.timeline import Clip, Timeline
+from evfl.util import make_index, make_rindex
+
+_ORIGINAL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'original')
+
+def _action_event(name: str, actor: Actor, action: StringHolder) -> Event:
+    event = Event()
+    event.name = name
+    event.data = ActionEvent()
+    event.data.actor = make_rindex(actor)
+    event.data.actor_action = make_rindex(action)
+    return event
+
+class ValidateTest(unittest.TestCase):
+    def test_corpus(self) -> None:
+        for path in sorted(glob.glob(os.path.join(_ORIGINAL_DIR, '*'))):
+            with self.subTest(path=os.path.basename(path)):
+                flow = EventFlow()
+                with open(path, 'rb') as f:
+                    flow.read(f.read())
+                self.assertEqual(flow.validate(), [])
+
+    def test_synthetic(self) -> None:
+        flow = EventFlow()
+        flow.flowchart = synth.generate_flowchart(1000, fork_ratio=0.1)
+        self.assertEqual(flow.validate(), [])
+        flow = EventFlow()
+        flow.timeline = synth.generate_timeline(200, num_oneshots=10, num_cuts=3)
+        self.assertEqual(flow.validate(), [])
+
+    def test_empty(self) -> None:
+        self.assertEqual(len(EventFlow().validate()), 1)
+
+    def test_flowchart(self) -> None:
+        flowchart = Flowchart()
+        actor = Actor()
+        actor.identifier = ActorIdentifier('Actor')
+        actor.actions.append(StringHolder('Act'))
+        flowchart.actors.append(actor)
+        for i in range(5):
+            flowchart.events.append(_action_event(f'Event{i}', actor, actor.actions[0]))
+        entry_point = EntryPoint('Entry')
+        entry_point.main_event = make_index(flowchart.events[0])
+        flowchart.entry_points.append(entry_point)
+        flow = EventFlow()
+        flow.flowchart = flowchart
+        self.assertEqual(flow.validate(), [])
+
+        outsider = Actor()
+        outsider.identifier = ActorIdentifier('Outsider')
+        outsider.actions.append(StringHolder('Act'))
+
+        events = flowchart.events
+        events[0].data.actor_action = make_rindex(StringHolder('Missing'))
+        events[1].data.actor = make_rindex(outsider)
+        events[1].data.actor_action = make_rindex(outsider.actions[0])
+        events[2].data.nxt = make_index(_action_event('Stray', actor, actor.actions[0]))
+        events[3].data.params = Container()
+        events[3].data.params.data['Big'] = 1 << 40
+        events[3].data.params.data['Empty'] = []
+        events[3].data.params.data['Mixed'] = [1, 'a']
+
+        fork = Event()
+        fork.name = 'Fork'
+        fork.data = ForkEvent()
+        fork.data.join = make_rindex(events[4])
+        events.append(fork)
+
+        switch = Event()
+        switch.name = 'Switch'
+        switch.data = SwitchEvent()
+        switch.data.actor = make_rindex(actor)
+        switch.data.actor_query = make_rindex(StringHolder('NoQuery'))
+        switch.data.cases[-1] = make_rindex(events[0])
+        events.append(switch)
+
+        sub_flow = Event()
+        sub_flow.name = 'SubFlow'
+        sub_flow.data = SubFlowEvent()
+        events.append(sub_flow)
+
+        flowchart.entry_points.append(EntryPoint(flowchart.entry_points[0].name))
+
+        problems = flow.validate()
+        expected = [
+            "event 0 ('Event0'): actor Actor has no action 'Missing'",
+            "event 1 ('Event1'): actor Outsider is not in the flowchart",
+            "event 2 ('Event2'): next event is not in the flowchart",
+            "event 3 ('Event3'): params: 'Big': 1099511627776 does not fit in s32",
+            "event 3 ('Event3'): params: 'Empty': empty list",
+            "event 3 ('Event3'): params: 'Mixed': item 1 has type str (expected int)",
+            "event 5 ('Fork'): fork has no branches",
+            "event 5 ('Fork'): join event 'Event4' is not a join",
+            "event 6 ('Switch'): actor Actor has no query 'NoQuery'",
+            "event 6 ('Switch'): case value -1 does not fit in u32",
+            "event 7 ('SubFlow'): sub flow has no entry point name",
+            "entry point 1 ('Entry'): duplicate name",
+        ]
+        self.assertEqual(problems, ['flowchart: ' + p for p in expected])
+
+        # All problems are reported before anything is written.
+        with self.assertRaises(Exception):
+            flow.write(io.BytesIO())
+
+    def test_timeline(self) -> None:
+        timeline = Timeline()
+        actor = Actor()
+        actor.actions.append(StringHolder('Act'))
+        timeline.actors.append(actor)
+        clip = Clip()
+        clip.actor = make_rindex(actor)
+        clip.actor_action = make_rindex(StringHolder('Missing'))
+        clip.actor_concurrent_clip = 0x100
+        timeline.clips.append(clip)
+        flow = EventFlow()
+        flow.timeline = timeline
+        self.assertEqual(flow.validate(), [
+            'timeline: params must be set (use an empty Container)',
+            "timeline: clip 0: actor  has no action 'Missing'",
+            'timeline: clip 0: actor_concurrent_clip (256) does not fit in u8',
+            'timeline: expected 2 triggers (2 per clip), found 0',
+        ])
+
+        timeline.params = Container()
+        timeline.auto_concurrent_clips = True
+        timeline.auto_triggers = True
+        clip.actor_action = make_rindex(actor.actions[0])
+        self.assertEqual(flow.validate(), [])
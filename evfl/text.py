@@ -0,0 +1,388 @@
+"""Line-oriented JSON text representation of event flows.
+
+Every line is a self-contained JSON object (JSON Lines) describing one header, actor,
+event, entry point or timeline structure. References are stored as indices like in the
+binary format, so the encoder can emit records as it visits them and the decoder can
+rebuild objects one line at a time and resolve references at the end of each section,
+exactly like the binary reader does. Converting a file to text and back produces a
+byte-identical binary.
+
+Container values that JSON cannot represent natively are tagged:
+``{"Argument": "..."}``, ``{"ActorIdentifier": [name, sub_name]}``, and ``{"IntArray": [...]}``,
+``{"FloatArray": [...]}``, ``{"BoolArray": [...]}`` and ``{"StringArray": [...]}`` for arrays
+that keep their type when empty (array.array, BoolArray and StringArray).
+Plain lists are stored as JSON lists.
+"""
+import array
+import io
+import json
+import typing
+
+from evfl.actor import Actor
+from evfl.common import ActorIdentifier, Argument, BoolArray, StringArray, StringHolder
+from evfl.container import Container, ContainerDataPyTypes
+from evfl.entry_point import EntryPoint
+from evfl.event import Event, ActionEvent, SwitchEvent, ForkEvent, JoinEvent, SubFlowEvent
+from evfl.evfl import EventFlow
+from evfl.flowchart import Flowchart
+from evfl.timeline import Timeline, Clip, Oneshot, Trigger, TriggerType, Subtimeline, Cut
+from evfl.util import RequiredIndex, make_identity_index_map
+
+FORMAT = 'evfl-jsonl'
+# Version 2 added the IntArray and FloatArray tags, version 3 the BoolArray and StringArray tags.
+# Files with older versions can still be loaded.
+VERSION = 3
+
+_encode_json = json.JSONEncoder(ensure_ascii=False, check_circular=False, separators=(',', ':')).encode
+_decode_json = json.JSONDecoder().decode
+
+_FLOAT_TYPECODES = 'fd'
+
+def _encode_value(value: ContainerDataPyTypes) -> typing.Any:
+    if isinstance(value, Argument):
+        return {'Argument': str(value)}
+    if isinstance(value, ActorIdentifier):
+        return {'ActorIdentifier': [value.name, value.sub_name]}
+    if isinstance(value, array.array):
+        if value.typecode in _FLOAT_TYPECODES:
+            return {'FloatArray': value.tolist()}
+        return {'IntArray': value.tolist()}
+    if isinstance(value, BoolArray):
+        return {'BoolArray': list(value)}
+    if isinstance(value, StringArray):
+        return {'StringArray': list(value)}
+    return value
+
+def _encode_container(container: typing.Optional[Container]) -> typing.Optional[dict]:
+    if container is None:
+        return None
+    return {key: _encode_value(value) for key, value in container.data.items()}
+
+def _decode_value(value: typing.Any) -> ContainerDataPyTypes:
+    if type(value) is dict:
+        if 'Argument' in value:
+            return Argument(value['Argument'])
+        if 'ActorIdentifier' in value:
+            return ActorIdentifier(*value['ActorIdentifier'])
+        if 'IntArray' in value:
+            return array.array('i', value['IntArray'])
+        if 'FloatArray' in value:
+            return array.array('f', value['FloatArray'])
+        if 'BoolArray' in value:
+            return BoolArray(value['BoolArray'])
+        if 'StringArray' in value:
+            return StringArray(value['StringArray'])
+        raise ValueError(f'Unknown container value: {value!r}')
+    return value
+
+def _decode_container(data: typing.Optional[dict]) -> typing.Optional[Container]:
+    if data is None:
+        return None
+    container = Container()
+    container.data = {key: _decode_value(value) for key, value in data.items()}
+    return container
+
+def _ref(idx_map: typing.Dict[int, int], value: typing.Any) -> typing.Optional[int]:
+    return idx_map[id(value)] if value is not None else None
+
+def _idx(ref: typing.Optional[int]) -> int:
+    return 0xFFFF if ref is None else ref
+
+def _actor_record(actor: Actor, argument_entry_point: typing.Optional[int]) -> dict:
+    return {
+        'type': 'actor',
+        'identifier': [actor.identifier.name, actor.identifier.sub_name],
+        'argument_name': actor.argument_name,
+        'argument_entry_point': argument_entry_point,
+        'actions': [s.v for s in actor.actions],
+        'queries': [s.v for s in actor.queries],
+        'params': _encode_container(actor.params),
+        'concurrent_clips': actor.concurrent_clips,
+    }
+
+def _iter_flowchart_records(flowchart: Flowchart) -> typing.Iterator[dict]:
+    actor_to_idx = make_identity_index_map(flowchart.actors)
+    event_to_idx = make_identity_index_map(flowchart.events)
+    entry_point_to_idx = make_identity_index_map(flowchart.entry_points)
+    action_to_idx = {id(actor): make_identity_index_map(actor.actions) for actor in flowchart.actors}
+    query_to_idx = {id(actor): make_identity_index_map(actor.queries) for actor in flowchart.actors}
+
+    yield {'type': 'flowchart', 'name': flowchart.name}
+    for actor in flowchart.actors:
+        yield _actor_record(actor, _ref(entry_point_to_idx, actor.argument_entry_point.v))
+
+    for event in flowchart.events:
+        data = event.data
+        if isinstance(data, ActionEvent):
+            actor = data.actor.v
+            yield {'type': 'action', 'name': event.name, 'nxt': _ref(event_to_idx, data.nxt.v),
+                   'actor': actor_to_idx[id(actor)], 'action': action_to_idx[id(actor)][id(data.actor_action.v)],
+                   'params': _encode_container(data.params)}
+        elif isinstance(data, SwitchEvent):
+            actor = data.actor.v
+            yield {'type': 'switch', 'name': event.name,
+                   'actor': actor_to_idx[id(actor)], 'query': query_to_idx[id(actor)][id(data.actor_query.v)],
+                   'params': _encode_container(data.params),
+                   'cases': [[value, event_to_idx[id(case.v)]] for value, case in data.cases.items()]}
+        elif isinstance(data, ForkEvent):
+            yield {'type': 'fork', 'name': event.name, 'join': event_to_idx[id(data.join.v)],
+                   'forks': [event_to_idx[id(fork.v)] for fork in data.forks]}
+        elif isinstance(data, JoinEvent):
+            yield {'type': 'join', 'name': event.name, 'nxt': _ref(event_to_idx, data.nxt.v)}
+        elif isinstance(data, SubFlowEvent):
+            yield {'type': 'sub_flow', 'name': event.name, 'nxt': _ref(event_to_idx, data.nxt.v),
+                   'params': _encode_container(data.params),
+                   'flowchart': data.res_flowchart_name, 'entry_point': data.entry_point_name}
+        else:
+            raise ValueError(f'Unknown event data type: {type(data).__name__}')
+
+    for entry_point in flowchart.entry_points:
+        yield {'type': 'entry_point', 'name': entry_point.name, 'main_event': _ref(event_to_idx, entry_point.main_event.v)}
+
+def _iter_timeline_records(timeline: Timeline) -> typing.Iterator[dict]:
+    actor_to_idx = make_identity_index_map(timeline.actors)
+    clip_to_idx = make_identity_index_map(timeline.clips)
+    action_to_idx = {id(actor): make_identity_index_map(actor.actions) for actor in timeline.actors}
+
+    yield {'type': 'timeline', 'name': timeline.name, 'duration': timeline.duration,
+           'params': _encode_container(timeline.params)}
+    for actor in timeline.actors:
+        # Timelines do not resolve argument entry points, so the raw index is kept.
+        idx = actor.argument_entry_point._idx
+        yield _actor_record(actor, None if idx == 0xFFFF else idx)
+    for clip in timeline.clips:
+        actor = clip.actor.v
+        yield {'type': 'clip', 'start_time': clip.start_time, 'duration': clip.duration,
+               'actor': actor_to_idx[id(actor)], 'action': action_to_idx[id(actor)][id(clip.actor_action.v)],
+               'concurrent_clip': clip.actor_concurrent_clip, 'params': _encode_container(clip.params)}
+    for oneshot in timeline.oneshots:
+        actor = oneshot.actor.v
+        yield {'type': 'oneshot', 'time': oneshot.time,
+               'actor': actor_to_idx[id(actor)], 'action': action_to_idx[id(actor)][id(oneshot.actor_action.v)],
+               'params': _encode_container(oneshot.params)}
+    for trigger in timeline.triggers:
+        yield {'type': 'trigger', 'clip': clip_to_idx[id(trigger.clip.v)], 'trigger': int(trigger.type)}
+    for subtimeline in timeline.subtimelines:
+        yield {'type': 'subtimeline', 'name': subtimeline.name}
+    for cut in timeline.cuts:
+        yield {'type': 'cut', 'start_time': cut.start_time, 'x4': cut.x4, 'name': cut.name,
+               'params': _encode_container(cut.params)}
+
+def iter_records(flow: EventFlow) -> typing.Iterator[dict]:
+    """Yields the records of an event flow in the order they are written."""
+    yield {'type': 'header', 'format': FORMAT, 'version': VERSION, 'name': flow.name}
+    for flowchart in flow.flowcharts.values():
+        yield from _iter_flowchart_records(flowchart)
+    for timeline in flow.timelines.values():
+        yield from _iter_timeline_records(timeline)
+
+def dump(flow: EventFlow, fp: typing.TextIO) -> None:
+    """Writes an event flow to a text stream, one record per line."""
+    write = fp.write
+    for record in iter_records(flow):
+        write(_encode_json(record))
+        write('\n')
+
+def dumps(flow: EventFlow) -> str:
+    stream = io.StringIO()
+    dump(flow, stream)
+    return stream.getvalue()
+
+class _Decoder:
+    def __init__(self) -> None:
+        self.flow = EventFlow()
+        self.section: typing.Union[Flowchart, Timeline, None] = None
+        self.has_header = False
+        self.handlers: typing.Dict[str, typing.Callable[[dict], None]] = {
+            'header': self._header,
+            'flowchart': self._flowchart,
+            'timeline': self._timeline,
+            'actor': self._actor,
+            'action': self._action,
+            'switch': self._switch,
+            'fork': self._fork,
+            'join': self._join,
+            'sub_flow': self._sub_flow,
+            'entry_point': self._entry_point,
+            'clip': self._clip,
+            'oneshot': self._oneshot,
+            'trigger': self._trigger,
+            'subtimeline': self._subtimeline,
+            'cut': self._cut,
+        }
+
+    def feed(self, record: dict) -> None:
+        record_type = record.get('type')
+        handler = self.handlers.get(record_type)  # type: ignore
+        if handler is None:
+            raise ValueError(f'Unknown record type: {record_type!r}')
+        if not self.has_header and record_type != 'header':
+            raise ValueError('Missing header record')
+        handler(record)
+
+    def finish(self) -> EventFlow:
+        if not self.has_header:
+            raise ValueError('Missing header record')
+        self._end_section()
+        return self.flow
+
+    def _end_section(self) -> None:
+        if self.section is not None:
+            self.section._set_values_from_indexes()
+            self.section = None
+
+    def _flowchart_section(self) -> Flowchart:
+        if not isinstance(self.section, Flowchart):
+            raise ValueError('Flowchart record outside of a flowchart')
+        return self.section
+
+    def _timeline_section(self) -> Timeline:
+        if not isinstance(self.section, Timeline):
+            raise ValueError('Timeline record outside of a timeline')
+        return self.section
+
+    def _header(self, r: dict) -> None:
+        if self.has_header:
+            raise ValueError('Duplicate header record')
+        if r.get('format') != FORMAT or r.get('version') not in range(1, VERSION + 1):
+            raise ValueError(f'Unsupported format: {r.get("format")!r} version {r.get("version")!r}')
+        self.flow.name = r['name']
+        self.has_header = True
+
+    def _flowchart(self, r: dict) -> None:
+        if r['name'] in self.flow.flowcharts:
+            raise ValueError('Duplicate flowchart record')
+        self._end_section()
+        flowchart = Flowchart()
+        flowchart.name = r['name']
+        self.flow.flowcharts[flowchart.name] = self.section = flowchart
+
+    def _timeline(self, r: dict) -> None:
+        if r['name'] in self.flow.timelines:
+            raise ValueError('Duplicate timeline record')
+        self._end_section()
+        timeline = Timeline()
+        timeline.name = r['name']
+        timeline.duration = r['duration']
+        timeline.params = _decode_container(r['params'])
+        self.flow.timelines[timeline.name] = self.section = timeline
+
+    def _actor(self, r: dict) -> None:
+        if self.section is None:
+            raise ValueError('Actor record outside of a flowchart or timeline')
+        actor = Actor()
+        actor.identifier = ActorIdentifier(*r['identifier'])
+        actor.argument_name = r['argument_name']
+        actor.argument_entry_point._idx = _idx(r['argument_entry_point'])
+        actor.actions = [StringHolder(v) for v in r['actions']]
+        actor.queries = [StringHolder(v) for v in r['queries']]
+        actor.params = _decode_container(r['params'])
+        actor.concurrent_clips = r['concurrent_clips']
+        self.section.actors.append(actor)
+
+    def _add_event(self, r: dict, data) -> None:
+        event = Event()
+        event.name = r['name']
+        event.data = data
+        self._flowchart_section().events.append(event)
+
+    def _action(self, r: dict) -> None:
+        data = ActionEvent()
+        data.nxt._idx = _idx(r['nxt'])
+        data.actor._idx = r['actor']
+        data.actor_action._idx = r['action']
+        data.params = _decode_container(r['params'])
+        self._add_event(r, data)
+
+    def _switch(self, r: dict) -> None:
+        data = SwitchEvent()
+        data.actor._idx = r['actor']
+        data.actor_query._idx = r['query']
+        data.params = _decode_container(r['params'])
+        for value, case in r['cases']:
+            data.cases[value] = RequiredIndex(case)
+        self._add_event(r, data)
+
+    def _fork(self, r: dict) -> None:
+        data = ForkEvent()
+        data.join._idx = r['join']
+        data.forks = [RequiredIndex(fork) for fork in r['forks']]
+        self._add_event(r, data)
+
+    def _join(self, r: dict) -> None:
+        data = JoinEvent()
+        data.nxt._idx = _idx(r['nxt'])
+        self._add_event(r, data)
+
+    def _sub_flow(self, r: dict) -> None:
+        data = SubFlowEvent()
+        data.nxt._idx = _idx(r['nxt'])
+        data.params = _decode_container(r['params'])
+        data.res_flowchart_name = r['flowchart']
+        data.entry_point_name = r['entry_point']
+        self._add_event(r, data)
+
+    def _entry_point(self, r: dict) -> None:
+        entry_point = EntryPoint(r['name'])
+        entry_point.main_event._idx = _idx(r['main_event'])
+        self._flowchart_section().entry_points.append(entry_point)
+
+    def _clip(self, r: dict) -> None:
+        clip = Clip()
+        clip.start_time = r['start_time']
+        clip.duration = r['duration']
+        clip.actor._idx = r['actor']
+        clip.actor_action._idx = r['action']
+        clip.actor_concurrent_clip = r['concurrent_clip']
+        clip.params = _decode_container(r['params'])
+        self._timeline_section().clips.append(clip)
+
+    def _oneshot(self, r: dict) -> None:
+        oneshot = Oneshot()
+        oneshot.time = r['time']
+        oneshot.actor._idx = r['actor']
+        oneshot.actor_action._idx = r['action']
+        oneshot.params = _decode_container(r['params'])
+        self._timeline_section().oneshots.append(oneshot)
+
+    def _trigger(self, r: dict) -> None:
+        trigger = Trigger()
+        trigger.clip._idx = r['clip']
+        trigger.type = TriggerType(r['trigger'])
+        self._timeline_section().triggers.append(trigger)
+
+    def _subtimeline(self, r: dict) -> None:
+        subtimeline = Subtimeline()
+        subtimeline.name = r['name']
+        self._timeline_section().subtimelines.append(subtimeline)
+
+    def _cut(self, r: dict) -> None:
+        cut = Cut()
+        cut.start_time = r['start_time']
+        cut.x4 = r['x4']
+        cut.name = r['name']
+        cut.params = _decode_container(r['params'])
+        self._timeline_section().cuts.append(cut)
+
+def from_records(records: typing.Iterable[dict]) -> EventFlow:
+    """Builds an event flow from records such as the ones produced by iter_records."""
+    decoder = _Decoder()
+    for record in records:
+        decoder.feed(record)
+    return decoder.finish()
+
+def load(fp: typing.Iterable[str]) -> EventFlow:
+    """Reads an event flow from a text stream (or any iterable of lines)."""
+    decoder = _Decoder()
+    feed = decoder.feed
+    for line_number, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        try:
+            feed(_decode_json(line))
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            raise ValueError(f'line {line_number}: {e}') from e
+    return decoder.finish()
+
+def loads(s: str) -> EventFlow:
+    return load(io.StringIO(s))
@@ -1,7 +1,9 @@
 from enum import IntEnum
+import heapq
 from evfl.actor import Actor
 from evfl.container import Container
 from evfl.common import StringHolder
+from evfl.interval_tree import IntervalTree, PointIndex
 from evfl.util import *
 
 
@@ -13,7 +15,6 @@ class Clip(BinaryObject):
         "actor_action",
         "actor_concurrent_clip",
         "params",
-        "_params_offset_writer",
     ]
 
     def __init__(self) -> None:
@@ -28,7 +29,6 @@ class Clip(BinaryObject):
         # next is 1, etc.
         self.actor_concurrent_clip = 0xFF
         self.params: typing.Optional[Container] = None
-        self._params_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def __repr__(self) -> str:
         return (
@@ -56,16 +56,14 @@ class Clip(BinaryObject):
         stream.write(u16(self.actor_action._idx))
         stream.write(u8(self.actor_concurrent_clip))
         stream.write(u8(0) * 3)
-        self._params_offset_writer = stream.write_placeholder_ptr_if(bool(self.params))
+        stream.set_scratch(self, "params", stream.write_placeholder_ptr_if(bool(self.params)))
 
     def write_extra_data(self, stream: WriteStream) -> None:
-        if self._params_offset_writer and self.params:
-            self._params_offset_writer.write_current_offset(stream)
-            self.params.write(stream)
+        stream.write_object_at_placeholder(self, "params", self.params)
 
 
 class Oneshot(BinaryObject):
-    __slots__ = ["time", "actor", "actor_action", "params", "_params_offset_writer"]
+    __slots__ = ["time", "actor", "actor_action", "params"]
 
     def __init__(self) -> None:
         super().__init__()
@@ -73,7 +71,6 @@ class Oneshot(BinaryObject):
         self.actor: RequiredIndex[Actor] = RequiredIndex()
         self.actor_action: RequiredIndex[StringHolder] = RequiredIndex()
         self.params: typing.Optional[Container] = None
-        self._params_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def __repr__(self) -> str:
         return (
@@ -95,22 +92,21 @@ class Oneshot(BinaryObject):
         stream.write(u16(self.actor._idx))
         stream.write(u16(self.actor_action._idx))
         stream.write(u64(0))
-        self._params_offset_writer = stream.write_placeholder_ptr_if(bool(self.params))
+        stream.set_scratch(self, "params", stream.write_placeholder_ptr_if(bool(self.params)))
 
     def write_extra_data(self, stream: WriteStream) -> None:
-        if self._params_offset_writer and self.params:
-            self._params_offset_writer.write_current_offset(stream)
-            self.params.write(stream)
+        stream.write_object_at_placeholder(self, "params", self.params)
 
 
 class Cut(BinaryObject):
+    __slots__ = ["start_time", "x4", "name", "params"]
+
     def __init__(self) -> None:
         super().__init__()
         self.start_time = -1.0  # TODO: is this correct?
         self.x4 = 0xFFFFFFFF  # TODO: what is this?
         self.name = ""
         self.params: typing.Optional[Container] = None
-        self._params_offset_writer: typing.Optional[PlaceholderWriter] = None
 
     def __repr__(self) -> str:
         return (
@@ -130,12 +126,10 @@ class Cut(BinaryObject):
         stream.write(f32(self.start_time))
         stream.write(u32(self.x4))
         stream.write_string_ref(self.name)
-        self._params_offset_writer = stream.write_placeholder_ptr_if(bool(self.params))
+        stream.set_scratch(self, "params", stream.write_placeholder_ptr_if(bool(self.params)))
 
     def write_extra_data(self, stream: WriteStream) -> None:
-        if self._params_offset_writer and self.params:
-            self._params_offset_writer.write_current_offset(stream)
-            self.params.write(stream)
+        stream.write_object_at_placeholder(self, "params", self.params)
 
 
 class TriggerType(IntEnum):
@@ -150,7 +144,7 @@ class Trigger(BinaryObject):
     def __init__(self) -> None:
         super().__init__()
         self.clip: RequiredIndex[Clip] = RequiredIndex()
-        self.type = TriggerType(0xFF)
+        self.type = TriggerType.NONE
 
     def _do_read(self, stream: ReadStream) -> None:
         self.clip._idx = stream.read_u16()
@@ -175,6 +169,8 @@ class Trigger(BinaryObject):
 
 
 class Subtimeline(BinaryObject):
+    __slots__ = ["name"]
+
     def __init__(self) -> None:
         super().__init__()
         self.name = ""
@@ -186,7 +182,58 @@ class Subtimeline(BinaryObject):
         stream.write_string_ref(self.name)
 
 
+class TimelineIndex:
+    """Time-based lookup structure over a timeline's clips, oneshots, cuts and triggers.
+
+    Intervals are half-open: a clip is active at t if start_time <= t < start_time + duration.
+    The index is a snapshot and must be rebuilt after the timeline is modified."""
+
+    def __init__(self, timeline: "Timeline") -> None:
+        self.clips: IntervalTree[Clip] = IntervalTree(
+            (c.start_time, c.start_time + c.duration, c) for c in timeline.clips
+        )
+        self.oneshots: PointIndex[Oneshot] = PointIndex((o.time, o) for o in timeline.oneshots)
+        self.cuts: PointIndex[Cut] = PointIndex((c.start_time, c) for c in timeline.cuts)
+        self.triggers: PointIndex[Trigger] = PointIndex(
+            (t.get_trigger_time(), t) for t in timeline.triggers
+        )
+
+    def clips_at(self, t: float) -> typing.List[Clip]:
+        return self.clips.at(t)
+
+    def clips_between(self, t0: float, t1: float) -> typing.List[Clip]:
+        """Returns clips that are active at some point in [t0, t1)."""
+        return self.clips.between(t0, t1)
+
+    def oneshots_between(self, t0: float, t1: float) -> typing.List[Oneshot]:
+        return self.oneshots.between(t0, t1)
+
+    def cuts_between(self, t0: float, t1: float) -> typing.List[Cut]:
+        return self.cuts.between(t0, t1)
+
+    def cut_at(self, t: float) -> typing.Optional[Cut]:
+        """Returns the last cut that starts at or before t."""
+        return self.cuts.last_at_or_before(t)
+
+    def triggers_between(self, t0: float, t1: float) -> typing.List[Trigger]:
+        return self.triggers.between(t0, t1)
+
+
 class Timeline(BinaryObject):
+    __slots__ = [
+        "name",
+        "duration",
+        "actors",
+        "clips",
+        "oneshots",
+        "triggers",
+        "subtimelines",
+        "cuts",
+        "params",
+        "auto_concurrent_clips",
+        "auto_triggers",
+    ]
+
     def __init__(self) -> None:
         super().__init__()
         self.name = ""
@@ -198,8 +245,10 @@ class Timeline(BinaryObject):
         self.subtimelines: typing.List[Subtimeline] = []
         self.cuts: typing.List[Cut] = []
         self.params: typing.Optional[Container] = None
-
-        self._self_offset = -1
+        # If set, clip slots and actor concurrent clip counts are recomputed on write.
+        self.auto_concurrent_clips = False
+        # If set, triggers are regenerated from clips on write.
+        self.auto_triggers = False
 
     def __repr__(self) -> str:
         return (
@@ -214,6 +263,337 @@ class Timeline(BinaryObject):
             f"params={self.params})"
         )
 
+    def clone(self) -> "Timeline":
+        """Returns a structural copy of this timeline (see Flowchart.clone)."""
+        copy = Timeline()
+        copy.name = self.name
+        copy.duration = self.duration
+        copy.params = self.params.clone() if self.params else None
+        copy.auto_concurrent_clips = self.auto_concurrent_clips
+        copy.auto_triggers = self.auto_triggers
+        copy.actors = [actor.clone() for actor in self.actors]
+
+        remap: typing.Dict[int, typing.Any] = dict()
+        for old_actor, new_actor in zip(self.actors, copy.actors):
+            remap[id(old_actor)] = new_actor
+            remap.update(zip(map(id, old_actor.actions), new_actor.actions))
+
+        # Objects are allocated without calling __init__ (see Flowchart.clone).
+        new = object.__new__
+        for clip in self.clips:
+            new_clip = new(Clip)
+            new_clip.start_time = clip.start_time
+            new_clip.duration = clip.duration
+            new_clip.actor = clone_index(clip.actor, remap)
+            new_clip.actor_action = clone_index(clip.actor_action, remap)
+            new_clip.actor_concurrent_clip = clip.actor_concurrent_clip
+            new_clip.params = clip.params.clone() if clip.params else None
+            remap[id(clip)] = new_clip
+            copy.clips.append(new_clip)
+
+        for oneshot in self.oneshots:
+            new_oneshot = new(Oneshot)
+            new_oneshot.time = oneshot.time
+            new_oneshot.actor = clone_index(oneshot.actor, remap)
+            new_oneshot.actor_action = clone_index(oneshot.actor_action, remap)
+            new_oneshot.params = oneshot.params.clone() if oneshot.params else None
+            copy.oneshots.append(new_oneshot)
+
+        for trigger in self.triggers:
+            new_trigger = new(Trigger)
+            new_trigger.clip = clone_index(trigger.clip, remap)
+            new_trigger.type = trigger.type
+            copy.triggers.append(new_trigger)
+
+        for subtimeline in self.subtimelines:
+            new_subtimeline = Subtimeline()
+            new_subtimeline.name = subtimeline.name
+            copy.subtimelines.append(new_subtimeline)
+
+        for cut in self.cuts:
+            new_cut = Cut()
+            new_cut.start_time = cut.start_time
+            new_cut.x4 = cut.x4
+            new_cut.name = cut.name
+            new_cut.params = cut.params.clone() if cut.params else None
+            copy.cuts.append(new_cut)
+
+        return copy
+
+    def __getstate__(self) -> tuple:
+        """Flattens the timeline into index-based records (see Flowchart.__getstate__)."""
+        actor_to_idx = make_identity_index_map(self.actors)
+        action_to_idx = [make_identity_index_map(actor.actions) for actor in self.actors]
+        clip_to_idx = make_identity_index_map(self.clips)
+
+        def actor_refs(x) -> typing.Tuple[typing.Any, typing.Any]:
+            actor_ref = flatten_ref(actor_to_idx, getattr(x.actor, "v", None))
+            action = getattr(x.actor_action, "v", None)
+            if type(actor_ref) is not int or actor_ref == -1:
+                return (actor_ref, action)
+            return (actor_ref, flatten_ref(action_to_idx[actor_ref], action))
+
+        return (
+            self.name,
+            self.duration,
+            [actor._to_record() for actor in self.actors],
+            [
+                (c.start_time, c.duration, actor_refs(c), c.actor_concurrent_clip, c.params)
+                for c in self.clips
+            ],
+            [(o.time, actor_refs(o), o.params) for o in self.oneshots],
+            [
+                (flatten_ref(clip_to_idx, getattr(t.clip, "v", None)), t.type.value)
+                for t in self.triggers
+            ],
+            [s.name for s in self.subtimelines],
+            [(c.start_time, c.x4, c.name, c.params) for c in self.cuts],
+            self.params,
+            self.auto_concurrent_clips,
+            self.auto_triggers,
+        )
+
+    def __setstate__(self, state: tuple) -> None:
+        self.__init__()  # type: ignore
+        (
+            self.name,
+            self.duration,
+            actor_records,
+            clip_records,
+            oneshot_records,
+            trigger_records,
+            subtimeline_names,
+            cut_records,
+            self.params,
+            self.auto_concurrent_clips,
+            self.auto_triggers,
+        ) = state
+        self.actors = [Actor._from_record(record) for record in actor_records]
+
+        def set_actor(x, refs: tuple) -> None:
+            actor = unflatten_ref(self.actors, refs[0])
+            x.actor.v = actor
+            if type(refs[0]) is int and actor is not None:
+                x.actor_action.v = unflatten_ref(actor.actions, refs[1])
+            else:
+                x.actor_action.v = refs[1]
+
+        for start_time, duration, refs, slot, params in clip_records:
+            clip = Clip()
+            clip.start_time = start_time
+            clip.duration = duration
+            set_actor(clip, refs)
+            clip.actor_concurrent_clip = slot
+            clip.params = params
+            self.clips.append(clip)
+
+        for time, refs, params in oneshot_records:
+            oneshot = Oneshot()
+            oneshot.time = time
+            set_actor(oneshot, refs)
+            oneshot.params = params
+            self.oneshots.append(oneshot)
+
+        for clip_ref, trigger_type in trigger_records:
+            trigger = Trigger()
+            trigger.clip.v = unflatten_ref(self.clips, clip_ref)
+            trigger.type = TriggerType(trigger_type)
+            self.triggers.append(trigger)
+
+        for name in subtimeline_names:
+            subtimeline = Subtimeline()
+            subtimeline.name = name
+            self.subtimelines.append(subtimeline)
+
+        for start_time, x4, name, params in cut_records:
+            cut = Cut()
+            cut.start_time = start_time
+            cut.x4 = x4
+            cut.name = name
+            cut.params = params
+            self.cuts.append(cut)
+
+    def index(self) -> TimelineIndex:
+        return TimelineIndex(self)
+
+    def to_arrays(self):
+        """Returns clip, oneshot and trigger data as NumPy structured arrays (see evfl.timeline_arrays)."""
+        from evfl import timeline_arrays
+        return timeline_arrays.to_arrays(self)
+
+    def from_arrays(self, arrays) -> None:
+        """Replaces clip, oneshot and trigger data with the contents of arrays returned by to_arrays.
+
+        Existing clips and oneshots are updated in order (keeping their params);
+        new ones are created for extra rows."""
+        from evfl import timeline_arrays
+        timeline_arrays.from_arrays(self, arrays)
+
+    def validate(self) -> typing.List[str]:
+        """Checks in a single pass that the timeline can be written.
+
+        Returns a list of problems (empty if write() will succeed). Clip slots and triggers
+        are not checked if they are regenerated on write."""
+        problems: typing.List[str] = []
+        actor_ids = make_identity_index_map(self.actors)
+        clip_ids = make_identity_index_map(self.clips)
+
+        counts = [
+            ("actors", len(self.actors)),
+            ("actions", self._get_action_count()),
+            ("clips", len(self.clips)),
+            ("oneshots", len(self.oneshots)),
+            ("subtimelines", len(self.subtimelines)),
+            ("cuts", len(self.cuts)),
+        ]
+        for what, count in counts:
+            if count > 0xFFFF:
+                problems.append(f"too many {what} ({count} > {0xFFFF})")
+        if self.params is None:
+            problems.append("params must be set (use an empty Container)")
+        else:
+            problems.extend(f"params: {p}" for p in self.params.validate())
+
+        for i, actor in enumerate(self.actors):
+            where = f"actor {i} ({actor.identifier})"
+            if not self.auto_concurrent_clips and not 0 <= actor.concurrent_clips <= 0xFFFF:
+                problems.append(
+                    f"{where}: concurrent_clips ({actor.concurrent_clips}) does not fit in u16"
+                )
+            if actor.params is not None:
+                problems.extend(f"{where}: params: {p}" for p in actor.params.validate())
+
+        action_names: typing.Dict[int, typing.Set[str]] = dict()
+
+        def check_actor_ref(where: str, x: typing.Union[Clip, Oneshot]) -> None:
+            actor = getattr(x.actor, "v", None)
+            if actor is None:
+                problems.append(f"{where}: actor is not set")
+                return
+            if id(actor) not in actor_ids:
+                problems.append(f"{where}: actor {actor.identifier} is not in the timeline")
+            action = getattr(x.actor_action, "v", None)
+            if action is None:
+                problems.append(f"{where}: actor_action is not set")
+                return
+            names = action_names.get(id(actor))
+            if names is None:
+                names = action_names[id(actor)] = {a.v for a in actor.actions}
+            if action.v not in names:
+                problems.append(f"{where}: actor {actor.identifier} has no action {action.v!r}")
+
+        for i, clip in enumerate(self.clips):
+            where = f"clip {i}"
+            check_actor_ref(where, clip)
+            if not self.auto_concurrent_clips and not 0 <= clip.actor_concurrent_clip <= 0xFF:
+                problems.append(
+                    f"{where}: actor_concurrent_clip ({clip.actor_concurrent_clip}) does not fit in u8"
+                )
+            if clip.params is not None:
+                problems.extend(f"{where}: params: {p}" for p in clip.params.validate())
+
+        for i, oneshot in enumerate(self.oneshots):
+            where = f"oneshot {i}"
+            check_actor_ref(where, oneshot)
+            if oneshot.params is not None:
+                problems.extend(f"{where}: params: {p}" for p in oneshot.params.validate())
+
+        if not self.auto_triggers:
+            # The reader expects exactly two triggers per clip.
+            if len(self.triggers) != 2 * len(self.clips):
+                problems.append(
+                    f"expected {2 * len(self.clips)} triggers (2 per clip), found {len(self.triggers)}"
+                )
+            for i, trigger in enumerate(self.triggers):
+                clip = getattr(trigger.clip, "v", None)
+                if clip is None:
+                    problems.append(f"trigger {i}: clip is not set")
+                elif id(clip) not in clip_ids:
+                    problems.append(f"trigger {i}: clip is not in the timeline")
+                if not isinstance(trigger.type, TriggerType):
+                    problems.append(f"trigger {i}: invalid type {trigger.type!r}")
+
+        for i, cut in enumerate(self.cuts):
+            where = f"cut {i} ({cut.name!r})"
+            if not 0 <= cut.x4 <= 0xFFFFFFFF:
+                problems.append(f"{where}: x4 ({cut.x4}) does not fit in u32")
+            if cut.params is not None:
+                problems.extend(f"{where}: params: {p}" for p in cut.params.validate())
+
+        return problems
+
+    def assign_concurrent_clips(self) -> None:
+        """Computes Clip.actor_concurrent_clip and Actor.concurrent_clips from clip intervals.
+
+        For each actor, clips are swept in start time order and take the lowest slot that
+        is free at their start time. A clip that ends exactly when another starts frees its
+        slot for that clip. Actors without clips are given a count of 1."""
+        clips_by_actor: typing.Dict[int, typing.List[Clip]] = {id(a): [] for a in self.actors}
+        for clip in self.clips:
+            clips_by_actor.setdefault(id(clip.actor.v), []).append(clip)
+
+        for actor in self.actors:
+            clips = clips_by_actor[id(actor)]
+            clips.sort(key=lambda c: c.start_time)
+            # (end time, slot) for clips that are currently playing.
+            playing: typing.List[typing.Tuple[float, int]] = []
+            free_slots: typing.List[int] = []
+            num_slots = 0
+            for clip in clips:
+                while playing and playing[0][0] <= clip.start_time:
+                    heapq.heappush(free_slots, heapq.heappop(playing)[1])
+                if free_slots:
+                    slot = heapq.heappop(free_slots)
+                else:
+                    slot = num_slots
+                    num_slots += 1
+                    if slot >= 0xFF:
+                        raise ValueError(f"Too many concurrent clips for actor {actor.identifier}")
+                clip.actor_concurrent_clip = slot
+                heapq.heappush(playing, (clip.start_time + clip.duration, slot))
+            actor.concurrent_clips = max(num_slots, 1)
+
+    def generate_triggers(self) -> None:
+        """Replaces the trigger list with one ENTER and one LEAVE trigger per clip.
+
+        Triggers are ordered by time. When times are equal, LEAVE triggers come before
+        ENTER triggers and triggers of the same type are in clip order, like in Nintendo's files.
+        The LEAVE trigger of a zero-duration clip immediately follows its ENTER trigger instead.
+        The enter and leave streams are each sorted (linear if clips are already in order)
+        and then merged in a single pass."""
+        starts = [c.start_time for c in self.clips]
+        ends = [c.start_time + c.duration for c in self.clips]
+        # Sorting is stable, so ties keep clip order.
+        enters = sorted(range(len(self.clips)), key=starts.__getitem__)
+        leaves = sorted((i for i in range(len(self.clips)) if ends[i] != starts[i]), key=ends.__getitem__)
+
+        def make_trigger(clip_idx: int, trigger_type: TriggerType) -> Trigger:
+            trigger = Trigger()
+            trigger.clip.v = self.clips[clip_idx]
+            trigger.type = trigger_type
+            return trigger
+
+        triggers: typing.List[Trigger] = []
+
+        def enter(clip_idx: int) -> None:
+            triggers.append(make_trigger(clip_idx, TriggerType.ENTER))
+            if ends[clip_idx] == starts[clip_idx]:
+                triggers.append(make_trigger(clip_idx, TriggerType.LEAVE))
+
+        i = 0
+        j = 0
+        while i < len(enters) and j < len(leaves):
+            if ends[leaves[j]] <= starts[enters[i]]:
+                triggers.append(make_trigger(leaves[j], TriggerType.LEAVE))
+                j += 1
+            else:
+                enter(enters[i])
+                i += 1
+        for idx in enters[i:]:
+            enter(idx)
+        triggers.extend(make_trigger(idx, TriggerType.LEAVE) for idx in leaves[j:])
+        self.triggers = triggers
+
     def _do_read(self, stream: ReadStream) -> None:
         magic = stream.read_u32()
         string_pool_offset = stream.read_u32()
@@ -269,7 +649,12 @@ class Timeline(BinaryObject):
             t.clip.set_index(clip_to_idx)
 
     def _do_write(self, stream: WriteStream) -> None:
-        self.triggers.sort(key=lambda a: a.get_trigger_time())
+        if self.auto_concurrent_clips:
+            self.assign_concurrent_clips()
+        if self.auto_triggers:
+            self.generate_triggers()
+        else:
+            self.triggers.sort(key=lambda a: a.get_trigger_time())
         self._set_indexes_from_values()
 
         for actor in self.actors:
@@ -283,7 +668,8 @@ class Timeline(BinaryObject):
 
         # Header
         stream.align(8)
-        self._self_offset = stream.tell()
+        self_offset = stream.tell()
+        stream.set_scratch(self, "self_offset", self_offset)
         stream.write(b"TLIN")
         string_pool_rel_offset = stream.write_placeholder_u32()
         stream.write(u32(0))  # x8
@@ -336,7 +722,9 @@ class Timeline(BinaryObject):
                 stream.align(8)
 
         stream.align(8)
-        string_pool_rel_offset.write(stream, u32(stream.tell() - self._self_offset))
+        # Only correct if the string pool comes next: EventFlow rewrites it once the pool is placed.
+        string_pool_rel_offset.write(stream, u32(stream.tell() - self_offset))
+        stream.set_scratch(self, "string_pool_rel_offset", (string_pool_rel_offset, self_offset))
 
-    def _get_overriding_offset_to_self(self) -> int:
-        return self._self_offset
+    def _get_overriding_offset_to_self(self, stream: WriteStream) -> int:
+        return stream.get_scratch(self, "self_offset")
@@ -0,0 +1,137 @@
+"""Columnar (NumPy) views of timeline clip, oneshot and trigger data.
+
+Clip and oneshot arrays use the same memory layout as the records in bfevtm files,
+so they can be read straight from a file buffer without building any object.
+This module requires NumPy.
+"""
+import struct
+import typing
+
+import numpy as np
+
+from evfl.actor import Actor
+from evfl.common import StringHolder
+from evfl.timeline import Clip, Oneshot, Timeline, Trigger, TriggerType
+from evfl.util import make_values_to_index_map
+
+# Same layout as the on-disk records; params pointers and padding are left as unnamed gaps.
+CLIP_DTYPE = np.dtype({
+    'names': ['start_time', 'duration', 'actor', 'action', 'concurrent_clip'],
+    'formats': ['<f4', '<f4', '<u2', '<u2', 'u1'],
+    'offsets': [0x0, 0x4, 0x8, 0xa, 0xc],
+    'itemsize': 0x18,
+})
+ONESHOT_DTYPE = np.dtype({
+    'names': ['time', 'actor', 'action'],
+    'formats': ['<f4', '<u2', '<u2'],
+    'offsets': [0x0, 0x4, 0x6],
+    'itemsize': 0x18,
+})
+_TRIGGER_RECORD_DTYPE = np.dtype({
+    'names': ['clip', 'type'],
+    'formats': ['<u2', 'u1'],
+    'offsets': [0x0, 0x2],
+    'itemsize': 0x4,
+})
+# Times are computed in double precision, like Trigger.get_trigger_time.
+TRIGGER_DTYPE = np.dtype([('clip', '<u2'), ('type', 'u1'), ('time', '<f8')])
+
+class TimelineArrays(typing.NamedTuple):
+    clips: np.ndarray
+    oneshots: np.ndarray
+    triggers: np.ndarray
+
+def _make_triggers(clips: np.ndarray, records: np.ndarray) -> np.ndarray:
+    triggers = np.empty(len(records), dtype=TRIGGER_DTYPE)
+    triggers['clip'] = records['clip']
+    triggers['type'] = records['type']
+    clip_idx = records['clip']
+    start = clips['start_time'][clip_idx].astype(np.float64)
+    end = start + clips['duration'][clip_idx]
+    triggers['time'] = np.where(records['type'] == TriggerType.ENTER, start, end)
+    return triggers
+
+def read_timeline_arrays(data: bytes) -> TimelineArrays:
+    """Builds arrays directly from the clip, oneshot and trigger records of a bfevtm file."""
+    num_timelines = struct.unpack_from('<H', data, 0x22)[0]
+    if num_timelines == 0:
+        raise ValueError('No timeline in file')
+    timeline_ptr_array = struct.unpack_from('<Q', data, 0x38)[0]
+    offset = struct.unpack_from('<Q', data, timeline_ptr_array)[0]
+    num_clips, num_oneshots = struct.unpack_from('<HH', data, offset + 0x18)
+    clips_offset, oneshots_offset, triggers_offset = struct.unpack_from('<QQQ', data, offset + 0x30)
+
+    def read(dtype: np.dtype, count: int, array_offset: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.frombuffer(data, dtype=dtype, count=count, offset=array_offset).copy()
+
+    clips = read(CLIP_DTYPE, num_clips, clips_offset)
+    oneshots = read(ONESHOT_DTYPE, num_oneshots, oneshots_offset)
+    triggers = _make_triggers(clips, read(_TRIGGER_RECORD_DTYPE, 2 * num_clips, triggers_offset))
+    return TimelineArrays(clips, oneshots, triggers)
+
+def to_arrays(timeline: Timeline) -> TimelineArrays:
+    actor_to_idx = make_values_to_index_map(timeline.actors)
+    # Like list.index, use the first matching action.
+    action_to_idx: typing.List[typing.Dict[StringHolder, int]] = []
+    for actor in timeline.actors:
+        action_to_idx.append(dict())
+        for i, action in enumerate(actor.actions):
+            action_to_idx[-1].setdefault(action, i)
+    clip_to_idx = make_values_to_index_map(timeline.clips)
+
+    clips = np.zeros(len(timeline.clips), dtype=CLIP_DTYPE)
+    if timeline.clips:
+        clip_actors = [actor_to_idx[c.actor.v] for c in timeline.clips]
+        clips['start_time'] = [c.start_time for c in timeline.clips]
+        clips['duration'] = [c.duration for c in timeline.clips]
+        clips['actor'] = clip_actors
+        clips['action'] = [action_to_idx[a][c.actor_action.v] for a, c in zip(clip_actors, timeline.clips)]
+        clips['concurrent_clip'] = [c.actor_concurrent_clip for c in timeline.clips]
+
+    oneshots = np.zeros(len(timeline.oneshots), dtype=ONESHOT_DTYPE)
+    if timeline.oneshots:
+        oneshot_actors = [actor_to_idx[o.actor.v] for o in timeline.oneshots]
+        oneshots['time'] = [o.time for o in timeline.oneshots]
+        oneshots['actor'] = oneshot_actors
+        oneshots['action'] = [action_to_idx[a][o.actor_action.v] for a, o in zip(oneshot_actors, timeline.oneshots)]
+
+    records = np.zeros(len(timeline.triggers), dtype=_TRIGGER_RECORD_DTYPE)
+    if timeline.triggers:
+        records['clip'] = [clip_to_idx[t.clip.v] for t in timeline.triggers]
+        records['type'] = [t.type for t in timeline.triggers]
+    return TimelineArrays(clips, oneshots, _make_triggers(clips, records))
+
+def from_arrays(timeline: Timeline, arrays: TimelineArrays) -> None:
+    actors: typing.List[Actor] = timeline.actors
+
+    def update(obj, actor_idx: int, action_idx: int) -> None:
+        actor = actors[actor_idx]
+        obj.actor.v = actor
+        obj.actor_action.v = actor.actions[action_idx]
+
+    clips: typing.List[Clip] = timeline.clips[:len(arrays.clips)]
+    clips.extend(Clip() for i in range(len(arrays.clips) - len(clips)))
+    for clip, (start_time, duration, actor_idx, action_idx, slot) in zip(clips, arrays.clips.tolist()):
+        clip.start_time = start_time
+        clip.duration = duration
+        clip.actor_concurrent_clip = slot
+        update(clip, actor_idx, action_idx)
+
+    oneshots: typing.List[Oneshot] = timeline.oneshots[:len(arrays.oneshots)]
+    oneshots.extend(Oneshot() for i in range(len(arrays.oneshots) - len(oneshots)))
+    for oneshot, (time, actor_idx, action_idx) in zip(oneshots, arrays.oneshots.tolist()):
+        oneshot.time = time
+        update(oneshot, actor_idx, action_idx)
+
+    triggers: typing.List[Trigger] = []
+    for clip_idx, trigger_type, time in arrays.triggers.tolist():
+        trigger = Trigger()
+        trigger.clip.v = clips[clip_idx]
+        trigger.type = TriggerType(trigger_type)
+        triggers.append(trigger)
+
+    timeline.clips = clips
+    timeline.oneshots = oneshots
+    timeline.triggers = triggers
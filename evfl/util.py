@@ -66,6 +66,19 @@ def make_rindex(v: T) -> RequiredIndex[T]:
     return idx
 
 
+def clone_index(index: typing.Any, remap: typing.Dict[int, typing.Any]) -> typing.Any:
+    """Returns a copy of an Index or RequiredIndex. The value is replaced with remap[id(value)] if present."""
+    new_index = object.__new__(type(index))
+    new_index._idx = index._idx
+    try:
+        v = index.v
+    except AttributeError:
+        # RequiredIndex.v is unset on incomplete objects.
+        return new_index
+    new_index.v = remap.get(id(v), v)
+    return new_index
+
+
 def make_values_to_index_map(iterable: typing.Iterable[T]) -> typing.Dict[T, int]:
     d: typing.Dict[T, int] = dict()
     for value in iterable:
@@ -73,6 +86,23 @@ def make_values_to_index_map(iterable: typing.Iterable[T]) -> typing.Dict[T, int
     return d
 
 
+def make_identity_index_map(iterable: typing.Iterable[typing.Any]) -> typing.Dict[int, int]:
+    return {id(value): i for i, value in enumerate(iterable)}
+
+
+def flatten_ref(idx_map: typing.Dict[int, int], value: typing.Any) -> typing.Any:
+    """Returns -1 for None, the index of value if it is in idx_map, or value itself otherwise."""
+    if value is None:
+        return -1
+    return idx_map.get(id(value), value)
+
+
+def unflatten_ref(values: typing.List[T], ref: typing.Any) -> typing.Optional[T]:
+    if type(ref) is not int:
+        return ref
+    return values[ref] if ref != -1 else None
+
+
 def align_up(n: int, align: int) -> int:
     return (n + align - 1) & -align
 
@@ -158,10 +188,12 @@ class SeekContext:
 
 
 class ReadStream(Stream):
-    def __init__(self, data: bytes) -> None:
+    def __init__(self, data: bytes, intern_table=None) -> None:
         stream = io.BytesIO(memoryview(data))  # type: ignore
         super().__init__(stream)
         self.data = data
+        # Optional evfl.common.InternTable that strings and actor identifiers are shared through.
+        self.intern_table = intern_table
 
     def read(self, *args) -> bytes:
         return self._stream.read(*args)
@@ -188,7 +220,10 @@ class ReadStream(Stream):
         ptr = self.read_u64()
         if ptr == 0:
             return ""
-        return read_pascal_string(self.data, ptr)
+        string = read_pascal_string(self.data, ptr)
+        if self.intern_table is not None:
+            return self.intern_table.string(string)
+        return string
 
     ReadObjectType = typing.TypeVar("ReadObjectType")
 
@@ -235,6 +270,9 @@ class PlaceholderWriter:
 
 
 class WriteStream(Stream):
+    # Set by streams that only measure the output (see SizeCountingWriteStream).
+    measure_only = False
+
     class _StringRef(typing.NamedTuple):
         offset: int
         # The header string ref points to the C string (const char[]), not to PascalString.
@@ -248,7 +286,12 @@ class WriteStream(Stream):
         )
         # The empty string is always the first string.
         self._strings[""] = []
+        self._string_pool_offset = 0
         self._relocation_table_offset = 0
+        # Writer state is kept here rather than on the objects being written, keyed by id().
+        # Objects must stay alive until the write is complete.
+        self._offsets_to: typing.Dict[int, typing.List[int]] = dict()
+        self._scratch: typing.Dict[typing.Tuple[int, str], typing.Any] = dict()
 
     def register_string(self, s: str) -> None:
         self._strings[s]
@@ -256,9 +299,33 @@ class WriteStream(Stream):
     def register_pointer(self, offset) -> None:
         self._pointers.add(offset)
 
+    def get_string_pool_offset(self) -> int:
+        return self._string_pool_offset
+
     def get_relocation_table_offset(self) -> int:
         return self._relocation_table_offset
 
+    def set_scratch(self, obj: typing.Any, key: str, value: typing.Any) -> None:
+        """Stores writer state for an object until the end of the write."""
+        self._scratch[id(obj), key] = value
+
+    def get_scratch(self, obj: typing.Any, key: str, default: typing.Any = None) -> typing.Any:
+        return self._scratch.get((id(obj), key), default)
+
+    def write_placeholder_ptr_to(self, obj: typing.Any) -> None:
+        """Writes a pointer that is filled in when obj is written (see BinaryObject.write)."""
+        offset = self.tell()
+        offsets = self._offsets_to.get(id(obj))
+        if offsets is None:
+            self._offsets_to[id(obj)] = [offset]
+        else:
+            offsets.append(offset)
+        self.register_pointer(offset)
+        self.write(u64(0xFFFFFFFFFFFFFFFF))
+
+    def pop_offsets_to(self, obj: typing.Any) -> typing.List[int]:
+        return self._offsets_to.pop(id(obj), [])
+
     def write(self, data: bytes) -> None:
         self._stream.write(data)
 
@@ -291,6 +358,14 @@ class WriteStream(Stream):
             return None  # type: ignore
         return self.write_placeholder_ptr()
 
+    def write_object_at_placeholder(self, owner: typing.Any, key: str, obj: typing.Any) -> None:
+        """Writes obj at the current offset if a pointer placeholder for it was stored in the
+        scratch value `key` of owner (see write_placeholder_ptr_if and set_scratch)."""
+        offset_writer: typing.Optional[PlaceholderWriter] = self.get_scratch(owner, key)
+        if offset_writer and obj:
+            offset_writer.write_current_offset(self)
+            obj.write(self)
+
     def write_string_ref(self, data: str, is_header_name: bool = False) -> None:
         self._strings[data].append(self._StringRef(self.tell(), is_header_name))
         if is_header_name:
@@ -308,6 +383,7 @@ class WriteStream(Stream):
         self._write_relocation_table(data_end)
 
     def _write_string_pool(self) -> None:
+        self._string_pool_offset = self.tell()
         self.write(b"STR ")
         self.write(u32(0))  # Unused
         self.write(u64(0))  # Unused
@@ -318,6 +394,13 @@ class WriteStream(Stream):
             # XXX: Slow.
             return bin(int.from_bytes(s.encode(), byteorder="big"))[2:][::-1]
 
+        if self.measure_only:
+            # Every string is 2-byte aligned, so the size of the pool does not depend on the order.
+            for string in self._strings.keys():
+                self.write(pascal_string(string))
+                self.align(2)
+            return
+
         for string in sorted(self._strings.keys(), key=sort_string):
             offset = self.tell()
             for ref in self._strings[string]:
@@ -369,16 +452,61 @@ class WriteStream(Stream):
         num_entries_writer.write(self, u32(num_entries))
 
 
-class BinaryObject(metaclass=abc.ABCMeta):
-    __slots__ = ["_offsets_to_this"]
+class SizeCountingWriteStream(WriteStream):
+    """A WriteStream that discards the output and only keeps track of its size.
+
+    Writers may skip work that only affects the contents of the output when measure_only is set,
+    as long as they still write the same number of bytes and register the same pointers and strings."""
+
+    measure_only = True
 
     def __init__(self) -> None:
-        self._offsets_to_this: typing.List[int] = []
+        super().__init__(None)  # type: ignore
+        self._pos = 0
+        self._size = 0
+
+    def size(self) -> int:
+        return self._size
+
+    def write(self, data: bytes) -> None:
+        pos = self._pos + len(data)
+        self._pos = pos
+        if pos > self._size:
+            self._size = pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> None:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self._size + offset
+
+    def tell(self) -> int:
+        return self._pos
+
+    def skip(self, n: int) -> None:
+        self._pos += n
+
+    def advance(self, n: int) -> None:
+        """Advances by n bytes that count towards the size, like writing n bytes would."""
+        pos = self._pos + n
+        self._pos = pos
+        if pos > self._size:
+            self._size = pos
+
+    def write_placeholder(self, placeholder_data: bytes) -> PlaceholderWriter:
+        current_offset = self._pos
+        self.write(placeholder_data)
+        return PlaceholderWriter(current_offset)
+
+
+class BinaryObject(metaclass=abc.ABCMeta):
+    # Objects only hold their data: writer state lives in the WriteStream.
+    __slots__ = []  # type: ignore
 
     def write_placeholder_offset(self, stream: WriteStream) -> None:
-        self._offsets_to_this.append(stream.tell())
-        stream.register_pointer(stream.tell())
-        stream.write(u64(0xFFFFFFFFFFFFFFFF))
+        stream.write_placeholder_ptr_to(self)
 
     @abc.abstractmethod
     def _do_read(self, stream: ReadStream) -> None:
@@ -388,7 +516,7 @@ class BinaryObject(metaclass=abc.ABCMeta):
     def _do_write(self, stream: WriteStream) -> None:
         pass
 
-    def _get_overriding_offset_to_self(self) -> int:
+    def _get_overriding_offset_to_self(self, stream: WriteStream) -> int:
         return -1
 
     def read(self, stream: ReadStream) -> None:
@@ -399,11 +527,13 @@ class BinaryObject(metaclass=abc.ABCMeta):
         self._do_write(stream)
         end_pos = stream.tell()
 
-        stream.seek(start_pos)
-        value = self._get_overriding_offset_to_self()
+        offsets = stream.pop_offsets_to(self)
+        if not offsets:
+            return
+        value = self._get_overriding_offset_to_self(stream)
         if value == -1:
             value = start_pos
-        for offset in self._offsets_to_this:
+        for offset in offsets:
             stream.seek(offset)
             stream.write(u64(value))
         stream.seek(end_pos)
@@ -22,4 +22,7 @@ setuptools.setup(
         "Programming Language :: Python :: 3 :: Only",
     ],
     python_requires='>=3.6',
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )